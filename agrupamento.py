@@ -0,0 +1,82 @@
+"""
+Agrupamento dos pontos do mapa do dashboard (app.py) em uma grade sobre latitude/longitude.
+
+Em zoom baixo, os casos visíveis são agregados por célula da grade (um marcador por célula, com a
+quantidade de casos e a cor do impacto mais frequente); a partir de ZOOM_PONTOS, só os pontos dentro
+da área visível são enviados ao navegador. As células de cada nível de zoom são calculadas uma vez.
+"""
+import numpy as np
+
+# A partir deste zoom os casos são mostrados individualmente
+ZOOM_PONTOS = 9
+# Lado aproximado de uma célula da grade, em pixels da tela (um tile do Leaflet tem 256 px)
+TAMANHO_CELULA_PX = 64
+# Margem em volta da área visível (fração da largura/altura) para que pequenos deslocamentos não esvaziem o mapa
+MARGEM_VISIVEL = 0.2
+
+def tamanho_celula(zoom):
+    """
+    Lado da célula da grade, em graus, para o nível de zoom do Leaflet.
+    """
+    return 360.0 / 2 ** zoom * TAMANHO_CELULA_PX / 256
+
+class IndiceGrade:
+    """
+    Índice de grade dos pontos (latitude/longitude) de um DataFrame fixo, com uma célula por ponto
+    para cada nível de zoom abaixo de ZOOM_PONTOS.
+    """
+    def __init__(self, latitudes, longitudes, zoom_pontos=ZOOM_PONTOS):
+        self.latitudes = np.asarray(latitudes, dtype=float)
+        self.longitudes = np.asarray(longitudes, dtype=float)
+        self.zoom_pontos = zoom_pontos
+        self.celulas = {}
+        for zoom in range(zoom_pontos):
+            tamanho = tamanho_celula(zoom)
+            colunas = int(np.ceil(360.0 / tamanho)) + 1
+            linha = np.floor((self.latitudes + 90.0) / tamanho).astype(np.int64)
+            coluna = np.floor((self.longitudes + 180.0) / tamanho).astype(np.int64)
+            self.celulas[zoom] = linha * colunas + coluna
+
+    def visiveis(self, indices, limites):
+        """
+        Posições (dentre `indices`) dos pontos dentro dos limites [[sul, oeste], [norte, leste]] do mapa,
+        ampliados por MARGEM_VISIVEL. Sem limites, retorna todos os índices.
+        """
+        if not limites:
+            return indices
+        (sul, oeste), (norte, leste) = limites
+        margem_lat = (norte - sul) * MARGEM_VISIVEL
+        margem_lon = (leste - oeste) * MARGEM_VISIVEL
+        latitudes = self.latitudes[indices]
+        longitudes = self.longitudes[indices]
+        dentro = (latitudes >= sul - margem_lat) & (latitudes <= norte + margem_lat)
+        if leste - oeste < 360:
+            # Longitudes do Leaflet podem passar de ±180 depois de várias voltas no mapa
+            oeste_normalizado = (oeste - margem_lon + 180.0) % 360.0 - 180.0
+            largura = leste - oeste + 2 * margem_lon
+            dentro &= (longitudes - oeste_normalizado) % 360.0 <= largura
+        return indices[dentro]
+
+    def agrupa(self, indices, zoom, categorias=None):
+        """
+        Agrega os pontos indicados nas células do zoom. Retorna um dicionário com, por célula:
+        'quantidade', 'latitude'/'longitude' (média dos pontos), 'indice' (um ponto da célula, usado quando
+        a célula tem um só caso) e, se `categorias` (códigos inteiros por ponto) for informado,
+        'categoria' (código mais frequente na célula).
+        """
+        zoom = int(np.clip(zoom, 0, self.zoom_pontos - 1))
+        celulas, inverso = np.unique(self.celulas[zoom][indices], return_inverse=True)
+        quantidade = np.bincount(inverso, minlength=len(celulas))
+        grupos = {
+            'quantidade': quantidade,
+            'latitude': np.bincount(inverso, weights=self.latitudes[indices], minlength=len(celulas)) / quantidade,
+            'longitude': np.bincount(inverso, weights=self.longitudes[indices], minlength=len(celulas)) / quantidade,
+            'indice': np.zeros(len(celulas), dtype=np.int64),
+        }
+        grupos['indice'][inverso] = indices
+        if categorias is not None:
+            codigos = np.asarray(categorias)[indices]
+            total_categorias = int(codigos.max()) + 1 if len(codigos) else 1
+            contagem = np.bincount(inverso * total_categorias + codigos, minlength=len(celulas) * total_categorias)
+            grupos['categoria'] = contagem.reshape(len(celulas), total_categorias).argmax(axis=1)
+        return grupos
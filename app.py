@@ -1,19 +1,30 @@
 import dash
 from dash import dcc, html, dash_table
-from dash.dependencies import Input, Output
+from dash import ctx
+from dash.dependencies import Input, Output, State, MATCH, ALL
+from dash.exceptions import PreventUpdate
 import dash_leaflet as dl
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
 import os
+from dados import CAMINHO_GEOCODIFICADA, carrega_parquet
+from filtros import MotorFiltros
+from consulta_tabela import ConsultaTabela
+from agrupamento import IndiceGrade, ZOOM_PONTOS
+from detalhes import IndiceDetalhes, ROTULOS, chaves_casos, registra_rota
 
 # --- CARREGAMENTO E PRÉ-PROCESSAMENTO DOS DADOS ---
-geocoded_excel_path = 'docs/results_geocoded.xlsx'
-print(f"Carregando dados geocodificados de: {geocoded_excel_path}")
-try:
-    df_base = pd.read_excel(geocoded_excel_path)
-    print(f"Dados carregados. {len(df_base)} linhas encontradas.")
+# Colunas mínimas do dashboard (usadas quando a base não pode ser carregada)
+colunas_base = [
+    'latitude','longitude','tipo_impacto','tipo_impacto_geral','valor_multa','moeda',
+    'numero_processo','processoID','municipio','uf','descricao_impacto'
+]
+# Tamanho máximo da descrição exibida na tabela (o texto completo aparece no tooltip)
+tamanho_descricao = 250
+
+def prepara_base(df_base):
     # Valor multa numérico
     if 'valor_multa' in df_base.columns:
         df_base['valor_multa_numerico'] = pd.to_numeric(
@@ -32,16 +43,86 @@ try:
     df_base['tipo_impacto_geral'] = df_base.get('tipo_impacto_geral', 'Não Especificado').fillna('Não Especificado')
     # UF
     df_base['uf'] = df_base.get('uf', 'Não Informado').fillna('Não Informado').astype(str)
+    return df_base
+
+# Textos dos grupos de milhar ("000" a "999") e dos centavos ("00" a "99")
+_GRUPOS_3_DIGITOS = np.array([f"{numero:03d}" for numero in range(1000)])
+_CENTAVOS = np.array([f"{numero:02d}" for numero in range(100)])
+
+# Helper formata moeda (coluna inteira): "R$ 1.234,56"; valores nulos ou zero ficam vazios
+def formata_moedas(valores, moedas):
+    valores = pd.Series(valores, dtype=float).to_numpy(dtype=float, na_value=np.nan)
+    vazios = np.isnan(valores) | (valores == 0)
+    absolutos = np.abs(np.nan_to_num(valores))
+    centavos = np.round(absolutos * 100)
+    # Perto de meio centavo, o produto por 100 perde precisão: arredonda esses poucos valores como o f-string
+    empates = np.flatnonzero(np.abs(absolutos * 100 % 1 - 0.5) < 1e-6)
+    centavos[empates] = [round(float(f"{absolutos[i]:.2f}") * 100) for i in empates]
+    # Parte inteira em grupos de 3 dígitos separados por "." (texto de cada grupo por tabela, sem converter número
+    # a número); os zeros à esquerda do primeiro grupo são removidos no final
+    inteiros = (centavos // 100).astype(np.int64)
+    textos = _GRUPOS_3_DIGITOS[inteiros % 1000]
+    resto = inteiros // 1000
+    while (resto > 0).any():
+        textos = np.char.add(np.char.add(_GRUPOS_3_DIGITOS[resto % 1000], '.'), textos)
+        resto //= 1000
+    textos = np.char.lstrip(textos, '0.')
+    textos = np.where(textos == '', '0', textos)
+    decimais = _CENTAVOS[(centavos % 100).astype(np.int64)]
+    sinal = np.where(valores < 0, '-', '')
+    formatados = np.char.add(np.char.add(np.asarray(moedas, dtype=str), ' '), sinal)
+    formatados = np.char.add(np.char.add(np.char.add(formatados, textos), ','), decimais)
+    return np.where(vazios, '', formatados).astype(object)
+
+def cores_por_impacto(tipos_gerais):
+    # Cores por impacto geral
+    tipos_gerais = sorted(tipos_gerais)
+    cores = px.colors.qualitative.Plotly * (
+        len(tipos_gerais)//len(px.colors.qualitative.Plotly)+1
+    )
+    return { t: cores[i] for i, t in enumerate(tipos_gerais) }
+
+def carrega_dados(df):
+    """
+    Prepara a base do dashboard: colunas de exibição calculadas uma vez para todas as linhas (valor formatado,
+    descrição resumida, cor e chave de cada caso) e os índices usados pelos callbacks, que só selecionam linhas.
+    """
+    global df_base, df_mapeavel, color_map, cores_categorias, indice_detalhes, motor_filtros, consulta_tabela, indice_grade
+    df_base = prepara_base(df)
     # Filtra registros mapeáveis
     df_mapeavel = df_base.dropna(subset=['latitude', 'longitude']).copy()
-    print(f"Número de registros mapeáveis: {len(df_mapeavel)}")
+    color_map = cores_por_impacto(df_mapeavel['tipo_impacto_geral'].unique())
+
+    # Colunas de exibição
+    df_mapeavel['valor_multa_numerico_formatado'] = formata_moedas(df_mapeavel['valor_multa_numerico'], df_mapeavel['moeda'])
+    descricoes = df_mapeavel['descricao_impacto'].astype('string').fillna('')
+    df_mapeavel['descricao_curta'] = descricoes.where(
+        descricoes.str.len() <= tamanho_descricao, descricoes.str.slice(0, tamanho_descricao) + '...')
+    df_mapeavel['cor'] = df_mapeavel['tipo_impacto_geral'].map(color_map)
+    # Chave de cada caso nos marcadores e busca dos detalhes (popups) por essa chave
+    df_mapeavel['chave_caso'] = chaves_casos(df_mapeavel)
+    indice_detalhes = IndiceDetalhes(df_base)
+
+    # Filtros compartilhados pelos callbacks: máscaras pré-calculadas e cache por combinação de filtros
+    motor_filtros = MotorFiltros(df_mapeavel)
+    # Cor de cada código de impacto geral do motor (usada pelos marcadores agrupados)
+    cores_categorias = [color_map[t] for t in motor_filtros.categorias['tipo_impacto_geral']]
+    # Filtro, ordenação e paginação da tabela no servidor (o valor formatado é filtrado e ordenado pelo número)
+    consulta_tabela = ConsultaTabela(motor_filtros, numericas={'valor_multa_numerico_formatado':'valor_multa_numerico'})
+    # Grade sobre latitude/longitude para agrupar os marcadores em zoom baixo
+    indice_grade = IndiceGrade(df_mapeavel['latitude'], df_mapeavel['longitude'])
+    return df_mapeavel
+
+geocoded_path = CAMINHO_GEOCODIFICADA
+print(f"Carregando dados geocodificados de: {geocoded_path}")
+try:
+    df_carregado = carrega_parquet(geocoded_path)
+    print(f"Dados carregados. {len(df_carregado)} linhas encontradas.")
 except Exception as e:
     print(f"ERRO ao carregar dados: {e}. Dashboard iniciará com dados vazios.")
-    df_base = pd.DataFrame()
-    df_mapeavel = pd.DataFrame(columns=[
-        'latitude','longitude','tipo_impacto','tipo_impacto_geral','valor_multa_numerico','moeda',
-        'numero_processo','municipio','uf','descricao_impacto'
-    ])
+    df_carregado = pd.DataFrame(columns=colunas_base)
+carrega_dados(df_carregado)
+print(f"Número de registros mapeáveis: {len(df_mapeavel)}")
 
 # --- PARÂMETROS DE FILTRO ---
 # Filtros de impacto geral
@@ -58,12 +139,6 @@ vals = df_mapeavel[(df_mapeavel['moeda']=='R$') & (df_mapeavel['valor_multa_nume
 min_log = int(np.floor(np.log10(vals.min()))) if not vals.empty else 0
 max_log = int(np.ceil(np.log10(vals.max())))  if not vals.empty else 6
 
-# Cores por impacto geral
-cores = px.colors.qualitative.Plotly * (
-    len(tipos_gerais_opcoes)//len(px.colors.qualitative.Plotly)+1
-)
-color_map = { t: cores[i] for i, t in enumerate(sorted(df_mapeavel['tipo_impacto_geral'].unique())) }
-
 # Colunas da tabela
 colunas_tabela = [
     {"name":"Processo","id":"numero_processo"},
@@ -76,15 +151,15 @@ colunas_tabela = [
     {"name":"Descrição","id":"descricao_impacto"}
 ]
 
-# Helper formata moeda
-def format_currency(value, currency):
-    if pd.isna(value) or value == 0:
-        return ""
-    tmp = f"{value:,.2f}".replace('.', '#').replace(',', '.').replace('#', ',')
-    return f"{currency} {tmp}"
+# Colunas usadas pelo gráfico e pelo resumo
+colunas_dashboard = ['tipo_impacto_geral','valor_multa_numerico']
+# Tamanho da página da tabela (só a página visível é enviada ao navegador)
+linhas_por_pagina = 10
 
 # --- DASH APP ---
 app = dash.Dash(__name__, suppress_callback_exceptions=True)
+# GET /detalhes/<chave>: detalhes de um caso em JSON, usados pelos popups do mapa estático (mapping.py)
+registra_rota(app.server, indice_detalhes)
 app.layout = html.Div([
     # Cabeçalho
     html.Div([
@@ -145,10 +220,13 @@ app.layout = html.Div([
     html.Div([
         html.H4("Resumo e Dados Filtrados", style={'textAlign':'center'}),
         html.Div(id='resumo', style={'padding':'10px','fontWeight':'bold','backgroundColor':'#E0F2F7'}),
+        html.Button('Exportar Excel', id='btn-exportar', n_clicks=0, style={'marginBottom':'10px'}),
+        dcc.Download(id='download-tabela'),
         dash_table.DataTable(
-            id='tabela', columns=colunas_tabela, data=[], page_size=10,
-            filter_action='native', sort_action='native',
-            export_format='xlsx', export_headers='display',
+            id='tabela', columns=colunas_tabela, data=[],
+            page_current=0, page_size=linhas_por_pagina, page_action='custom',
+            filter_action='custom', filter_query='', sort_action='custom', sort_mode='multi', sort_by=[],
+            tooltip_data=[], tooltip_duration=None,
             style_cell={'textAlign':'center'}, style_header={'fontWeight':'bold'}
         )
     ], style={'clear':'both','padding':'20px'})
@@ -177,9 +255,7 @@ def show_range(r):
     [Input('dropdown-moeda','value'), Input('check-hide-zero','value')]
 )
 def update_hist(moedas, hide_zero):
-    dfh = df_mapeavel.copy()
-    if moedas: dfh = dfh[dfh['moeda'].isin(moedas)]
-    if 'hide_zero' in hide_zero: dfh = dfh[dfh['valor_multa_numerico']>0]
+    dfh = motor_filtros.filtra(moedas=moedas, ocultar_zero='hide_zero' in hide_zero, colunas=['moeda','valor_multa_numerico'])
     # hist de log
     vals_h = np.log10(dfh[dfh['moeda']=='R$']['valor_multa_numerico']+1)
     fig = px.histogram(vals_h, nbins=max_log-min_log+1, range_x=(min_log,max_log))
@@ -194,13 +270,9 @@ def update_hist(moedas, hide_zero):
 def update_legend(sel_g, moedas, hide_zero, range_log):
     if df_mapeavel.empty:
         return html.Div("Sem dados para legenda.")
-    dff = df_mapeavel.copy()
-    if sel_g: dff = dff[dff['tipo_impacto_geral'].isin(sel_g)]
-    if moedas: dff = dff[dff['moeda'].isin(moedas)]
-    if 'hide_zero' in hide_zero: dff = dff[dff['valor_multa_numerico']>0]
-    lo, hi = range_log; dff = dff[(dff['valor_multa_numerico']>=10**lo)&(dff['valor_multa_numerico']<=10**hi)]
+    indices = motor_filtros.indices(sel_g, None, moedas, 'hide_zero' in hide_zero, range_log)
     items = []
-    for g in sorted(dff['tipo_impacto_geral'].unique()):
+    for g in sorted(motor_filtros.valores_presentes('tipo_impacto_geral', indices)):
         items.append(html.Li([
             html.Span(style={'backgroundColor':color_map[g],'display':'inline-block','width':'12px','height':'12px','borderRadius':'50%','marginRight':'5px'}),
             html.Span(g)
@@ -211,46 +283,76 @@ def update_legend(sel_g, moedas, hide_zero, range_log):
     Output('markers','children'),
     [Input('dropdown-geral','value'), Input('dropdown-uf','value'),
      Input('dropdown-moeda','value'), Input('check-hide-zero','value'),
-     Input('rangeslider-log','value')]
+     Input('rangeslider-log','value'), Input('mapa','zoom'), Input('mapa','bounds')]
 )
-def update_markers(sel_g, sel_uf, moedas, hide_zero, rlog):
-    dff = df_mapeavel.copy()
-    if sel_g: dff = dff[dff['tipo_impacto_geral'].isin(sel_g)]
-    if sel_uf: dff = dff[dff['uf'].isin(sel_uf)]
-    if moedas: dff = dff[dff['moeda'].isin(moedas)]
-    if 'hide_zero' in hide_zero: dff = dff[dff['valor_multa_numerico']>0]
-    lo, hi = rlog; dff = dff[(dff['valor_multa_numerico']>=10**lo)&(dff['valor_multa_numerico']<=10**hi)]
+def update_markers(sel_g, sel_uf, moedas, hide_zero, rlog, zoom, bounds):
+    # Só os casos na área visível; em zoom baixo, agregados por célula da grade
+    indices = indice_grade.visiveis(motor_filtros.indices(sel_g, sel_uf, moedas, 'hide_zero' in hide_zero, rlog), bounds)
+    zoom = zoom if zoom is not None else 4
+    if zoom >= ZOOM_PONTOS:
+        return marcadores_casos(indices)
+    grupos = indice_grade.agrupa(indices, zoom, motor_filtros.codigos['tipo_impacto_geral'])
+    isolados = grupos['quantidade'] == 1
+    markers = marcadores_casos(grupos['indice'][isolados])
+    for quantidade, lat, lon, categoria in zip(grupos['quantidade'][~isolados], grupos['latitude'][~isolados],
+                                               grupos['longitude'][~isolados], grupos['categoria'][~isolados]):
+        markers.append(dl.CircleMarker(
+            id={'type':'grupo','indice':f"{lat:.6f},{lon:.6f}"},
+            center=[lat,lon], radius=8+4*np.log10(quantidade), weight=3,
+            color=cores_categorias[categoria], fill=True, fillOpacity=0.5,
+            children=[dl.Tooltip(f"{quantidade} casos (clique para aproximar)")]
+        ))
+    return markers
+
+def marcadores_casos(indices):
+    # Um marcador por caso, só com a chave, as coordenadas e a cor; os detalhes são buscados quando o marcador é clicado
+    dff = df_mapeavel.iloc[indices][['latitude','longitude','chave_caso','cor']]
     markers = []
-    for _, row in dff.iterrows():
+    for indice, row in zip(indices, dff.itertuples(index=False)):
         markers.append(dl.CircleMarker(
+            id={'type':'marcador','indice':int(indice),'caso':row.chave_caso},
             center=[row.latitude,row.longitude], radius=8,
-            color=color_map[row.tipo_impacto_geral], fill=True, fillOpacity=0.7,
-            children=[
-                dl.Tooltip(f"{row.numero_processo} | Geral: {row.tipo_impacto_geral}"),
-                dl.Popup(html.Div([
-                    html.B(f"Impacto Geral: {row.tipo_impacto_geral}"),
-                    html.P(f"Det.: {row.tipo_impacto}"),
-                    html.P(f"Valor: {format_currency(row.valor_multa_numerico, row.moeda)}"),
-                    html.P(f"Moeda: {row.moeda}"),
-                    html.P(row.descricao_impacto)
-                ]))
-            ]
+            color=row.cor, fill=True, fillOpacity=0.7,
+            children=[dl.Popup("Carregando...", id={'type':'popup','indice':int(indice),'caso':row.chave_caso})]
         ))
     return markers
 
 @app.callback(
-    [Output('bar-chart','figure'), Output('resumo','children'), Output('tabela','data')],
+    Output({'type':'popup','indice':MATCH,'caso':MATCH},'children'),
+    Input({'type':'marcador','indice':MATCH,'caso':MATCH},'n_clicks'),
+    prevent_initial_call=True
+)
+def carrega_popup(n_clicks):
+    if not n_clicks:
+        raise PreventUpdate
+    dados = indice_detalhes.detalhes(ctx.triggered_id['caso'])
+    if dados is None:
+        return "Detalhes indisponíveis."
+    return html.Div([html.B("Detalhes do Dano Ambiental")] + [
+        html.P([html.Strong(f"{rotulo}: "), dados[campo]]) for campo, rotulo in ROTULOS.items() if campo in dados
+    ], style={'maxWidth':'350px','maxHeight':'300px','overflowY':'auto'})
+
+@app.callback(
+    Output('mapa','viewport'),
+    Input({'type':'grupo','indice':ALL},'n_clicks'),
+    State('mapa','zoom'),
+    prevent_initial_call=True
+)
+def aproxima_grupo(n_clicks, zoom):
+    # Clique em um grupo: aproxima o mapa até separar os casos
+    if not ctx.triggered or not ctx.triggered[0]['value']:
+        raise PreventUpdate
+    lat, lon = map(float, ctx.triggered_id['indice'].split(','))
+    return {'center':[lat,lon], 'zoom':min((zoom or 4)+2, ZOOM_PONTOS), 'transition':'flyTo'}
+
+@app.callback(
+    [Output('bar-chart','figure'), Output('resumo','children')],
     [Input('dropdown-geral','value'), Input('dropdown-uf','value'),
      Input('dropdown-moeda','value'), Input('check-hide-zero','value'),
      Input('rangeslider-log','value')]
 )
 def update_dashboard(sel_g, sel_uf, moedas, hide_zero, rlog):
-    dff = df_mapeavel.copy()
-    if sel_g: dff = dff[dff['tipo_impacto_geral'].isin(sel_g)]
-    if sel_uf: dff = dff[dff['uf'].isin(sel_uf)]
-    if moedas: dff = dff[dff['moeda'].isin(moedas)]
-    if 'hide_zero' in hide_zero: dff = dff[dff['valor_multa_numerico']>0]
-    lo, hi = rlog; dff = dff[(dff['valor_multa_numerico']>=10**lo)&(dff['valor_multa_numerico']<=10**hi)]
+    dff = motor_filtros.filtra(sel_g, sel_uf, moedas, 'hide_zero' in hide_zero, rlog, colunas=colunas_dashboard)
     # gráfico barras por impacto geral
     df_avg = dff.groupby('tipo_impacto_geral')['valor_multa_numerico'].mean().reset_index()
     fig = px.bar(df_avg, x='tipo_impacto_geral', y='valor_multa_numerico', color='tipo_impacto_geral', color_discrete_map=color_map)
@@ -260,12 +362,50 @@ def update_dashboard(sel_g, sel_uf, moedas, hide_zero, rlog):
     soma = dff['valor_multa_numerico'].sum()
     media = dff['valor_multa_numerico'].mean() if total>0 else 0
     resumo = f"{total} casos. Soma: R$ {soma:,.2f}. Média: R$ {media:,.2f}."
-    # tabela
-    dff['valor_multa_numerico_formatado'] = dff.apply(
-        lambda row: format_currency(row['valor_multa_numerico'], row['moeda']), axis=1
-    )
-    data = dff[['numero_processo','municipio','uf','tipo_impacto','tipo_impacto_geral','moeda','valor_multa_numerico_formatado','descricao_impacto']].to_dict('records')
-    return fig, resumo, data
+    return fig, resumo
+
+def filtros_painel(sel_g, sel_uf, moedas, hide_zero, rlog):
+    return {'geral':sel_g, 'ufs':sel_uf, 'moedas':moedas, 'ocultar_zero':'hide_zero' in hide_zero, 'faixa':rlog}
+
+def pagina_tabela(filtros, filter_query, sort_by, pagina):
+    """
+    Linhas da página da tabela, com a descrição resumida na coluna e o texto completo no tooltip.
+    Retorna (linhas, tooltips, total de páginas, página efetiva).
+    """
+    colunas = [c['id'] for c in colunas_tabela if c['id'] != 'descricao_impacto'] + ['descricao_curta', 'descricao_impacto']
+    dff, paginas, pagina = consulta_tabela.pagina(filtros, filter_query, sort_by, pagina, linhas_por_pagina, colunas)
+    tooltips = [{'descricao_impacto': {'value': texto, 'type': 'text'}} if texto != curta else {}
+                for texto, curta in zip(dff['descricao_impacto'].fillna(''), dff['descricao_curta'])]
+    linhas = dff.drop(columns='descricao_impacto').rename(columns={'descricao_curta':'descricao_impacto'})
+    return linhas.to_dict('records'), tooltips, paginas, pagina
+
+@app.callback(
+    [Output('tabela','data'), Output('tabela','tooltip_data'), Output('tabela','page_count'), Output('tabela','page_current')],
+    [Input('dropdown-geral','value'), Input('dropdown-uf','value'),
+     Input('dropdown-moeda','value'), Input('check-hide-zero','value'),
+     Input('rangeslider-log','value'), Input('tabela','page_current'),
+     Input('tabela','sort_by'), Input('tabela','filter_query')]
+)
+def update_tabela(sel_g, sel_uf, moedas, hide_zero, rlog, pagina, sort_by, filter_query):
+    # Filtro, ordenação e paginação no servidor: só as linhas da página atual vão para o navegador
+    if 'tabela.page_current' not in ctx.triggered_prop_ids:
+        pagina = 0  # Filtros, ordenação ou filtro da tabela mudaram: volta para a primeira página
+    return pagina_tabela(filtros_painel(sel_g, sel_uf, moedas, hide_zero, rlog), filter_query, sort_by, pagina)
+
+@app.callback(
+    Output('download-tabela','data'),
+    Input('btn-exportar','n_clicks'),
+    [State('dropdown-geral','value'), State('dropdown-uf','value'),
+     State('dropdown-moeda','value'), State('check-hide-zero','value'),
+     State('rangeslider-log','value'), State('tabela','sort_by'), State('tabela','filter_query')],
+    prevent_initial_call=True
+)
+def exporta_tabela(n_clicks, sel_g, sel_uf, moedas, hide_zero, rlog, sort_by, filter_query):
+    # Exporta todas as linhas filtradas (não só a página visível), gerando o .xlsx no servidor
+    indices = consulta_tabela.indices(filtros_painel(sel_g, sel_uf, moedas, hide_zero, rlog), filter_query, sort_by)
+    dff = df_mapeavel.iloc[indices][[c['id'] for c in colunas_tabela]]
+    dff = dff.rename(columns={c['id']:c['name'] for c in colunas_tabela})
+    return dcc.send_data_frame(dff.to_excel, 'dados_filtrados.xlsx', sheet_name='Dados', index=False)
 
 # --- RUN ---
 if __name__ == '__main__':
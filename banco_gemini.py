@@ -0,0 +1,181 @@
+import json
+import sqlite3
+from contextlib import contextmanager
+import pandas as pd
+
+# --- CONFIGURAÇÕES DO BANCO DE DADOS SQLITE ---
+DB_FILE_NAME = "meu_banco_gemini.db"
+TABLE_PROCESSOS = "processos_analisados_gemini"
+TABLE_PROGRESSO = "progresso_etapas"
+
+# Colunas na ordem do DataFrame final: as colunas retornadas pela API Gemini
+# mais as colunas 'processoID', 'processoAnexoID', 'link_referencia'
+COLUNAS_DATAFRAME_FINAL = [
+    "numero_processo", "processoID", "processoAnexoID", "georreferencia", "uf", "municipio",
+    "responsavel", "categoria_responsavel", "tipo_impacto", "descricao_impacto",
+    "data_impacto", "area_afetada", "unidade_area", "houve_compensacao",
+    "categoria_compensacao", "tipo_multa", "valor_multa", "valor_multa_diaria",
+    "link_referencia"
+]
+
+# --- FUNÇÕES AUXILIARES SQLITE ---
+
+def criar_tabela_sqlite(db_file=DB_FILE_NAME):
+    conn = None
+    try:
+        conn = sqlite3.connect(db_file)
+        # WAL permite leituras (dashboard, outros workers) enquanto um processo grava
+        conn.execute("PRAGMA journal_mode=WAL")
+        cursor = conn.cursor()
+        # Criar colunas com tipo TEXT para flexibilidade. processoID será a chave primária.
+        colunas_sql = ", ".join([f'"{col}" TEXT' for col in COLUNAS_DATAFRAME_FINAL if col != "processoID"])
+        # processoID é especial e usado como PRIMARY KEY
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TABLE_PROCESSOS} (
+            "processoID" TEXT PRIMARY KEY,
+            {colunas_sql}
+        )
+        """)
+        conn.commit()
+    except sqlite3.Error as e:
+        print(f"Erro ao criar/conectar tabela SQLite: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+def get_ids_processados_sqlite(db_file=DB_FILE_NAME):
+    conn = None
+    ids_processados = set()
+    criar_tabela_sqlite(db_file) # Cria a tabela se ainda não existir
+    try:
+        conn = sqlite3.connect(db_file)
+        rows = conn.execute(f"SELECT processoID FROM {TABLE_PROCESSOS}").fetchall()
+        # Os IDs podem ser int ou str. Para consistência, vamos tratar como string ao comparar.
+        ids_processados = {str(row[0]) for row in rows}
+    except sqlite3.Error as e:
+        print(f"Erro ao ler IDs do SQLite: {e}")
+    finally:
+        if conn:
+            conn.close()
+    return ids_processados
+
+def inserir_dados_processo_sqlite(dados_dict, db_file=DB_FILE_NAME):
+    conn = None
+    try:
+        conn = sqlite3.connect(db_file)
+        # Garantir que todos os campos de COLUNAS_DATAFRAME_FINAL existam no dict, preenchendo com None se faltar
+        # e convertendo todos os valores para string para inserção segura como TEXT
+        valores_ordenados = []
+        for col_nome in COLUNAS_DATAFRAME_FINAL:
+            valor = dados_dict.get(col_nome)
+            valores_ordenados.append(str(valor) if valor is not None else None)
+
+        cols_string = ", ".join([f'"{col}"' for col in COLUNAS_DATAFRAME_FINAL])
+        placeholders = ", ".join(["?"] * len(COLUNAS_DATAFRAME_FINAL))
+        conn.execute(f"INSERT OR REPLACE INTO {TABLE_PROCESSOS} ({cols_string}) VALUES ({placeholders})",
+                     valores_ordenados)
+        conn.commit()
+    except sqlite3.Error as e:
+        print(f"Erro ao inserir dados no SQLite para processoID {dados_dict.get('processoID')}: {e}")
+        if conn:
+            conn.rollback()
+    finally:
+        if conn:
+            conn.close()
+
+def inserir_varios_processos_sqlite(lista_dados, db_file=DB_FILE_NAME):
+    """
+    Insere vários processos em uma única conexão e transação (em vez de uma conexão por processo).
+    """
+    if not lista_dados:
+        return
+    criar_tabela_sqlite(db_file)
+    cols_string = ", ".join([f'"{col}"' for col in COLUNAS_DATAFRAME_FINAL])
+    placeholders = ", ".join(["?"] * len(COLUNAS_DATAFRAME_FINAL))
+    linhas = [[str(dados.get(col)) if dados.get(col) is not None else None for col in COLUNAS_DATAFRAME_FINAL]
+              for dados in lista_dados]
+    try:
+        with _conexao(db_file) as conn:
+            conn.executemany(f"INSERT OR REPLACE INTO {TABLE_PROCESSOS} ({cols_string}) VALUES ({placeholders})", linhas)
+    except sqlite3.Error as e:
+        print(f"Erro ao inserir {len(linhas)} processos no SQLite: {e}")
+
+def carregar_processos_sqlite(db_file=DB_FILE_NAME):
+    """
+    Lê todos os processos analisados do banco, com as colunas na ordem de COLUNAS_DATAFRAME_FINAL.
+    """
+    criar_tabela_sqlite(db_file)
+    conn = None
+    try:
+        conn = sqlite3.connect(db_file)
+        col_select_str = ", ".join([f'"{col}"' for col in COLUNAS_DATAFRAME_FINAL])
+        return pd.read_sql_query(f"SELECT {col_select_str} FROM {TABLE_PROCESSOS}", conn)
+    except sqlite3.Error as e:
+        print(f"Erro ao ler dados do SQLite para o DataFrame: {e}")
+        return pd.DataFrame(columns=COLUNAS_DATAFRAME_FINAL)
+    finally:
+        if conn:
+            conn.close()
+
+def limpar_resposta_json_gemini(texto_json_bruto: str) -> str:
+    """Remove marcadores ```json ... ``` de respostas da API Gemini."""
+    limpo = texto_json_bruto.strip()
+    if limpo.startswith("```json"):
+        limpo = limpo[7:]
+    elif limpo.startswith("```"):
+        limpo = limpo[3:]
+    if limpo.endswith("```"):
+        limpo = limpo[:-3]
+    return limpo.strip()
+
+# --- PROGRESSO DAS ETAPAS DO PIPELINE ---
+
+@contextmanager
+def _conexao(db_file):
+    # Abre uma conexão, faz commit ao final do bloco (ou rollback em caso de erro) e a fecha
+    conn = sqlite3.connect(db_file, timeout=60)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+class ProgressoEtapa:
+    """
+    Guarda no banco o resultado de cada item já processado por uma etapa do pipeline,
+    para que a etapa possa ser retomada do ponto em que parou após uma falha.
+    """
+    def __init__(self, etapa, db_file=DB_FILE_NAME):
+        self.etapa = etapa
+        self.db_file = db_file
+        with _conexao(db_file) as conn:
+            conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {TABLE_PROGRESSO} (
+                "etapa" TEXT NOT NULL,
+                "item" TEXT NOT NULL,
+                "resultado" TEXT NOT NULL,
+                PRIMARY KEY ("etapa", "item")
+            )
+            """)
+
+    def ids(self):
+        with _conexao(self.db_file) as conn:
+            rows = conn.execute(f"SELECT item FROM {TABLE_PROGRESSO} WHERE etapa = ?", (self.etapa,)).fetchall()
+        return {row[0] for row in rows}
+
+    def salva(self, resultados):
+        # `resultados` é um dicionário item -> dicionário com o resultado (gravados em uma única transação)
+        with _conexao(self.db_file) as conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {TABLE_PROGRESSO} (etapa, item, resultado) VALUES (?, ?, ?)",
+                [(self.etapa, str(item), json.dumps(resultado, ensure_ascii=False, default=str)) for item, resultado in resultados.items()]
+            )
+
+    def carrega(self):
+        with _conexao(self.db_file) as conn:
+            rows = conn.execute(f"SELECT item, resultado FROM {TABLE_PROGRESSO} WHERE etapa = ?", (self.etapa,)).fetchall()
+        return {item: json.loads(resultado) for item, resultado in rows}
+
+    def limpa(self):
+        with _conexao(self.db_file) as conn:
+            conn.execute(f"DELETE FROM {TABLE_PROGRESSO} WHERE etapa = ?", (self.etapa,))
@@ -0,0 +1,274 @@
+import sys
+import json
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+from banco_gemini import DB_FILE_NAME
+
+TABLE_CASOS = "casos"
+
+# Colunas da base unificada (fontes + geocodificação) com o tipo de cada uma no SQLite
+SCHEMA_CASOS = {
+    "id_caso": "TEXT",
+    "fonte_dados": "TEXT",
+    "numero_processo": "TEXT",
+    "processoID": "TEXT",
+    "processoAnexoID": "INTEGER",
+    "georreferencia": "TEXT",
+    "pais": "TEXT",
+    "uf": "TEXT",
+    "municipio": "TEXT",
+    "regiao": "TEXT",
+    "responsavel": "TEXT",
+    "categoria_responsavel": "TEXT",
+    "tipo_impacto_geral": "TEXT",
+    "tipo_impacto": "TEXT",
+    "descricao_impacto": "TEXT",
+    "data_impacto": "TEXT",
+    "area_afetada": "REAL",
+    "unidade_area": "TEXT",
+    "houve_compensacao": "INTEGER",
+    "categoria_compensacao": "TEXT",
+    "tipo_multa": "INTEGER",
+    "valor_multa": "REAL",
+    "valor_multa_diaria": "REAL",
+    "moeda": "TEXT",
+    "link_referencia": "TEXT",
+    "referencia": "TEXT",
+    "latitude": "REAL",
+    "longitude": "REAL",
+    "geo_precisao": "TEXT",
+}
+COLUNAS_CASOS = list(SCHEMA_CASOS)
+
+# Colunas indexadas (usadas nos filtros do dashboard e na geocodificação)
+INDICES_CASOS = ["numero_processo", "uf", "tipo_impacto_geral", "fonte_dados"]
+
+# Valores tratados como ausentes (a base unificada usa 'NULL' no lugar de valores vazios)
+VALORES_AUSENTES = {'', 'NULL', 'NONE', 'NAN', 'NAT', 'N/A'}
+# Textos de campos booleanos (ex.: houve_compensacao), guardados como 1/0 nas colunas INTEGER
+VALORES_BOOLEANOS = {'TRUE': 1, 'FALSE': 0, 'SIM': 1, 'NÃO': 0, 'NAO': 0}
+
+def _ausente(valor):
+    if valor is None:
+        return True
+    if isinstance(valor, str):
+        return valor.strip().upper() in VALORES_AUSENTES
+    try:
+        return bool(pd.isna(valor))
+    except (TypeError, ValueError):
+        return False
+
+def para_real(valor):
+    """
+    Converte um valor da base (número, texto em formato brasileiro ou "R$ ...") para float; ausentes viram None.
+    """
+    if _ausente(valor):
+        return None
+    if isinstance(valor, (int, float, np.integer, np.floating)):
+        return float(valor)
+    texto = str(valor).replace('R$', '').strip()
+    # "1.234,56" (formato brasileiro) -> 1234.56; "1234.56" fica como está
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    try:
+        return float(texto)
+    except ValueError:
+        return None
+
+def _para_inteiro(valor):
+    if isinstance(valor, (bool, np.bool_)):
+        return int(valor)
+    if isinstance(valor, str) and valor.strip().upper() in VALORES_BOOLEANOS:
+        return VALORES_BOOLEANOS[valor.strip().upper()]
+    numero = para_real(valor)
+    return int(numero) if numero is not None else None
+
+def para_texto(valor):
+    """
+    Converte um valor da base para texto sem espaços nas pontas (1.0 -> "1"); ausentes viram None.
+    """
+    if _ausente(valor):
+        return None
+    if isinstance(valor, (float, np.floating)) and float(valor).is_integer():
+        return str(int(valor))
+    return str(valor).strip()
+
+CONVERSORES = {"TEXT": para_texto, "REAL": para_real, "INTEGER": _para_inteiro}
+
+def id_caso(registro):
+    """
+    Identificador estável de um caso: fonte + processoID (ou número do processo).
+    Casos sem número de processo (IOPC) usam um hash dos campos que identificam o incidente.
+    """
+    fonte = para_texto(registro.get('fonte_dados')) or 'Desconhecida'
+    for coluna in ('processoID', 'numero_processo'):
+        valor = para_texto(registro.get(coluna))
+        if valor is not None:
+            return f"{fonte}:{valor}"
+    campos = [para_texto(registro.get(coluna)) for coluna in ('pais', 'regiao', 'data_impacto', 'valor_multa', 'moeda')]
+    return f"{fonte}:" + hashlib.sha1(json.dumps(campos).encode('utf-8')).hexdigest()[:16]
+
+def normaliza_registros(dados):
+    """
+    Converte um DataFrame (ou lista de dicionários) para a lista de tuplas na ordem de COLUNAS_CASOS,
+    com os tipos do SCHEMA_CASOS. Colunas ausentes ficam NULL; colunas desconhecidas são ignoradas.
+    """
+    registros = dados.to_dict('records') if isinstance(dados, pd.DataFrame) else list(dados)
+    linhas = []
+    for registro in registros:
+        if _ausente(registro.get('id_caso')):
+            registro = {**registro, 'id_caso': id_caso(registro)}
+        linhas.append(tuple(CONVERSORES[tipo](registro.get(coluna)) for coluna, tipo in SCHEMA_CASOS.items()))
+    return linhas
+
+class BancoResultados:
+    """
+    Base unificada de casos em SQLite com colunas tipadas, modo WAL e gravação em lotes.
+    É lida diretamente pelo dashboard e pela geocodificação, sem passar por planilhas Excel.
+    """
+    def __init__(self, caminho=DB_FILE_NAME):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(caminho, check_same_thread=False, timeout=60)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        colunas_sql = ",\n".join(f'"{coluna}" {tipo}' for coluna, tipo in SCHEMA_CASOS.items() if coluna != 'id_caso')
+        with self._conn:
+            self._conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {TABLE_CASOS} (
+                    "id_caso" TEXT PRIMARY KEY,
+                    {colunas_sql}
+                )
+            """)
+            for coluna in INDICES_CASOS:
+                self._conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{TABLE_CASOS}_{coluna} ON {TABLE_CASOS} ("{coluna}")')
+
+    @staticmethod
+    def _sql_upsert(colunas=None):
+        # INSERT que, para um id_caso já existente, atualiza as `colunas` (todas, por padrão)
+        colunas_atualizadas = [coluna for coluna in (colunas or COLUNAS_CASOS) if coluna != 'id_caso']
+        nomes = ", ".join(f'"{coluna}"' for coluna in COLUNAS_CASOS)
+        placeholders = ", ".join("?" * len(COLUNAS_CASOS))
+        atualizacao = ", ".join(f'"{coluna}" = excluded."{coluna}"' for coluna in colunas_atualizadas)
+        return (f'INSERT INTO {TABLE_CASOS} ({nomes}) VALUES ({placeholders}) '
+                f'ON CONFLICT("id_caso") DO UPDATE SET {atualizacao}')
+
+    def upsert(self, dados, tamanho_lote=1000, colunas=None):
+        """
+        Insere ou atualiza os casos (DataFrame ou lista de dicionários) em lotes, um lote por transação.
+        Com `colunas`, apenas essas colunas são atualizadas nos casos que já existem.
+        Retorna o número de casos gravados.
+        """
+        linhas = normaliza_registros(dados)
+        sql = self._sql_upsert(colunas)
+        with self._lock:
+            for inicio in range(0, len(linhas), tamanho_lote):
+                with self._conn:
+                    self._conn.executemany(sql, linhas[inicio:inicio + tamanho_lote])
+        return len(linhas)
+
+    def substitui(self, dados, tamanho_lote=1000):
+        """
+        Substitui todo o conteúdo da base pelos casos informados (em uma única transação).
+        Casos repetidos (mesmo id_caso) ficam com a última ocorrência, como no upsert.
+        Retorna o número de casos distintos gravados.
+        """
+        linhas = normaliza_registros(dados)
+        sql = self._sql_upsert()
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {TABLE_CASOS}")
+            for inicio in range(0, len(linhas), tamanho_lote):
+                self._conn.executemany(sql, linhas[inicio:inicio + tamanho_lote])
+        return len({linha[0] for linha in linhas})
+
+    def consulta(self, colunas=None, tipo_impacto_geral=None, uf=None, moeda=None, fonte_dados=None,
+                 valor_min=None, valor_max=None, com_coordenadas=None, numero_processo=None, limite=None):
+        """
+        Retorna um DataFrame com os casos que atendem aos filtros. Filtros de lista (tipo_impacto_geral,
+        uf, moeda, fonte_dados) aceitam um valor ou uma lista de valores; None não filtra.
+        """
+        condicoes, parametros = [], []
+        for coluna, valores in (('tipo_impacto_geral', tipo_impacto_geral), ('uf', uf), ('moeda', moeda),
+                                ('fonte_dados', fonte_dados), ('numero_processo', numero_processo)):
+            if valores is None:
+                continue
+            valores = [valores] if isinstance(valores, str) else list(valores)
+            condicoes.append(f'"{coluna}" IN ({", ".join("?" * len(valores))})')
+            parametros.extend(valores)
+        if valor_min is not None:
+            condicoes.append('"valor_multa" >= ?')
+            parametros.append(valor_min)
+        if valor_max is not None:
+            condicoes.append('"valor_multa" <= ?')
+            parametros.append(valor_max)
+        if com_coordenadas is not None:
+            condicoes.append('"latitude" IS NOT NULL AND "longitude" IS NOT NULL' if com_coordenadas
+                             else '("latitude" IS NULL OR "longitude" IS NULL)')
+        nomes = ", ".join(f'"{coluna}"' for coluna in (colunas or COLUNAS_CASOS))
+        sql = f"SELECT {nomes} FROM {TABLE_CASOS}"
+        if condicoes:
+            sql += " WHERE " + " AND ".join(condicoes)
+        if limite is not None:
+            sql += f" LIMIT {int(limite)}"
+        with self._lock:
+            return pd.read_sql_query(sql, self._conn, params=parametros)
+
+    def obtem(self, id_caso):
+        """
+        Retorna um caso como dicionário (ou None se não existir).
+        """
+        with self._lock:
+            cursor = self._conn.execute(f'SELECT * FROM {TABLE_CASOS} WHERE "id_caso" = ?', (id_caso,))
+            linha = cursor.fetchone()
+            nomes = [descricao[0] for descricao in cursor.description]
+        return dict(zip(nomes, linha)) if linha else None
+
+    def sem_coordenadas(self):
+        """
+        Casos ainda sem latitude/longitude (entrada da geocodificação).
+        """
+        return self.consulta(com_coordenadas=False)
+
+    def atualiza_coordenadas(self, df):
+        """
+        Grava latitude, longitude e geo_precisao dos casos do DataFrame (identificados por id_caso).
+        """
+        linhas = [(para_real(registro.get('latitude')), para_real(registro.get('longitude')),
+                   para_texto(registro.get('geo_precisao')), registro['id_caso'] if not _ausente(registro.get('id_caso')) else id_caso(registro))
+                  for registro in df.to_dict('records')]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f'UPDATE {TABLE_CASOS} SET "latitude" = ?, "longitude" = ?, "geo_precisao" = ? WHERE "id_caso" = ?', linhas
+            )
+        return len(linhas)
+
+    def contagem(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {TABLE_CASOS}").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+# Base compartilhada por padrão
+_banco_padrao = None
+_lock_banco_padrao = threading.Lock()
+
+def banco_padrao():
+    """
+    Retorna a base de resultados compartilhada, criada na primeira chamada.
+    """
+    global _banco_padrao
+    with _lock_banco_padrao:
+        if _banco_padrao is None:
+            _banco_padrao = BancoResultados()
+        return _banco_padrao
+
+if __name__ == "__main__":
+    # Importa uma planilha (por padrão, a base geocodificada) para a base de resultados
+    caminho = sys.argv[1] if len(sys.argv) > 1 else 'docs/results_geocoded.xlsx'
+    df = pd.read_excel(caminho)
+    banco = banco_padrao()
+    print(f"{banco.upsert(df)} casos gravados de '{caminho}'. Total na base: {banco.contagem()}")
@@ -0,0 +1,209 @@
+"""
+Benchmarks de desempenho do projeto.
+
+Uso:
+    python benchmarks.py carga [--fatores 1 10 100] [--sem-excel] [--max-fator-excel 10]
+    python benchmarks.py coordenadas [--linhas 10000 100000]
+    python benchmarks.py callbacks [--linhas 10000 100000]
+"""
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+def _cronometra(funcao, repeticoes=1):
+    # Melhor tempo entre as repetições (menos sensível a ruído)
+    melhor, resultado = None, None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        duracao = time.perf_counter() - inicio
+        melhor = duracao if melhor is None else min(melhor, duracao)
+    return melhor, resultado
+
+def _replica(df, fator):
+    return pd.concat([df] * fator, ignore_index=True) if fator > 1 else df
+
+def benchmark_carga(fatores=(1, 10, 100), excel=True, max_fator_excel=10):
+    """
+    Tempo de leitura e gravação da base geocodificada em Excel e em Parquet, com a base original
+    replicada `fator` vezes. O Excel só é medido até `max_fator_excel` (acima disso leva vários minutos).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from dados import CAMINHO_GEOCODIFICADA, ESQUEMA_GEOCODIFICADA, aplica_esquema, carrega_parquet, exporta_excel
+
+    base = aplica_esquema(carrega_parquet(CAMINHO_GEOCODIFICADA), ESQUEMA_GEOCODIFICADA)
+    tabela_base = pa.Table.from_pandas(base, schema=ESQUEMA_GEOCODIFICADA, preserve_index=False)
+    # Colunas usadas pelo dashboard: com Parquet, só elas são lidas do disco
+    colunas_dashboard = ['latitude', 'longitude', 'tipo_impacto', 'tipo_impacto_geral', 'valor_multa', 'moeda',
+                         'numero_processo', 'municipio', 'uf', 'descricao_impacto']
+    resultados = []
+    with tempfile.TemporaryDirectory() as pasta:
+        for fator in fatores:
+            # Replicada no Arrow, a tabela reaproveita os mesmos buffers (não multiplica a memória)
+            tabela = pa.concat_tables([tabela_base] * fator)
+            caminho_parquet = os.path.join(pasta, f'base_{fator}.parquet')
+            caminho_excel = os.path.join(pasta, f'base_{fator}.xlsx')
+            linha = {'fator': fator, 'linhas': tabela.num_rows}
+
+            linha['gravacao_parquet_s'], _ = _cronometra(lambda: pq.write_table(tabela, caminho_parquet, compression='zstd'))
+            linha['leitura_parquet_s'], _ = _cronometra(lambda: pd.read_parquet(caminho_parquet), repeticoes=3)
+            linha['leitura_parquet_colunas_s'], _ = _cronometra(lambda: pd.read_parquet(caminho_parquet, columns=colunas_dashboard), repeticoes=3)
+            linha['tamanho_parquet_mb'] = round(os.path.getsize(caminho_parquet) / 2**20, 2)
+            if excel and fator <= max_fator_excel:
+                df = _replica(base, fator)
+                linha['gravacao_excel_s'], _ = _cronometra(lambda: exporta_excel(df, caminho_excel))
+                linha['leitura_excel_s'], _ = _cronometra(lambda: pd.read_excel(caminho_excel))
+                linha['tamanho_excel_mb'] = round(os.path.getsize(caminho_excel) / 2**20, 2)
+                linha['ganho_leitura'] = round(linha['leitura_excel_s'] / linha['leitura_parquet_s'], 1)
+                del df
+            resultados.append(linha)
+            print({chave: round(valor, 3) if isinstance(valor, float) else valor for chave, valor in linha.items()})
+    return pd.DataFrame(resultados)
+
+def benchmark_coordenadas(linhas=(10000, 100000)):
+    """
+    Vazão do parser de coordenadas (coordenadas.py) com os textos do corpus de regressão repetidos até
+    `linhas` linhas: coluna inteira (vetorizado) e um texto por vez (parse_georreferencia, memorizado).
+    """
+    from coordenadas import CAMINHO_CORPUS, parse_georreferencia, parse_georreferencia_vetorizado
+    textos = pd.read_csv(CAMINHO_CORPUS, usecols=['texto'], keep_default_na=False)['texto']
+    resultados = []
+    for quantidade in linhas:
+        serie = pd.Series(np.resize(textos.to_numpy(dtype=object), quantidade), dtype=object)
+        linha = {'linhas': quantidade, 'textos_distintos': serie.nunique()}
+        linha['vetorizado_s'], coordenadas = _cronometra(lambda: parse_georreferencia_vetorizado(serie), repeticoes=3)
+        linha['vetorizado_linhas_por_s'] = int(quantidade / linha['vetorizado_s'])
+        parse_georreferencia.cache_clear()
+        linha['por_texto_s'], _ = _cronometra(lambda: [parse_georreferencia(texto) for texto in serie])
+        linha['por_texto_linhas_por_s'] = int(quantidade / linha['por_texto_s'])
+        linha['com_coordenadas'] = int(coordenadas['latitude'].notna().sum())
+        resultados.append(linha)
+        print({chave: round(valor, 3) if isinstance(valor, float) else valor for chave, valor in linha.items()})
+    return pd.DataFrame(resultados)
+
+def _base_sintetica(base, quantidade, semente=0):
+    # Linhas sorteadas da base real, com coordenadas levemente deslocadas e números de processo únicos
+    gerador = np.random.default_rng(semente)
+    df = base.iloc[gerador.integers(0, len(base), quantidade)].reset_index(drop=True)
+    df['latitude'] = df['latitude'] + gerador.normal(0, 0.05, quantidade)
+    df['longitude'] = df['longitude'] + gerador.normal(0, 0.05, quantidade)
+    df['numero_processo'] = [f"SINT-{numero:07d}" for numero in range(quantidade)]
+    df['processoID'] = df['numero_processo']
+    return df
+
+def _interacao_original(df_mapeavel, color_map, sel_g, sel_uf, moedas, hide_zero, rlog):
+    # Trabalho de uma interação no dashboard antes das colunas de exibição pré-calculadas: cada callback
+    # copiava e filtrava a base, a tabela formatava a moeda linha a linha e os marcadores levavam o popup completo
+    import dash_leaflet as dl
+    from dash import html
+
+    def format_currency(value, currency):
+        if pd.isna(value) or value == 0:
+            return ""
+        tmp = f"{value:,.2f}".replace('.', '#').replace(',', '.').replace('#', ',')
+        return f"{currency} {tmp}"
+
+    def filtra(geral, ufs):
+        dff = df_mapeavel.copy()
+        if geral: dff = dff[dff['tipo_impacto_geral'].isin(geral)]
+        if ufs: dff = dff[dff['uf'].isin(ufs)]
+        if moedas: dff = dff[dff['moeda'].isin(moedas)]
+        if 'hide_zero' in hide_zero: dff = dff[dff['valor_multa_numerico'] > 0]
+        lo, hi = rlog
+        return dff[(dff['valor_multa_numerico'] >= 10**lo) & (dff['valor_multa_numerico'] <= 10**hi)]
+
+    legenda = sorted(filtra(sel_g, None)['tipo_impacto_geral'].unique())
+    markers = []
+    for _, row in filtra(sel_g, sel_uf).iterrows():
+        markers.append(dl.CircleMarker(
+            center=[row.latitude, row.longitude], radius=8,
+            color=color_map[row.tipo_impacto_geral], fill=True, fillOpacity=0.7,
+            children=[
+                dl.Tooltip(f"{row.numero_processo} | Geral: {row.tipo_impacto_geral}"),
+                dl.Popup(html.Div([
+                    html.B(f"Impacto Geral: {row.tipo_impacto_geral}"),
+                    html.P(f"Det.: {row.tipo_impacto}"),
+                    html.P(f"Valor: {format_currency(row.valor_multa_numerico, row.moeda)}"),
+                    html.P(f"Moeda: {row.moeda}"),
+                    html.P(row.descricao_impacto)
+                ]))
+            ]
+        ))
+    dff = filtra(sel_g, sel_uf)
+    dff['valor_multa_numerico_formatado'] = dff.apply(
+        lambda row: format_currency(row['valor_multa_numerico'], row['moeda']), axis=1
+    )
+    data = dff[['numero_processo', 'municipio', 'uf', 'tipo_impacto', 'tipo_impacto_geral', 'moeda',
+                'valor_multa_numerico_formatado', 'descricao_impacto']].to_dict('records')
+    return legenda, markers, data
+
+def benchmark_callbacks(linhas=(10000, 100000)):
+    """
+    Latência de uma interação no dashboard (legenda, marcadores, gráfico/resumo e tabela) com bases sintéticas
+    de `linhas` linhas: como era antes (filtro e formatação a cada callback, tabela inteira e popups completos)
+    e com as colunas de exibição pré-calculadas em app.carrega_dados, sem e com os caches dos filtros.
+    """
+    import io
+    import contextlib
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app
+    from dados import CAMINHO_GEOCODIFICADA, carrega_parquet
+
+    base = carrega_parquet(CAMINHO_GEOCODIFICADA).dropna(subset=['latitude', 'longitude'])
+    resultados = []
+    for quantidade in linhas:
+        sintetica = _base_sintetica(base, quantidade)
+        linha = {'linhas': quantidade}
+        linha['carga_s'], _ = _cronometra(lambda: app.carrega_dados(sintetica.copy()))
+        filtros = ([], [], ['R$'], [], [app.min_log, app.max_log])
+        sel_g, sel_uf, moedas, hide_zero, rlog = filtros
+
+        def interacao():
+            app.update_legend(sel_g, moedas, hide_zero, rlog)
+            app.update_markers(*filtros, 4, None)
+            app.update_dashboard(*filtros)
+            return app.pagina_tabela(app.filtros_painel(*filtros), '', [], 0)
+
+        def sem_cache():
+            app.motor_filtros._indices.cache_clear()
+            app.consulta_tabela._ordem.cache_clear()
+            return interacao()
+
+        linha['antes_s'], _ = _cronometra(lambda: _interacao_original(app.df_mapeavel, app.color_map, *filtros))
+        linha['depois_s'], _ = _cronometra(sem_cache, repeticoes=3)
+        linha['depois_cache_s'], _ = _cronometra(interacao, repeticoes=3)
+        linha['ganho'] = round(linha['antes_s'] / linha['depois_s'], 1)
+        linha['formatacao_moeda_s'], _ = _cronometra(
+            lambda: app.formata_moedas(app.df_mapeavel['valor_multa_numerico'], app.df_mapeavel['moeda']), repeticoes=3)
+        resultados.append(linha)
+        print({chave: round(valor, 3) if isinstance(valor, float) else valor for chave, valor in linha.items()})
+    return pd.DataFrame(resultados)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks de desempenho.")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    parser_carga = subparsers.add_parser('carga', help="Leitura/gravação da base em Excel x Parquet")
+    parser_carga.add_argument('--fatores', nargs='+', type=int, default=[1, 10, 100])
+    parser_carga.add_argument('--sem-excel', action='store_true', help="Mede apenas o Parquet")
+    parser_carga.add_argument('--max-fator-excel', type=int, default=10, help="Maior fator medido em Excel")
+
+    parser_coordenadas = subparsers.add_parser('coordenadas', help="Vazão do parser de coordenadas")
+    parser_coordenadas.add_argument('--linhas', nargs='+', type=int, default=[10000, 100000])
+
+    parser_callbacks = subparsers.add_parser('callbacks', help="Latência dos callbacks do dashboard")
+    parser_callbacks.add_argument('--linhas', nargs='+', type=int, default=[10000, 100000])
+
+    args = parser.parse_args()
+    if args.benchmark == 'carga':
+        resultado = benchmark_carga(args.fatores, excel=not args.sem_excel, max_fator_excel=args.max_fator_excel)
+    elif args.benchmark == 'coordenadas':
+        resultado = benchmark_coordenadas(args.linhas)
+    elif args.benchmark == 'callbacks':
+        resultado = benchmark_callbacks(args.linhas)
+    print()
+    print(resultado.to_string(index=False))
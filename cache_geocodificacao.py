@@ -0,0 +1,219 @@
+import os
+import sys
+import time
+import sqlite3
+import threading
+import unicodedata
+
+# Arquivo padrão do cache de geocodificação (pode ser alterado pelo .env)
+CAMINHO_CACHE_GEOCODIFICACAO = os.getenv('CACHE_GEOCODIFICACAO', 'cache/geocodificacao.db')
+
+# Por quantos dias um "não encontrado" fica no cache antes de ser consultado de novo
+TTL_NEGATIVO_DIAS = 30
+
+class Localizacao:
+    """
+    Resultado de uma geocodificação, com os mesmos atributos usados do geopy.Location.
+    """
+    def __init__(self, latitude, longitude, address=''):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.address = address
+
+    def __repr__(self):
+        return f"Localizacao({self.latitude}, {self.longitude}, {self.address!r})"
+
+def normaliza_consulta(consulta):
+    """
+    Chave do cache: consulta sem acentos, em minúsculas e com espaços e vírgulas padronizados.
+    Ex.: "  São Paulo ,SP, Brasil" -> "sao paulo, sp, brasil"
+    """
+    texto = unicodedata.normalize('NFKD', str(consulta))
+    texto = ''.join(caractere for caractere in texto if not unicodedata.combining(caractere))
+    partes = [' '.join(parte.split()) for parte in texto.lower().split(',')]
+    return ', '.join(parte for parte in partes if parte)
+
+def consulta_municipio(municipio, uf):
+    # Consulta usada para geocodificar pelo município/UF (JusBrasil e juscraper)
+    return f"{str(municipio).strip()}, {str(uf).strip()[:2].upper()}, Brasil"
+
+def consulta_regiao(regiao):
+    # Consulta usada para geocodificar pela região (IOPC)
+    return str(regiao).strip()
+
+class CacheGeocodificacao:
+    """
+    Cache persistente (SQLite) de geocodificações, compartilhado entre execuções e entre scripts
+    (geocode_data.py e mapping.py). Guarda também os lugares não encontrados, que expiram após
+    `ttl_negativo_dias` para serem consultados de novo. Pode ser compartilhado entre threads.
+    """
+    def __init__(self, caminho=CAMINHO_CACHE_GEOCODIFICACAO, ttl_negativo_dias=TTL_NEGATIVO_DIAS):
+        self.caminho = caminho
+        self.ttl_negativo_dias = ttl_negativo_dias
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        self._conn = sqlite3.connect(caminho, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS geocodificacoes (
+                chave TEXT PRIMARY KEY,
+                consulta TEXT NOT NULL,
+                latitude REAL,
+                longitude REAL,
+                endereco TEXT,
+                fonte TEXT,
+                criado_em REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def obtem(self, consulta):
+        """
+        Retorna (em_cache, localizacao). `localizacao` é None quando o lugar está no cache como não encontrado.
+        Negativos mais antigos que o TTL são tratados como ausentes.
+        """
+        with self._lock:
+            linha = self._conn.execute(
+                "SELECT latitude, longitude, endereco, criado_em FROM geocodificacoes WHERE chave = ?",
+                (normaliza_consulta(consulta),)
+            ).fetchone()
+        if linha is None:
+            self.misses += 1
+            return False, None
+        latitude, longitude, endereco, criado_em = linha
+        if latitude is None or longitude is None:
+            if time.time() - criado_em > self.ttl_negativo_dias * 86400:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            return True, None
+        self.hits += 1
+        return True, Localizacao(latitude, longitude, endereco or '')
+
+    def salva(self, consulta, localizacao, fonte='nominatim'):
+        """
+        Armazena o resultado da consulta (localizacao=None registra um "não encontrado").
+        """
+        self.salva_varios([(consulta, localizacao)], fonte)
+
+    def salva_varios(self, resultados, fonte='nominatim', substituir=True):
+        """
+        Armazena vários pares (consulta, localizacao) em uma única transação.
+        Com substituir=False, consultas que já estão no cache são mantidas.
+        """
+        agora = time.time()
+        linhas = [(normaliza_consulta(consulta), str(consulta),
+                   getattr(localizacao, 'latitude', None), getattr(localizacao, 'longitude', None),
+                   getattr(localizacao, 'address', None), fonte, agora)
+                  for consulta, localizacao in resultados]
+        comando = "INSERT OR REPLACE" if substituir else "INSERT OR IGNORE"
+        with self._lock:
+            antes = self._conn.total_changes
+            self._conn.executemany(
+                f"{comando} INTO geocodificacoes (chave, consulta, latitude, longitude, endereco, fonte, criado_em) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                linhas
+            )
+            self._conn.commit()
+            return self._conn.total_changes - antes
+
+    def geocodifica(self, consulta, geocode, fonte='nominatim'):
+        """
+        Retorna a localização da consulta pelo cache ou, se não estiver no cache, chamando `geocode(consulta)`
+        e guardando o resultado. Erros (rede, limite de requisições) não são guardados: a consulta
+        será refeita na próxima vez. Retorna None se o lugar não for encontrado.
+        """
+        em_cache, localizacao = self.obtem(consulta)
+        if em_cache:
+            return localizacao
+        localizacao = geocode(consulta)
+        if localizacao is not None:
+            localizacao = Localizacao(localizacao.latitude, localizacao.longitude, getattr(localizacao, 'address', '') or '')
+        self.salva(consulta, localizacao, fonte)
+        return localizacao
+
+    def pre_aquece(self, df):
+        """
+        Preenche o cache com as coordenadas de uma base já geocodificada (ex.: docs/results_geocoded),
+        sem sobrescrever o que já está no cache. Retorna o número de consultas novas.
+        """
+        resultados = {}
+        for registro in df.to_dict('records'):
+            precisao = registro.get('geo_precisao')
+            latitude, longitude = registro.get('latitude'), registro.get('longitude')
+            if latitude is None or longitude is None or latitude != latitude or longitude != longitude:
+                continue
+            if precisao == 'Município (Aprox.)' and _preenchido(registro.get('municipio')) and _preenchido(registro.get('uf')):
+                consulta = consulta_municipio(registro['municipio'], registro['uf'])
+            elif precisao == 'Região (Aprox.)' and _preenchido(registro.get('regiao')):
+                consulta = consulta_regiao(registro['regiao'])
+            else:
+                continue
+            resultados[normaliza_consulta(consulta)] = (consulta, Localizacao(float(latitude), float(longitude)))
+        return self.salva_varios(resultados.values(), fonte='pre-aquecimento', substituir=False)
+
+    def estatisticas(self):
+        with self._lock:
+            positivos, negativos = self._conn.execute(
+                "SELECT SUM(latitude IS NOT NULL), SUM(latitude IS NULL) FROM geocodificacoes"
+            ).fetchone()
+        consultas = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'taxa_acerto': round(self.hits / consultas, 3) if consultas else 0.0,
+            'encontrados': positivos or 0,
+            'nao_encontrados': negativos or 0,
+        }
+
+    def limpa(self):
+        # Remove todas as entradas do cache
+        with self._lock:
+            self._conn.execute("DELETE FROM geocodificacoes")
+            self._conn.commit()
+
+def _preenchido(valor):
+    return isinstance(valor, str) and valor.strip() != '' and valor.strip().upper() != 'NULL'
+
+def pre_aquece_da_base(cache):
+    """
+    Pré-aquece o cache com a base geocodificada publicada (docs/results_geocoded), se existir.
+    """
+    from dados import CAMINHO_GEOCODIFICADA, carrega_parquet
+    try:
+        df = carrega_parquet(CAMINHO_GEOCODIFICADA, colunas=['municipio', 'uf', 'regiao', 'latitude', 'longitude', 'geo_precisao'])
+    except FileNotFoundError:
+        return 0
+    return cache.pre_aquece(df)
+
+# Cache compartilhado por padrão
+_cache_padrao = None
+_lock_cache_padrao = threading.Lock()
+
+def cache_geocodificacao_padrao():
+    """
+    Retorna o cache compartilhado, criado na primeira chamada. Se o cache estiver vazio,
+    é pré-aquecido com a base geocodificada publicada.
+    """
+    global _cache_padrao
+    with _lock_cache_padrao:
+        if _cache_padrao is None:
+            _cache_padrao = CacheGeocodificacao()
+            estatisticas = _cache_padrao.estatisticas()
+            if estatisticas['encontrados'] + estatisticas['nao_encontrados'] == 0:
+                novos = pre_aquece_da_base(_cache_padrao)
+                if novos:
+                    print(f"Cache de geocodificação pré-aquecido com {novos} lugares da base geocodificada.")
+        return _cache_padrao
+
+if __name__ == "__main__":
+    # python cache_geocodificacao.py pre-aquece | estatisticas | limpa
+    comando = sys.argv[1] if len(sys.argv) > 1 else 'estatisticas'
+    cache = CacheGeocodificacao()
+    if comando == 'pre-aquece':
+        print(f"{pre_aquece_da_base(cache)} lugares adicionados ao cache.")
+    elif comando == 'limpa':
+        cache.limpa()
+    print(cache.estatisticas())
@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+# Arquivo padrão do cache de respostas do Gemini (pode ser alterado pelo .env)
+CAMINHO_CACHE = os.getenv('CACHE_GEMINI', 'cache/respostas_gemini.db')
+
+# Limites padrão de eviction
+MAX_ENTRADAS = 200_000
+MAX_IDADE_DIAS = 365
+
+# A cada quantas inserções os limites de tamanho/idade são reaplicados
+INTERVALO_LIMPEZA = 1000
+
+# Objeto com o mesmo formato das respostas da API (atributo .text com o JSON), usado quando a resposta vem do cache
+class RespostaCache:
+    def __init__(self, text: str):
+        self.text = text
+        self.from_cache = True
+
+def chave_cache(funcao, modelo, versao_prompt, texto):
+    """
+    Chave do cache: hash SHA-256 de (função, modelo, versão do prompt, texto de entrada).
+    Qualquer mudança em um desses elementos gera uma chave nova.
+    """
+    conteudo = json.dumps([funcao, modelo, versao_prompt, str(texto)], ensure_ascii=False)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+class CacheRespostas:
+    """
+    Cache persistente (SQLite) de respostas do LLM, endereçado pelo conteúdo da requisição.
+    Remove entradas mais antigas que `max_idade_dias` e, acima de `max_entradas`, as acessadas há mais tempo.
+    Pode ser compartilhado entre threads.
+    """
+    def __init__(self, caminho=CAMINHO_CACHE, max_entradas=MAX_ENTRADAS, max_idade_dias=MAX_IDADE_DIAS):
+        self.caminho = caminho
+        self.max_entradas = max_entradas
+        self.max_idade_dias = max_idade_dias
+        self.hits = 0
+        self.misses = 0
+        self._insercoes = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        self._conn = sqlite3.connect(caminho, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS respostas (
+                chave TEXT PRIMARY KEY,
+                funcao TEXT NOT NULL,
+                resposta TEXT NOT NULL,
+                criado_em REAL NOT NULL,
+                acessado_em REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_respostas_acessado_em ON respostas (acessado_em)")
+        self._conn.commit()
+        self.aplica_limites()
+
+    def obtem(self, chave):
+        """
+        Retorna o texto da resposta armazenada para a chave, ou None se não houver.
+        """
+        with self._lock:
+            linha = self._conn.execute(
+                "SELECT resposta, criado_em FROM respostas WHERE chave = ?", (chave,)
+            ).fetchone()
+            agora = time.time()
+            if linha is None or agora - linha[1] > self.max_idade_dias * 86400:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE respostas SET acessado_em = ? WHERE chave = ?", (agora, chave))
+            self._conn.commit()
+            self.hits += 1
+            return linha[0]
+
+    def salva(self, chave, funcao, resposta):
+        """
+        Armazena o texto (JSON) da resposta para a chave.
+        """
+        with self._lock:
+            agora = time.time()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO respostas (chave, funcao, resposta, criado_em, acessado_em) VALUES (?, ?, ?, ?, ?)",
+                (chave, funcao, resposta, agora, agora)
+            )
+            self._conn.commit()
+            self._insercoes += 1
+            limpar = self._insercoes % INTERVALO_LIMPEZA == 0
+        if limpar:
+            self.aplica_limites()
+
+    def aplica_limites(self):
+        """
+        Remove entradas expiradas e, se o cache passar de `max_entradas`, as menos acessadas recentemente.
+        Retorna o número de entradas removidas.
+        """
+        with self._lock:
+            limite_idade = time.time() - self.max_idade_dias * 86400
+            removidas = self._conn.execute("DELETE FROM respostas WHERE criado_em < ?", (limite_idade,)).rowcount
+            total = self._conn.execute("SELECT COUNT(*) FROM respostas").fetchone()[0]
+            if total > self.max_entradas:
+                removidas += self._conn.execute("""
+                    DELETE FROM respostas WHERE chave IN (
+                        SELECT chave FROM respostas ORDER BY acessado_em ASC LIMIT ?
+                    )
+                """, (total - self.max_entradas,)).rowcount
+            self._conn.commit()
+            return removidas
+
+    def estatisticas(self):
+        """
+        Retorna acertos (hits), faltas (misses), taxa de acerto e número de entradas por função.
+        """
+        with self._lock:
+            por_funcao = dict(self._conn.execute("SELECT funcao, COUNT(*) FROM respostas GROUP BY funcao").fetchall())
+        consultas = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'taxa_acerto': round(self.hits / consultas, 3) if consultas else 0.0,
+            'entradas': sum(por_funcao.values()),
+            'entradas_por_funcao': por_funcao,
+        }
+
+    def limpa(self):
+        # Remove todas as entradas do cache
+        with self._lock:
+            self._conn.execute("DELETE FROM respostas")
+            self._conn.commit()
+
+# Cache compartilhado por padrão entre todas as funções de functions.py
+_cache_padrao = None
+_lock_cache_padrao = threading.Lock()
+
+def cache_padrao():
+    """
+    Retorna o cache compartilhado, criado na primeira chamada.
+    """
+    global _cache_padrao
+    with _lock_cache_padrao:
+        if _cache_padrao is None:
+            _cache_padrao = CacheRespostas()
+        return _cache_padrao
@@ -0,0 +1,127 @@
+"""
+Consulta da tabela do dashboard (app.py) no servidor: filtro da própria tabela (filter_query do DataTable),
+ordenação (sort_by) e paginação sobre as linhas já filtradas pelo MotorFiltros.
+
+Só a página visível é enviada ao navegador. A ordem das linhas de cada combinação de filtros e ordenação
+fica memorizada, então trocar de página não refaz o filtro nem a ordenação.
+"""
+import re
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from banco_resultados import para_real
+
+# Consultas (filtros + filtro da tabela + ordenação) memorizadas
+TAMANHO_CACHE_CONSULTAS = 64
+
+# Operadores do filter_query do DataTable (forma por extenso e forma simbólica)
+OPERADORES = {
+    'eq': '=', '=': '=', 'ne': '!=', '!=': '!=',
+    'lt': '<', '<': '<', 'le': '<=', '<=': '<=', 'gt': '>', '>': '>', 'ge': '>=', '>=': '>=',
+    'contains': 'contains', 'datestartswith': 'datestartswith', 'is': 'is',
+}
+
+# Comparações dos operadores relacionais
+COMPARACOES = {
+    '=': np.equal, '!=': np.not_equal, '<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal,
+}
+
+_CONDICAO = re.compile(r'^\{(?P<coluna>[^}]+)\}\s*(?P<operador>[a-z]+|[<>!=]+)\s*(?P<valor>.*)$')
+
+def separa_condicoes(filter_query):
+    """
+    Condições (coluna, operador, valor, diferencia_maiusculas) de um filter_query do DataTable,
+    ex.: '{uf} = "SP" && {descricao_impacto} icontains rio'. Condições que não seguem a sintaxe são ignoradas.
+    """
+    condicoes = []
+    for parte in (filter_query or '').split(' && '):
+        encontrado = _CONDICAO.match(parte.strip())
+        if not encontrado:
+            continue
+        operador = encontrado['operador']
+        # Prefixos de caixa: 'i' (ignora maiúsculas/minúsculas) e 's' (diferencia)
+        sensivel = True
+        if operador[:1] in ('i', 's') and operador[1:] in OPERADORES and operador not in OPERADORES:
+            sensivel, operador = operador[0] == 's', operador[1:]
+        if operador not in OPERADORES:
+            continue
+        valor = encontrado['valor'].strip()
+        if len(valor) >= 2 and valor[0] == valor[-1] and valor[0] in '"\'`':
+            valor = valor[1:-1].replace('\\' + valor[0], valor[0])
+        condicoes.append((encontrado['coluna'], OPERADORES[operador], valor, sensivel))
+    return condicoes
+
+class ConsultaTabela:
+    """
+    Filtro, ordenação e paginação da tabela sobre o DataFrame do MotorFiltros.
+    `numericas` associa colunas exibidas como texto (ex.: valor formatado) à coluna numérica usada para
+    filtrar com >, < etc. e para ordenar.
+    """
+    def __init__(self, motor, numericas=None, tamanho_cache=TAMANHO_CACHE_CONSULTAS):
+        self.motor = motor
+        self.df = motor.df
+        self.numericas = dict(numericas or {})
+        self._ordem = lru_cache(maxsize=tamanho_cache)(self._calcula_ordem)
+
+    def _mascara_condicao(self, indices, coluna, operador, valor, sensivel):
+        if coluna not in self.df.columns:
+            return np.ones(len(indices), dtype=bool)
+        numerica = self.numericas.get(coluna)
+        if operador == 'is':
+            vazios = self.df[numerica or coluna].iloc[indices].isna().to_numpy(dtype=bool)
+            return vazios if valor == 'blank' else ~vazios
+        if operador in ('contains', 'datestartswith'):
+            textos = self.df[coluna].iloc[indices].astype('string').fillna('')
+            if not sensivel:
+                textos, valor = textos.str.lower(), valor.lower()
+            encontrados = textos.str.contains(valor, regex=False) if operador == 'contains' else textos.str.startswith(valor)
+            return encontrados.to_numpy(dtype=bool)
+        # Comparações: numéricas nas colunas de números (ou associadas a uma), textuais nas demais
+        numero = para_real(valor)
+        if numerica is not None or (numero is not None and pd.api.types.is_numeric_dtype(self.df[coluna])):
+            if numero is None:
+                return np.zeros(len(indices), dtype=bool)
+            valores = self.df[numerica or coluna].to_numpy(dtype=float, na_value=np.nan)[indices]
+            return COMPARACOES[operador](valores, numero)
+        textos = self.df[coluna].iloc[indices].astype('string').fillna('')
+        if not sensivel:
+            textos, valor = textos.str.lower(), valor.lower()
+        return np.asarray(COMPARACOES[operador](textos.to_numpy(dtype=object), valor), dtype=bool)
+
+    def _calcula_ordem(self, chave_filtros, filter_query, ordenacao):
+        indices = self.motor.indices_da_chave(chave_filtros)
+        for coluna, operador, valor, sensivel in separa_condicoes(filter_query):
+            indices = indices[self._mascara_condicao(indices, coluna, operador, valor, sensivel)]
+        ordenacao = [(self.numericas.get(coluna, coluna), direcao) for coluna, direcao in ordenacao if
+                     self.numericas.get(coluna, coluna) in self.df.columns]
+        if ordenacao and len(indices):
+            colunas = [coluna for coluna, _ in ordenacao]
+            selecao = self.df[colunas].iloc[indices].reset_index(drop=True)
+            posicoes = selecao.sort_values(colunas, ascending=[direcao == 'asc' for _, direcao in ordenacao],
+                                           kind='stable', na_position='last').index.to_numpy()
+            indices = indices[posicoes]
+        indices.setflags(write=False)
+        return indices
+
+    def indices(self, filtros, filter_query='', sort_by=None):
+        """
+        Posições (iloc) das linhas que atendem aos filtros do painel (dicionário com os argumentos de
+        MotorFiltros.indices) e ao filter_query, na ordem de sort_by ([{'column_id':..., 'direction':...}]).
+        """
+        ordenacao = tuple((item['column_id'], item['direction']) for item in (sort_by or []))
+        return self._ordem(self.motor.chave(**filtros), (filter_query or '').strip(), ordenacao)
+
+    def pagina(self, filtros, filter_query='', sort_by=None, pagina=0, tamanho=10, colunas=None):
+        """
+        Linhas da página pedida (a última existente, se a página passar do fim) e o número de páginas.
+        Retorna (DataFrame da página, total de páginas, página efetiva).
+        """
+        indices = self.indices(filtros, filter_query, sort_by)
+        paginas = max(1, -(-len(indices) // tamanho))
+        pagina = min(max(pagina or 0, 0), paginas - 1)
+        df = self.df if colunas is None else self.df[list(colunas)]
+        return df.iloc[indices[pagina * tamanho:(pagina + 1) * tamanho]], paginas, pagina
+
+    def estatisticas(self):
+        info = self._ordem.cache_info()
+        return {'hits': info.hits, 'misses': info.misses, 'consultas': info.currsize}
@@ -0,0 +1,257 @@
+"""
+Parser de coordenadas dos textos extraídos das sentenças (coluna 'georreferencia'), compartilhado por
+geocode_data.py e mapping.py.
+
+Formatos reconhecidos:
+    DMS       07°43’11.00” S e 61°28’11.00” O  |  22° 26' 54,0'' S  |  48º5710.0´´ O  |  23 DEG 32 MIN 51 SEC S
+    DM        23°32,85’ S e 46°38,17’ W
+    decimal   23,5475° S e 46,6361° O  |  -23.5475, -46.6361
+    UTM       23K 333000 E 7394000 N  |  W-289293/S-7303913  |  343.860 X 7.424.540  |  UTM 7.424.700N e 338.100E
+Os hemisférios podem vir como N/S e E/W/L/O (Leste/Oeste); quando há a letra, ela define o sinal.
+Coordenadas UTM sem a zona usam a zona informada pelo chamador (ex.: a do município, ver `zona_utm`)
+e, sem a letra da zona, são consideradas no hemisfério sul.
+
+Uso:
+    python coordenadas.py verifica    # confere o corpus de regressão (docs/coordenadas_corpus.csv)
+"""
+import re
+import sys
+import functools
+import numpy as np
+import pandas as pd
+
+CAMINHO_CORPUS = 'docs/coordenadas_corpus.csv'
+
+# Expressões de cada formato; compiladas uma única vez, na primeira utilização (ver `padrao`)
+_EXPRESSOES = {
+    # Graus, minutos e segundos (separadores por símbolo, DEG/MIN/SEC ou espaço)
+    'dms': (r"(\d+)\s*(?:°|º|DEG|GRAUS|\s)\s*(\d+)\s*(?:’|'|MIN|\s)\s*([\d\.,]+)\s*(?:”|\"|SEC|\s)\s*([NSEWLO])", re.IGNORECASE),
+    # Graus e minutos
+    'dm': (r"(\d+)\s*(?:°|º|DEG|GRAUS)\s*([\d\.,]+)\s*(?:’|'|MIN)\s*([NSEWLO])", re.IGNORECASE),
+    # Graus decimais com hemisfério
+    'decimal_hemisferio': (r"(\d{1,3}(?:[.,]\d+)?)\s*(?:°|º|GRAUS)\s*([NSEWLO])", re.IGNORECASE),
+    # Graus decimais com sinal
+    'decimal': (r"(?<!\d)([+-]?\d{1,3}[.,]\d+)(?!\d)", 0),
+    # Minutos e segundos sem separador ("48º5710.0”" -> "48º57’10.0”")
+    'dms_sem_separador': (r"([°º]\s*\d{2})(\d{2}(?:[.,]\d+)?\s*”)", 0),
+    # Separador de milhar nos números UTM ("7.424.540" -> "7424540")
+    'milhar': (r"(?<![\d.,])(\d{1,3})\.(\d{3})(?:\.(\d{3}))?(?![\d.,])", 0),
+    # Leste (6 dígitos) ou norte (7 dígitos) UTM, em metros
+    'utm_numero': (r"(?<![\d.,])(\d{6,7}(?:[.,]\d+)?)(?!\d)", 0),
+    # Zona UTM com a letra da faixa de latitude ("23K", "23°K", "22 S")
+    'utm_zona': (r"(?<![\d.,])([1-9]|[1-5]\d|60)\s*°?\s*([C-HJ-NP-X])(?![A-Za-z])", 0),
+    # Zona UTM por extenso ("fuso 23", "zona 22")
+    'utm_fuso': (r"(?:zona|fuso|zone)\s*(\d{1,2})", re.IGNORECASE),
+}
+
+# Aspas e apóstrofos usados como minutos (’) e segundos (”)
+_ASPAS = [("‘", "’"), ("“", "”"), ("´´", "”"), ("″", "”"), ("''", "”"), ("'", "’"), ("`", "’"), ("´", "’"), ("′", "’")]
+
+# Faixas de latitude UTM do hemisfério norte ("S" é usado no Brasil como "Sul", não como a faixa S)
+_FAIXAS_NORTE = list('NPQRTUVWX')
+
+@functools.lru_cache(maxsize=None)
+def padrao(nome):
+    """
+    Expressão regular compilada do formato `nome` (ver _EXPRESSOES), memorizada.
+    """
+    expressao, flags = _EXPRESSOES[nome]
+    return re.compile(expressao, flags)
+
+def zona_utm(longitude):
+    """
+    Zona UTM de uma longitude (ou array de longitudes), ex.: -46.6 -> 23.
+    """
+    return np.floor((np.asarray(longitude, dtype=float) + 180) / 6) + 1
+
+def utm_para_graus(leste, norte, zona, sul=True):
+    """
+    Converte coordenadas UTM (metros, WGS84/SIRGAS 2000) em (latitude, longitude) em graus.
+    Aceita escalares ou arrays; `sul` indica o hemisfério (falso norte de 10.000 km).
+    """
+    a, f, k0 = 6378137.0, 1 / 298.257223563, 0.9996
+    e2 = f * (2 - f)
+    ep2 = e2 / (1 - e2)
+    e1 = (1 - np.sqrt(1 - e2)) / (1 + np.sqrt(1 - e2))
+    x = np.asarray(leste, dtype=float) - 500000.0
+    y = np.asarray(norte, dtype=float) - np.where(sul, 10000000.0, 0.0)
+
+    mu = y / k0 / (a * (1 - e2 / 4 - 3 * e2**2 / 64 - 5 * e2**3 / 256))
+    phi1 = (mu + (3 * e1 / 2 - 27 * e1**3 / 32) * np.sin(2 * mu) + (21 * e1**2 / 16 - 55 * e1**4 / 32) * np.sin(4 * mu)
+            + (151 * e1**3 / 96) * np.sin(6 * mu) + (1097 * e1**4 / 512) * np.sin(8 * mu))
+    seno, cosseno, tangente = np.sin(phi1), np.cos(phi1), np.tan(phi1)
+    c1, t1 = ep2 * cosseno**2, tangente**2
+    n1 = a / np.sqrt(1 - e2 * seno**2)
+    r1 = a * (1 - e2) / (1 - e2 * seno**2) ** 1.5
+    d = x / (n1 * k0)
+
+    latitude = phi1 - (n1 * tangente / r1) * (d**2 / 2 - (5 + 3 * t1 + 10 * c1 - 4 * c1**2 - 9 * ep2) * d**4 / 24
+                                              + (61 + 90 * t1 + 298 * c1 + 45 * t1**2 - 252 * ep2 - 3 * c1**2) * d**6 / 720)
+    longitude = (d - (1 + 2 * t1 + c1) * d**3 / 6 + (5 - 2 * c1 + 28 * t1 - 3 * c1**2 + 8 * ep2 + 24 * t1**2) * d**5 / 120) / cosseno
+    meridiano_central = (np.asarray(zona, dtype=float) - 1) * 6 - 180 + 3
+    return np.degrees(latitude), meridiano_central + np.degrees(longitude)
+
+def _numero(serie):
+    return pd.to_numeric(serie.astype('string').str.replace(',', '.', regex=False), errors='coerce').to_numpy(dtype=float)
+
+def _pares(texto, nome_padrao):
+    # Grupos da 1ª e da 2ª ocorrência do padrão, só para as linhas com exatamente duas ocorrências
+    ocorrencias = texto.str.extractall(padrao(nome_padrao))
+    contagem = ocorrencias.groupby(level=0).size().reindex(texto.index, fill_value=0)
+    pares = ocorrencias[contagem.loc[ocorrencias.index.get_level_values(0)].to_numpy() == 2]
+    if pares.empty:
+        vazio = pd.DataFrame(columns=ocorrencias.columns, index=texto.index[:0])
+        return vazio, vazio, contagem
+    return pares.xs(0, level='match'), pares.xs(1, level='match'), contagem
+
+def _graus_decimais(graus, minutos, segundos, hemisferio):
+    # Minutos e segundos fora de 0-59 (ex.: 29°99’23”) tornam a coordenada inválida (NaN)
+    valor = _numero(graus)
+    if minutos is not None:
+        valor = np.where(_numero(minutos) < 60, valor + _numero(minutos) / 60, np.nan)
+    if segundos is not None:
+        valor = np.where(_numero(segundos) < 60, valor + _numero(segundos) / 3600, np.nan)
+    return np.where(hemisferio.str.upper().isin(['S', 'O', 'W']).to_numpy(), -valor, valor)
+
+def _por_hemisferio(primeira, segunda, valor1, valor2):
+    # A coordenada com N/S é a latitude e a outra (E/W/L/O), a longitude; combinações inválidas ficam NaN
+    lat1 = primeira.str.upper().isin(['N', 'S']).to_numpy()
+    lat2 = segunda.str.upper().isin(['N', 'S']).to_numpy()
+    ordem_direta, ordem_inversa = lat1 & ~lat2, ~lat1 & lat2
+    latitude = np.where(ordem_direta, valor1, np.where(ordem_inversa, valor2, np.nan))
+    longitude = np.where(ordem_direta, valor2, np.where(ordem_inversa, valor1, np.nan))
+    return latitude, longitude
+
+def _pendentes(resultado, texto):
+    return texto[resultado.loc[texto.index, ['latitude', 'longitude']].isna().any(axis=1)]
+
+def _utm(texto, zonas_utm):
+    # Linhas com exatamente dois números UTM: um leste (6 dígitos, até 900 km) e um norte (7 dígitos)
+    numeros = texto.str.replace(padrao('milhar'), lambda m: ''.join(grupo for grupo in m.groups() if grupo), regex=True)
+    candidatos = numeros.str.extractall(padrao('utm_numero'))
+    if candidatos.empty:
+        return candidatos.index.droplevel('match'), np.array([]), np.array([])
+    valores = _numero(candidatos[0])
+    candidatos = pd.DataFrame({'valor': valores, 'leste': (valores >= 100000) & (valores < 900000),
+                               'norte': (valores >= 1000000) & (valores <= 10000000)}, index=candidatos.index)
+    por_linha = candidatos.groupby(level=0)
+    validas = (por_linha['leste'].sum() == 1) & (por_linha['norte'].sum() == 1) & (por_linha.size() == 2)
+    candidatos = candidatos[validas.loc[candidatos.index.get_level_values(0)].to_numpy()].droplevel('match')
+    indices = candidatos.index.unique()
+    leste = candidatos.loc[candidatos['leste'], 'valor'].reindex(indices).to_numpy()
+    norte = candidatos.loc[candidatos['norte'], 'valor'].reindex(indices).to_numpy()
+
+    # Zona escrita no texto ou, na falta dela, a informada pelo chamador
+    zona_texto = texto.loc[indices].str.extract(padrao('utm_zona'))
+    fuso = texto.loc[indices].str.extract(padrao('utm_fuso'))[0]
+    zona = pd.to_numeric(zona_texto[0].fillna(fuso), errors='coerce').astype(float)
+    zona = zona.fillna(zonas_utm.reindex(indices))
+    zona = zona.where((zona >= 1) & (zona <= 60)).to_numpy()
+    sul = ~zona_texto[1].isin(_FAIXAS_NORTE).to_numpy()
+    latitude, longitude = utm_para_graus(leste, norte, zona, sul)
+    return indices, latitude, longitude
+
+def parse_georreferencia_vetorizado(serie, zonas_utm=None):
+    """
+    Coordenadas de uma coluna inteira de textos. As ocorrências de cada formato são extraídas com
+    str.extractall e convertidas com NumPy, na ordem DMS, DM, decimal com hemisfério, UTM e decimal com sinal;
+    cada texto distinto é interpretado uma única vez.
+    `zonas_utm` (número ou série com o mesmo índice) é a zona usada nos textos UTM sem zona.
+    Retorna um DataFrame com as colunas 'latitude' e 'longitude' (NaN quando não for possível obter as duas).
+    """
+    if serie.dtype == object:
+        # Valores que não são texto (ex.: números lidos do Excel) são ignorados
+        serie = serie.where(serie.map(lambda valor: isinstance(valor, str)))
+    if zonas_utm is not None and not isinstance(zonas_utm, pd.Series):
+        zonas_utm = pd.Series(zonas_utm, index=serie.index)
+    entrada = pd.DataFrame({'texto': serie.astype('string'),
+                            'zona': zonas_utm.reindex(serie.index).astype(float) if zonas_utm is not None else np.nan},
+                           index=serie.index)
+    grupos = entrada.groupby(['texto', 'zona'], dropna=False, sort=False).ngroup().to_numpy()
+    distintos = entrada[~pd.Series(grupos).duplicated().to_numpy()].reset_index(drop=True)
+    coordenadas = _interpreta(distintos['texto'], distintos['zona']).to_numpy()
+    return pd.DataFrame(coordenadas[grupos], index=serie.index, columns=['latitude', 'longitude'])
+
+def _interpreta(texto, zonas_utm):
+    indice = texto.index
+    texto = texto.str.strip()
+    texto = texto[texto.notna() & (texto != '') & (texto.str.upper() != 'NULL')]
+    for antes, depois in _ASPAS:
+        texto = texto.str.replace(antes, depois, regex=False)
+    texto = texto.str.replace(padrao('dms_sem_separador'), r"\1’\2", regex=True)
+
+    resultado = pd.DataFrame({'latitude': np.nan, 'longitude': np.nan}, index=indice)
+    if texto.empty:
+        return resultado
+
+    # Graus, minutos e segundos; se houver menos de duas ocorrências, graus e minutos
+    primeira, segunda, contagem = _pares(texto, 'dms')
+    resultado.loc[primeira.index, 'latitude'], resultado.loc[primeira.index, 'longitude'] = _por_hemisferio(
+        primeira[3], segunda[3],
+        _graus_decimais(primeira[0], primeira[1], primeira[2], primeira[3]),
+        _graus_decimais(segunda[0], segunda[1], segunda[2], segunda[3]))
+    primeira, segunda, _ = _pares(texto[contagem < 2], 'dm')
+    resultado.loc[primeira.index, 'latitude'], resultado.loc[primeira.index, 'longitude'] = _por_hemisferio(
+        primeira[2], segunda[2],
+        _graus_decimais(primeira[0], primeira[1], None, primeira[2]),
+        _graus_decimais(segunda[0], segunda[1], None, segunda[2]))
+
+    # Graus decimais com hemisfério
+    primeira, segunda, _ = _pares(_pendentes(resultado, texto), 'decimal_hemisferio')
+    resultado.loc[primeira.index, 'latitude'], resultado.loc[primeira.index, 'longitude'] = _por_hemisferio(
+        primeira[1], segunda[1],
+        _graus_decimais(primeira[0], None, None, primeira[1]),
+        _graus_decimais(segunda[0], None, None, segunda[1]))
+
+    # UTM
+    indices, latitude, longitude = _utm(_pendentes(resultado, texto), zonas_utm)
+    resultado.loc[indices, 'latitude'], resultado.loc[indices, 'longitude'] = latitude, longitude
+
+    # Dois números decimais, atribuídos pela faixa de valores (não se aplica a textos com minutos/segundos)
+    pendentes = _pendentes(resultado, texto)
+    pendentes = pendentes[~pendentes.str.contains('[’”]', regex=True)]
+    primeira, segunda, _ = _pares(pendentes, 'decimal')
+    valor1, valor2 = _numero(primeira[0]), _numero(segunda[0])
+    ordem_direta = (np.abs(valor1) <= 90) & (np.abs(valor2) <= 180)
+    ordem_inversa = ~ordem_direta & (np.abs(valor2) <= 90) & (np.abs(valor1) <= 180)
+    resultado.loc[primeira.index, 'latitude'] = np.where(ordem_direta, valor1, np.where(ordem_inversa, valor2, np.nan))
+    resultado.loc[primeira.index, 'longitude'] = np.where(ordem_direta, valor2, np.where(ordem_inversa, valor1, np.nan))
+
+    fora_da_faixa = ~(resultado['latitude'].abs() <= 90) | ~(resultado['longitude'].abs() <= 180)
+    resultado.loc[fora_da_faixa, ['latitude', 'longitude']] = np.nan
+    return resultado
+
+@functools.lru_cache(maxsize=4096)
+def parse_georreferencia(texto, zona_utm=None):
+    """
+    (latitude, longitude) de um único texto, ou (None, None) se não for possível obter as duas.
+    Para colunas inteiras, use parse_georreferencia_vetorizado.
+    """
+    coordenadas = parse_georreferencia_vetorizado(pd.Series([texto], dtype=object), zona_utm).iloc[0]
+    if pd.isna(coordenadas['latitude']):
+        return None, None
+    return float(coordenadas['latitude']), float(coordenadas['longitude'])
+
+def verifica_corpus(caminho=CAMINHO_CORPUS, tolerancia=1e-6):
+    """
+    Confere o parser com o corpus de regressão (textos reais da base e exemplos de cada formato).
+    Retorna as linhas cujo resultado difere do esperado.
+    """
+    corpus = pd.read_csv(caminho, dtype={'texto': str, 'formato': str}, keep_default_na=False, na_values={'latitude': [''], 'longitude': [''], 'zona_utm': ['']})
+    obtido = parse_georreferencia_vetorizado(corpus['texto'].astype(object), corpus['zona_utm'])
+    iguais = pd.Series(True, index=corpus.index)
+    for coluna in ['latitude', 'longitude']:
+        ambos_nulos = corpus[coluna].isna() & obtido[coluna].isna()
+        iguais &= ambos_nulos | ((corpus[coluna] - obtido[coluna]).abs() <= tolerancia).fillna(False)
+    return corpus.assign(latitude_obtida=obtido['latitude'], longitude_obtida=obtido['longitude'])[~iguais]
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ['verifica']:
+        divergentes = verifica_corpus()
+        if divergentes.empty:
+            print(f"Corpus de coordenadas OK ({CAMINHO_CORPUS}).")
+        else:
+            print(divergentes.to_string())
+            sys.exit(1)
+    else:
+        print(__doc__)
@@ -0,0 +1,143 @@
+"""
+Formato de troca de dados entre as etapas: Parquet (via pyarrow) com esquemas tipados.
+As planilhas Excel passam a ser apenas uma exportação opcional para leitura humana.
+
+Uso:
+    python dados.py converte     # gera os .parquet a partir das planilhas existentes em docs/
+"""
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from banco_gemini import COLUNAS_DATAFRAME_FINAL
+from banco_resultados import SCHEMA_CASOS, VALORES_AUSENTES, VALORES_BOOLEANOS
+
+# Arquivos canônicos (Parquet) de cada etapa
+CAMINHO_EXTRACAO = 'docs/jusbrasil/respostas_danos_ambientais_df_completo.parquet'
+CAMINHO_BASE_UNIFICADA = 'docs/df_jusbrasil_iopc_juscraper.parquet'
+CAMINHO_GEOCODIFICADA = 'docs/results_geocoded.parquet'
+
+_TIPOS_ARROW = {"TEXT": pa.string(), "REAL": pa.float64(), "INTEGER": pa.int64()}
+
+def _esquema(colunas):
+    return pa.schema([pa.field(coluna, _TIPOS_ARROW[SCHEMA_CASOS[coluna]]) for coluna in colunas])
+
+# Registro da base unificada (JusBrasil + IOPC + juscraper), na ordem de pipeline.COLUNAS_BASE_UNIFICADA
+ESQUEMA_BASE_UNIFICADA = _esquema([
+    'fonte_dados', 'numero_processo', 'processoID', 'processoAnexoID', 'georreferencia',
+    'pais', 'uf', 'municipio', 'regiao', 'responsavel', 'categoria_responsavel',
+    'tipo_impacto_geral', 'tipo_impacto', 'descricao_impacto', 'data_impacto',
+    'area_afetada', 'unidade_area', 'houve_compensacao', 'categoria_compensacao',
+    'tipo_multa', 'valor_multa', 'valor_multa_diaria', 'moeda', 'link_referencia', 'referencia'
+])
+# Base unificada com as coordenadas obtidas na geocodificação
+ESQUEMA_GEOCODIFICADA = _esquema(ESQUEMA_BASE_UNIFICADA.names + ['latitude', 'longitude', 'geo_precisao'])
+# Respostas da extração (analisa_sentenca) dos processos do JusBrasil
+ESQUEMA_EXTRACAO = _esquema(COLUNAS_DATAFRAME_FINAL)
+
+# Esquema de cada arquivo canônico
+ESQUEMAS = {
+    CAMINHO_EXTRACAO: ESQUEMA_EXTRACAO,
+    CAMINHO_BASE_UNIFICADA: ESQUEMA_BASE_UNIFICADA,
+    CAMINHO_GEOCODIFICADA: ESQUEMA_GEOCODIFICADA,
+}
+
+def _ausentes(serie):
+    # Valores nulos ou marcadores de ausência ('NULL', 'N/A', ...) usados nas planilhas.
+    # Só os textos curtos podem ser marcadores: os longos (descrições, sentenças) não são copiados
+    texto = serie.astype('string')
+    curtos = (texto.str.len() <= 8).fillna(False)
+    marcadores = texto[curtos].str.strip().str.upper().isin(VALORES_AUSENTES)
+    return serie.isna() | marcadores.reindex(serie.index, fill_value=False).astype(bool)
+
+def _para_numero(serie):
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        return serie.astype('float64')
+    texto = serie.astype('string').str.replace('R$', '', regex=False).str.strip()
+    # Booleanos (True/False, "true"/"false", "sim"/"não") -> 1/0
+    booleanos = texto.str.upper().map(VALORES_BOOLEANOS).astype('float64')
+    # "1.234,56" (formato brasileiro) -> "1234.56"
+    com_virgula = texto.str.contains(',', regex=False).fillna(False)
+    texto = texto.where(~com_virgula, texto.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+    return pd.to_numeric(texto, errors='coerce').astype('float64').where(booleanos.isna(), booleanos)
+
+def _para_texto(serie):
+    # IDs lidos do Excel como float (ex.: 474474022.0) voltam a ser texto sem o ".0"
+    if pd.api.types.is_float_dtype(serie):
+        inteiros = serie.dropna()
+        if (inteiros == np.floor(inteiros)).all():
+            serie = serie.astype('Int64')
+    return serie.astype('string').str.strip()
+
+def aplica_esquema(df, esquema):
+    """
+    Converte o DataFrame para os tipos do esquema (de forma vetorizada). Marcadores como 'NULL' viram nulos,
+    colunas ausentes são criadas vazias e colunas fora do esquema são descartadas.
+    """
+    convertido = {}
+    for campo in esquema:
+        serie = df[campo.name] if campo.name in df.columns else pd.Series(pd.NA, index=df.index, dtype='object')
+        ausente = _ausentes(serie)
+        if pa.types.is_string(campo.type):
+            valores = _para_texto(serie).mask(ausente)
+        elif pa.types.is_integer(campo.type):
+            valores = _para_numero(serie).mask(ausente).round().astype('Int64')
+        else:
+            valores = _para_numero(serie).mask(ausente)
+        convertido[campo.name] = valores
+    return pd.DataFrame(convertido, index=df.index).reset_index(drop=True)
+
+def salva_parquet(df, caminho, esquema=None, excel=False):
+    """
+    Grava o DataFrame em Parquet com o esquema do arquivo (ESQUEMAS) ou o informado.
+    Com `excel=True`, também exporta uma planilha .xlsx de mesmo nome.
+    """
+    esquema = esquema or ESQUEMAS.get(caminho)
+    if esquema is not None:
+        df = aplica_esquema(df, esquema)
+    tabela = pa.Table.from_pandas(df, schema=esquema, preserve_index=False)
+    if os.path.dirname(caminho):
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    pq.write_table(tabela, caminho, compression='zstd')
+    if excel:
+        exporta_excel(df, os.path.splitext(caminho)[0] + '.xlsx')
+    return df
+
+def carrega_parquet(caminho, colunas=None):
+    """
+    Lê um arquivo Parquet mantendo os tipos. Se o .parquet ainda não existir, lê a planilha .xlsx
+    de mesmo nome e aplica o esquema (compatibilidade com as planilhas antigas).
+    """
+    if os.path.exists(caminho):
+        return pd.read_parquet(caminho, columns=colunas)
+    caminho_excel = os.path.splitext(caminho)[0] + '.xlsx'
+    df = pd.read_excel(caminho_excel)
+    if caminho in ESQUEMAS:
+        df = aplica_esquema(df, ESQUEMAS[caminho])
+    return df[colunas] if colunas else df
+
+def exporta_excel(df, caminho):
+    """
+    Exportação opcional para Excel (nulos viram 'NULL', como nas planilhas originais).
+    """
+    df.astype(object).where(df.notna(), 'NULL').to_excel(caminho, index=False)
+
+def converte_planilhas():
+    """
+    Gera os arquivos Parquet canônicos a partir das planilhas existentes.
+    """
+    for caminho, esquema in ESQUEMAS.items():
+        caminho_excel = os.path.splitext(caminho)[0] + '.xlsx'
+        if not os.path.exists(caminho_excel):
+            print(f"'{caminho_excel}' não encontrado, pulando.")
+            continue
+        df = salva_parquet(pd.read_excel(caminho_excel), caminho, esquema)
+        print(f"{caminho_excel} -> {caminho} ({len(df)} linhas)")
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ['converte']:
+        converte_planilhas()
+    else:
+        print(__doc__)
@@ -0,0 +1,119 @@
+"""
+Detalhes de cada caso sob demanda, para os popups do dashboard (app.py) e do mapa estático (mapping.py).
+
+Os marcadores levam só a chave do caso (processoID, ou o número do processo; casos sem número de processo,
+como os do IOPC, usam o id_caso do banco de resultados), as coordenadas e a cor. O texto completo é buscado
+quando o popup é aberto: no dashboard por um callback e, no mapa estático, pela rota /detalhes/<chave>
+servida pelo próprio servidor do dashboard.
+"""
+import os
+import pandas as pd
+from flask import jsonify
+from banco_resultados import id_caso, para_texto
+
+# Rota dos detalhes no servidor do dashboard
+ROTA_DETALHES = '/detalhes/'
+# Endereço da rota usado pelo mapa estático (o dashboard roda por padrão em http://127.0.0.1:8050)
+URL_DETALHES = os.getenv('URL_DETALHES', 'http://127.0.0.1:8050' + ROTA_DETALHES)
+
+# Campos mostrados no popup, na ordem, com o rótulo de cada um
+ROTULOS = {
+    'numero_processo': 'Nº Processo',
+    'fonte_dados': 'Fonte',
+    'local': 'Local',
+    'responsavel': 'Responsável',
+    'tipo_impacto_geral': 'Impacto Geral',
+    'tipo_impacto': 'Tipo de Impacto',
+    'descricao_impacto': 'Descrição',
+    'data_impacto': 'Data do Impacto',
+    'area_afetada': 'Área Afetada',
+    'valor_multa': 'Valor Multa',
+    'link_referencia': 'Referência',
+}
+
+def chaves_casos(df):
+    """
+    Chave de cada linha nos marcadores (processoID, número do processo ou, na falta dos dois, o id_caso),
+    no mesmo índice do DataFrame.
+    """
+    chaves = pd.Series(None, index=df.index, dtype=object)
+    for coluna in ('numero_processo', 'processoID'):
+        if coluna in df.columns:
+            valores = df[coluna].map(para_texto).astype(object)
+            chaves = valores.where(valores.notna(), chaves)
+    sem_chave = chaves.isna()
+    if sem_chave.any():
+        chaves[sem_chave] = [id_caso(registro) for registro in df[sem_chave].to_dict('records')]
+    return chaves
+
+def formata_moeda(valor, moeda='R$'):
+    if valor is None or pd.isna(valor):
+        return None
+    try:
+        numero = f"{float(valor):,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+    except (TypeError, ValueError):
+        return str(valor)
+    return f"{moeda} {numero}"
+
+def _formata_data(valor):
+    if isinstance(valor, str):
+        return valor
+    data = pd.to_datetime(valor, errors='coerce')
+    return para_texto(valor) if pd.isna(data) else data.strftime('%d/%m/%Y')
+
+class IndiceDetalhes:
+    """
+    Busca indexada dos detalhes de um caso pela chave do marcador (processoID / número do processo);
+    o número do processo também é aceito como chave para os casos que têm processoID.
+    """
+    def __init__(self, df):
+        self.df = df
+        self.chaves = chaves_casos(df)
+        self._posicoes = {}
+        for posicao, chave in enumerate(self.chaves):
+            self._posicoes.setdefault(chave, posicao)
+        if 'numero_processo' in df.columns:
+            for posicao, numero in enumerate(df['numero_processo'].map(para_texto)):
+                if numero is not None:
+                    self._posicoes.setdefault(numero, posicao)
+
+    def __contains__(self, chave):
+        return chave in self._posicoes
+
+    def detalhes(self, chave):
+        """
+        Campos do popup (ROTULOS) já formatados como texto, sem os vazios, ou None se a chave não existir.
+        """
+        if chave not in self._posicoes:
+            return None
+        registro = self.df.iloc[self._posicoes[chave]].to_dict()
+        texto = {coluna: para_texto(registro.get(coluna)) for coluna in ROTULOS}
+        local = ' - '.join(parte for parte in (para_texto(registro.get('municipio')), para_texto(registro.get('uf'))) if parte)
+        local = local or para_texto(registro.get('regiao'))
+        precisao = para_texto(registro.get('geo_precisao'))
+        texto['local'] = f"{local} ({precisao})" if local and precisao else local
+        if texto['data_impacto'] is not None:
+            texto['data_impacto'] = _formata_data(registro.get('data_impacto'))
+        if texto['area_afetada'] is not None:
+            texto['area_afetada'] = f"{texto['area_afetada']} {para_texto(registro.get('unidade_area')) or ''}".strip()
+        if texto['valor_multa'] is not None:
+            texto['valor_multa'] = formata_moeda(registro.get('valor_multa'), para_texto(registro.get('moeda')) or 'R$')
+        return {coluna: valor for coluna, valor in texto.items() if valor is not None}
+
+def registra_rota(server, indice):
+    """
+    Registra no servidor Flask do dashboard a rota GET /detalhes/<chave>, que responde com os detalhes
+    do caso em JSON (404 se a chave não existir). Aceita requisições de outras origens, como o mapa
+    estático aberto direto do disco.
+    """
+    @server.route(ROTA_DETALHES + '<path:chave>')
+    def detalhes_caso(chave):
+        dados = indice.detalhes(chave)
+        if dados is None:
+            resposta = jsonify({'erro': f"Caso '{chave}' não encontrado."})
+            resposta.status_code = 404
+        else:
+            resposta = jsonify(dados)
+        resposta.headers['Access-Control-Allow-Origin'] = '*'
+        return resposta
+    return detalhes_caso
@@ -0,0 +1,216 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup
+from tqdm import tqdm
+
+# Pasta do cache de downloads: os arquivos são guardados pelo hash do conteúdo, e um índice (SQLite) liga cada URL ao seu hash
+PASTA_CACHE_DOWNLOADS = 'cache/downloads'
+
+# Limites padrão
+MAX_POR_HOST = 4          # Downloads simultâneos por host
+TIMEOUT = (10, 60)        # (conexão, leitura) em segundos
+TENTATIVAS = 4            # Novas tentativas em erros de conexão e respostas 429/5xx
+FATOR_BACKOFF = 1.0       # Espera entre tentativas: fator * 2^(tentativa - 1) segundos
+
+# Respostas 4xx em HTML guardadas no cache (ex.: "Acesso negado") expiram após este prazo e são baixadas de novo,
+# pois o acesso pode ser liberado depois. As respostas de limite de taxa/timeout nunca são guardadas.
+TTL_ERROS_DIAS = 7
+STATUS_TEMPORARIOS = (408, 429)
+
+def _erro_http(status):
+    # Mensagem de erro das respostas 4xx guardadas com o corpo (ex.: página HTML de "Acesso negado")
+    return f"HTTP {status}" if status is not None and 400 <= status < 500 else None
+
+class Documento:
+    """
+    Resultado de um download: conteúdo bruto (bytes) e metadados da resposta.
+    """
+    def __init__(self, url, conteudo=b'', content_type='', status=None, do_cache=False, erro=None):
+        self.url = url
+        self.conteudo = conteudo
+        self.content_type = content_type
+        self.status = status
+        self.do_cache = do_cache
+        self.erro = erro
+
+    @property
+    def ok(self):
+        return self.erro is None
+
+    @property
+    def is_pdf(self):
+        return 'pdf' in self.content_type.lower() or self.conteudo[:5] == b'%PDF-'
+
+    @property
+    def is_html(self):
+        return 'html' in self.content_type.lower()
+
+class CacheDownloads:
+    """
+    Cache em disco, endereçado pelo conteúdo, dos arquivos baixados.
+    Respostas de erro (4xx) mais antigas que `ttl_erros_dias` são tratadas como ausentes.
+    """
+    def __init__(self, pasta=PASTA_CACHE_DOWNLOADS, ttl_erros_dias=TTL_ERROS_DIAS):
+        self.pasta = pasta
+        self.ttl_erros_dias = ttl_erros_dias
+        os.makedirs(os.path.join(pasta, 'objetos'), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(pasta, 'indice.db'), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS downloads (
+                url TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                content_type TEXT,
+                status INTEGER,
+                baixado_em REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def _caminho_objeto(self, sha256):
+        return os.path.join(self.pasta, 'objetos', sha256[:2], sha256)
+
+    def obtem(self, url):
+        with self._lock:
+            linha = self._conn.execute(
+                "SELECT sha256, content_type, status, baixado_em FROM downloads WHERE url = ?", (url,)
+            ).fetchone()
+        if linha is None:
+            return None
+        if _erro_http(linha[2]) and time.time() - linha[3] > self.ttl_erros_dias * 86400:
+            return None
+        caminho = self._caminho_objeto(linha[0])
+        if not os.path.exists(caminho):
+            return None
+        with open(caminho, 'rb') as arquivo:
+            return Documento(url, arquivo.read(), linha[1] or '', linha[2], do_cache=True, erro=_erro_http(linha[2]))
+
+    def salva(self, documento):
+        if documento.status in STATUS_TEMPORARIOS:
+            return
+        sha256 = hashlib.sha256(documento.conteudo).hexdigest()
+        caminho = self._caminho_objeto(sha256)
+        if not os.path.exists(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            # Escreve em um arquivo temporário e renomeia, para não deixar objetos incompletos
+            temporario = f"{caminho}.{threading.get_ident()}.tmp"
+            with open(temporario, 'wb') as arquivo:
+                arquivo.write(documento.conteudo)
+            os.replace(temporario, caminho)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO downloads (url, sha256, content_type, status, baixado_em) VALUES (?, ?, ?, ?, ?)",
+                (documento.url, sha256, documento.content_type, documento.status, time.time())
+            )
+            self._conn.commit()
+
+class Downloader:
+    """
+    Baixa os arquivos das sentenças com uma única requests.Session (conexões reaproveitadas),
+    timeout, novas tentativas com backoff exponencial, limite de downloads simultâneos por host
+    e cache em disco: cada URL é baixada uma única vez, mesmo entre execuções diferentes.
+    """
+    def __init__(self, pasta_cache=PASTA_CACHE_DOWNLOADS, max_por_host=MAX_POR_HOST, timeout=TIMEOUT,
+                 tentativas=TENTATIVAS, fator_backoff=FATOR_BACKOFF, usar_cache=True, ttl_erros_dias=TTL_ERROS_DIAS):
+        self.max_por_host = max_por_host
+        self.timeout = timeout
+        self.cache = CacheDownloads(pasta_cache, ttl_erros_dias) if usar_cache else None
+        retry = Retry(
+            total=tentativas,
+            backoff_factor=fator_backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=16, pool_maxsize=max(max_por_host, 10))
+        self.sessao = requests.Session()
+        self.sessao.mount('http://', adapter)
+        self.sessao.mount('https://', adapter)
+        self._semaforos = defaultdict(lambda: threading.BoundedSemaphore(self.max_por_host))
+        self._lock = threading.Lock()
+
+    def _semaforo_host(self, url):
+        with self._lock:
+            return self._semaforos[urlparse(url).netloc]
+
+    def baixa(self, url):
+        """
+        Baixa a URL (ou a lê do cache). Levanta requests.exceptions.RequestException em caso de erro, exceto
+        nas respostas 4xx em HTML: essas são retornadas com o corpo (e o atributo `erro` preenchido), para que
+        páginas como a de "Acesso negado" possam ser identificadas, e ficam no cache por até TTL_ERROS_DIAS.
+        """
+        if self.cache is not None:
+            documento = self.cache.obtem(url)
+            if documento is not None:
+                return documento
+        with self._semaforo_host(url):
+            resposta = self.sessao.get(url, timeout=self.timeout)
+        content_type = resposta.headers.get('Content-Type', '')
+        if not (400 <= resposta.status_code < 500 and 'html' in content_type.lower()):
+            resposta.raise_for_status()
+        documento = Documento(url, resposta.content, content_type, resposta.status_code, erro=_erro_http(resposta.status_code))
+        if self.cache is not None:
+            self.cache.salva(documento)
+        return documento
+
+    def baixa_varios(self, urls, max_workers=16, mostrar_progresso=True):
+        """
+        Baixa várias URLs em paralelo (respeitando o limite por host) e retorna os Documentos na ordem de entrada.
+        Erros não interrompem os demais downloads: o Documento correspondente vem com o atributo `erro` preenchido.
+        URLs repetidas são baixadas uma única vez.
+        """
+        def baixa_seguro(url):
+            try:
+                return self.baixa(url)
+            except requests.exceptions.RequestException as e:
+                return Documento(url, erro=str(e))
+
+        unicas = list(dict.fromkeys(urls))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            documentos = list(tqdm(executor.map(baixa_seguro, unicas), total=len(unicas), desc='Downloads', disable=not mostrar_progresso))
+        por_url = dict(zip(unicas, documentos))
+        return [por_url[url] for url in urls]
+
+    def close(self):
+        self.sessao.close()
+
+# Downloader compartilhado por padrão
+_downloader_padrao = None
+_lock_downloader_padrao = threading.Lock()
+
+def downloader_padrao():
+    """
+    Retorna o downloader compartilhado, criado na primeira chamada.
+    """
+    global _downloader_padrao
+    with _lock_downloader_padrao:
+        if _downloader_padrao is None:
+            _downloader_padrao = Downloader()
+        return _downloader_padrao
+
+def identifica_acesso_negado(processos, coluna_link='Download copia', downloader=None, mostrar_progresso=True):
+    """
+    Identifica os processos cujo link retorna uma página HTML com a mensagem "Acesso negado"
+    (com qualquer status HTTP, inclusive 401/403).
+    Retorna as linhas correspondentes do DataFrame. Como os downloads ficam no cache,
+    as etapas seguintes (classificação e extração) não baixam os mesmos links novamente.
+    """
+    downloader = downloader or downloader_padrao()
+    documentos = downloader.baixa_varios(processos[coluna_link].tolist(), mostrar_progresso=mostrar_progresso)
+    acessos_negados = []
+    for i, documento in enumerate(documentos):
+        if documento.is_html and documento.conteudo:
+            texto = BeautifulSoup(documento.conteudo, 'html.parser').get_text()
+            if 'Acesso negado' in texto:
+                acessos_negados.append(i)
+    return processos.iloc[acessos_negados, :]
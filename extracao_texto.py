@@ -0,0 +1,129 @@
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import pymupdf
+from bs4 import BeautifulSoup
+
+# Número padrão de processos usados na extração
+MAX_PROCESSOS = max(1, (os.cpu_count() or 2) - 1)
+
+def _abre_pdf(conteudo):
+    # `conteudo` são os bytes do PDF ou o caminho de um arquivo PDF
+    if isinstance(conteudo, str):
+        return pymupdf.open(conteudo, filetype='pdf')
+    return pymupdf.open(stream=conteudo, filetype='pdf')
+
+def itera_paginas_pdf(conteudo, inicio=0, fim=None):
+    """
+    Abre o PDF (bytes, sem arquivo temporário, ou caminho do arquivo) e devolve o texto de cada página, uma de cada vez.
+    Apenas uma página fica carregada em memória por vez.
+    """
+    with _abre_pdf(conteudo) as doc:
+        fim = doc.page_count if fim is None else min(fim, doc.page_count)
+        for numero in range(inicio, fim):
+            yield doc.load_page(numero).get_text("text")
+
+def numero_paginas_pdf(conteudo):
+    with _abre_pdf(conteudo) as doc:
+        return doc.page_count
+
+def texto_pdf(conteudo):
+    return ''.join(itera_paginas_pdf(conteudo))
+
+def texto_html(conteudo):
+    soup = BeautifulSoup(conteudo, 'html.parser')
+    # Remove tags de script e style
+    for script_or_style in soup(["script", "style"]):
+        script_or_style.decompose()
+    return soup.get_text(separator='\n', strip=True)
+
+def extrai_texto_bytes(conteudo, content_type=''):
+    """
+    Extrai o texto de um arquivo baixado (PDF, HTML ou texto puro) a partir dos bytes.
+    Retorna uma string vazia se não houver conteúdo; arquivos corrompidos levantam a exceção da biblioteca
+    de leitura (use extrai_texto para registrar o erro no Documento).
+    """
+    if not conteudo:
+        return ''
+    content_type = (content_type or '').lower()
+    if 'pdf' in content_type or conteudo[:5] == b'%PDF-':
+        return texto_pdf(conteudo)
+    if 'html' in content_type or 'text/plain' in content_type or not content_type:
+        return texto_html(conteudo)
+    # Se não for PDF nem HTML/TEXT conhecido, tenta ler como texto simples
+    return conteudo.decode('utf-8', errors='replace')
+
+def _extrai_texto_ou_erro(conteudo, content_type):
+    # Retorna (texto, erro): em caso de falha, texto vazio e a mensagem do erro
+    try:
+        return extrai_texto_bytes(conteudo, content_type), None
+    except Exception as e:
+        return '', f"Erro ao extrair texto ({content_type or 'sem Content-Type'}): {type(e).__name__}: {e}"
+
+def extrai_texto(documento):
+    """
+    Extrai o texto de um downloads.Documento.
+    Se a extração falhar, retorna uma string vazia e guarda a mensagem no atributo `erro` do documento.
+    """
+    if not documento.ok:
+        return ''
+    texto, erro = _extrai_texto_ou_erro(documento.conteudo, documento.content_type)
+    if erro is not None:
+        documento.erro = erro
+    return texto
+
+def _extrai_documento(args):
+    # Função executada nos processos filhos (precisa estar no nível do módulo para ser serializada)
+    conteudo, content_type = args
+    return _extrai_texto_ou_erro(conteudo, content_type)
+
+def _extrai_intervalo(args):
+    caminho, inicio, fim = args
+    return list(itera_paginas_pdf(caminho, inicio, fim))
+
+def _executa_em_ordem(executor, funcao, tarefas, janela):
+    """
+    Submete as tarefas ao executor mantendo no máximo `janela` em andamento e devolve os resultados na ordem.
+    Assim a memória não cresce com o número de tarefas: os resultados são consumidos à medida que ficam prontos.
+    """
+    pendentes = deque()
+    for tarefa in tarefas:
+        pendentes.append(executor.submit(funcao, tarefa))
+        if len(pendentes) >= janela:
+            yield pendentes.popleft().result()
+    while pendentes:
+        yield pendentes.popleft().result()
+
+def extrai_textos(documentos, max_processos=MAX_PROCESSOS):
+    """
+    Extrai o texto de vários downloads.Documento em um pool de processos (a extração de PDF usa muita CPU).
+    É um gerador: devolve os textos na ordem dos documentos, à medida que ficam prontos.
+    Ex.: for documento, texto in zip(documentos, extrai_textos(documentos)): ...
+    Como em extrai_texto, falhas de extração ficam no atributo `erro` de cada documento.
+    """
+    documentos = list(documentos)
+    tarefas = ((documento.conteudo if documento.ok else b'', documento.content_type) for documento in documentos)
+    with ProcessPoolExecutor(max_workers=max_processos) as executor:
+        resultados = _executa_em_ordem(executor, _extrai_documento, tarefas, janela=2 * max_processos)
+        for documento, (texto, erro) in zip(documentos, resultados):
+            if erro is not None:
+                documento.erro = erro
+            yield texto
+
+def itera_paginas_pdf_paralelo(conteudo, max_processos=MAX_PROCESSOS, paginas_por_tarefa=20):
+    """
+    Extrai o texto de um PDF muito grande dividindo as páginas entre vários processos.
+    É um gerador: devolve o texto das páginas na ordem, sem manter o documento inteiro em memória.
+    Os bytes são gravados uma única vez em um arquivo temporário; cada tarefa recebe só o caminho e o intervalo de páginas.
+    """
+    total = numero_paginas_pdf(conteudo)
+    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as arquivo:
+        arquivo.write(conteudo)
+    try:
+        intervalos = ((arquivo.name, inicio, min(inicio + paginas_por_tarefa, total)) for inicio in range(0, total, paginas_por_tarefa))
+        with ProcessPoolExecutor(max_workers=max_processos) as executor:
+            for paginas in _executa_em_ordem(executor, _extrai_intervalo, intervalos, janela=2 * max_processos):
+                yield from paginas
+    finally:
+        os.remove(arquivo.name)
@@ -0,0 +1,352 @@
+"""
+Fila de trabalho em SQLite com leases, consumida por vários processos (inclusive de outros terminais).
+
+Uso:
+    python fila_trabalho.py worker pipeline_extracao [--processos 2]   # consome uma fila já criada
+    python fila_trabalho.py estado pipeline_extracao                   # itens da fila em cada estado
+"""
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import importlib
+import threading
+import multiprocessing
+from contextlib import contextmanager
+
+# Banco local da fila de trabalho (compartilhado por todos os processos da máquina)
+CAMINHO_FILA = os.getenv('FILA_TRABALHO', 'cache/fila_trabalho.db')
+
+# Limites padrão
+DURACAO_LEASE = 600      # Segundos que um worker tem para concluir (ou renovar) um item antes que ele volte para a fila
+MAX_TENTATIVAS = 3       # Tentativas por item antes de marcá-lo como falho
+ESPERA_VAZIA = 5         # Segundos entre consultas quando não há itens livres, mas ainda há itens em andamento
+ESPERA_DISPUTA = 1       # Segundos de espera quando há itens pendentes, mas outro worker os reivindicou primeiro
+
+PENDENTE = 'pendente'
+EM_ANDAMENTO = 'em_andamento'
+CONCLUIDO = 'concluido'
+FALHOU = 'falhou'
+
+def identificador_worker():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class FilaTrabalho:
+    """
+    Fila de trabalho em SQLite com leases, no lugar da divisão manual da lista com divide_lista_em_partes.
+    Qualquer número de processos pode reivindicar itens da mesma fila: cada item reivindicado fica reservado
+    ao worker até `duracao_lease` segundos. Se o worker não concluir o item nesse prazo (travou, caiu ou foi
+    interrompido), o item volta automaticamente para a fila e é entregue a outro worker.
+    """
+    def __init__(self, nome='padrao', caminho=CAMINHO_FILA, duracao_lease=DURACAO_LEASE, max_tentativas=MAX_TENTATIVAS):
+        self.nome = nome
+        self.caminho = caminho
+        self.duracao_lease = duracao_lease
+        self.max_tentativas = max_tentativas
+        if os.path.dirname(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with self._transacao() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS itens (
+                    fila TEXT NOT NULL,
+                    item TEXT NOT NULL,
+                    dados TEXT,
+                    estado TEXT NOT NULL,
+                    worker TEXT,
+                    lease_ate REAL,
+                    tentativas INTEGER NOT NULL DEFAULT 0,
+                    erro TEXT,
+                    atualizado_em REAL NOT NULL,
+                    PRIMARY KEY (fila, item)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_itens_estado ON itens (fila, estado, lease_ate)")
+            # Função e argumentos dos workers de cada fila, para que outros processos possam consumi-la
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS filas (
+                    fila TEXT PRIMARY KEY,
+                    funcao TEXT NOT NULL,
+                    argumentos TEXT NOT NULL,
+                    tamanho_lote INTEGER NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _transacao(self):
+        # BEGIN IMMEDIATE reserva a escrita no início da transação: dois workers nunca reivindicam o mesmo item
+        conn = sqlite3.connect(self.caminho, timeout=60, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    def adiciona(self, itens):
+        """
+        Adiciona itens à fila. `itens` é um dicionário id -> dados (serializáveis em JSON) ou uma lista de ids.
+        Itens que já estão na fila (em qualquer estado) são ignorados. Retorna o número de itens novos.
+        """
+        if not isinstance(itens, dict):
+            itens = dict.fromkeys(itens)
+        agora = time.time()
+        with self._transacao() as conn:
+            antes = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO itens (fila, item, dados, estado, atualizado_em) VALUES (?, ?, ?, ?, ?)",
+                [(self.nome, str(item), json.dumps(dados, ensure_ascii=False, default=str), PENDENTE, agora)
+                 for item, dados in itens.items()]
+            )
+            return conn.total_changes - antes
+
+    def reabre(self, itens):
+        """
+        Devolve à fila (zerando as tentativas) os itens indicados que estão concluídos ou falhos.
+        Itens pendentes ou em andamento com algum worker não são alterados.
+        """
+        with self._transacao() as conn:
+            conn.executemany(
+                "UPDATE itens SET estado = ?, tentativas = 0, erro = NULL, atualizado_em = ? "
+                "WHERE fila = ? AND item = ? AND estado IN (?, ?)",
+                [(PENDENTE, time.time(), self.nome, str(item), CONCLUIDO, FALHOU) for item in itens]
+            )
+
+    def registra_workers(self, funcao, tamanho_lote=10, argumentos=()):
+        """
+        Guarda a função (definida no nível de um módulo) e os argumentos (serializáveis em JSON) usados pelos
+        workers desta fila, lidos por `python fila_trabalho.py worker <fila>`.
+        """
+        modulo = funcao.__module__
+        if modulo == '__main__':
+            # Função de um script executado diretamente: importável pelo nome do arquivo
+            modulo = os.path.splitext(os.path.basename(sys.modules['__main__'].__file__))[0]
+        with self._transacao() as conn:
+            conn.execute("INSERT OR REPLACE INTO filas (fila, funcao, argumentos, tamanho_lote) VALUES (?, ?, ?, ?)",
+                         (self.nome, f"{modulo}:{funcao.__qualname__}", json.dumps(list(argumentos)), tamanho_lote))
+
+    def workers_registrados(self):
+        """
+        (função, tamanho_lote, argumentos) registrados com registra_workers, ou None.
+        """
+        with self._transacao() as conn:
+            linha = conn.execute("SELECT funcao, argumentos, tamanho_lote FROM filas WHERE fila = ?", (self.nome,)).fetchone()
+        if linha is None:
+            return None
+        modulo, nome = linha[0].split(':')
+        return getattr(importlib.import_module(modulo), nome), linha[2], tuple(json.loads(linha[1]))
+
+    def _requeue_expirados(self, conn, agora):
+        # Itens com lease vencido voltam para a fila, ou são marcados como falhos se esgotaram as tentativas
+        conn.execute(
+            "UPDATE itens SET estado = CASE WHEN tentativas >= ? THEN ? ELSE ? END, worker = NULL, lease_ate = NULL, "
+            "erro = COALESCE(erro, 'lease expirado'), atualizado_em = ? "
+            "WHERE fila = ? AND estado = ? AND lease_ate < ?",
+            (self.max_tentativas, FALHOU, PENDENTE, agora, self.nome, EM_ANDAMENTO, agora)
+        )
+
+    def reivindica(self, quantidade=1, worker=None):
+        """
+        Reserva até `quantidade` itens pendentes para o worker. Retorna uma lista de (id, dados).
+        """
+        worker = worker or identificador_worker()
+        agora = time.time()
+        with self._transacao() as conn:
+            self._requeue_expirados(conn, agora)
+            linhas = conn.execute(
+                "SELECT item, dados FROM itens WHERE fila = ? AND estado = ? ORDER BY tentativas, rowid LIMIT ?",
+                (self.nome, PENDENTE, quantidade)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE itens SET estado = ?, worker = ?, lease_ate = ?, tentativas = tentativas + 1, atualizado_em = ? "
+                "WHERE fila = ? AND item = ?",
+                [(EM_ANDAMENTO, worker, agora + self.duracao_lease, agora, self.nome, item) for item, _ in linhas]
+            )
+        return [(item, json.loads(dados)) for item, dados in linhas]
+
+    def renova(self, itens, worker=None):
+        """
+        Estende o lease dos itens ainda reservados ao worker (para itens demorados).
+        """
+        worker = worker or identificador_worker()
+        agora = time.time()
+        with self._transacao() as conn:
+            conn.executemany(
+                "UPDATE itens SET lease_ate = ?, atualizado_em = ? WHERE fila = ? AND item = ? AND worker = ? AND estado = ?",
+                [(agora + self.duracao_lease, agora, self.nome, str(item), worker, EM_ANDAMENTO) for item in itens]
+            )
+
+    def conclui(self, itens, worker=None):
+        """
+        Marca os itens como concluídos. Itens cujo lease já foi repassado a outro worker são ignorados.
+        """
+        worker = worker or identificador_worker()
+        with self._transacao() as conn:
+            conn.executemany(
+                "UPDATE itens SET estado = ?, lease_ate = NULL, erro = NULL, atualizado_em = ? WHERE fila = ? AND item = ? AND worker = ?",
+                [(CONCLUIDO, time.time(), self.nome, str(item), worker) for item in itens]
+            )
+
+    def devolve(self, itens, erro=None, worker=None):
+        """
+        Devolve os itens à fila após uma falha (ou os marca como falhos se esgotaram as tentativas).
+        """
+        worker = worker or identificador_worker()
+        with self._transacao() as conn:
+            conn.executemany(
+                "UPDATE itens SET estado = CASE WHEN tentativas >= ? THEN ? ELSE ? END, worker = NULL, lease_ate = NULL, "
+                "erro = ?, atualizado_em = ? WHERE fila = ? AND item = ? AND worker = ?",
+                [(self.max_tentativas, FALHOU, PENDENTE, erro, time.time(), self.nome, str(item), worker) for item in itens]
+            )
+
+    def reabre_falhos(self):
+        """
+        Devolve à fila os itens marcados como falhos, zerando as tentativas.
+        """
+        with self._transacao() as conn:
+            conn.execute("UPDATE itens SET estado = ?, tentativas = 0, atualizado_em = ? WHERE fila = ? AND estado = ?",
+                         (PENDENTE, time.time(), self.nome, FALHOU))
+
+    def limpa(self):
+        with self._transacao() as conn:
+            conn.execute("DELETE FROM itens WHERE fila = ?", (self.nome,))
+
+    def estado(self):
+        """
+        Número de itens da fila em cada estado.
+        """
+        with self._transacao() as conn:
+            self._requeue_expirados(conn, time.time())
+            linhas = conn.execute("SELECT estado, COUNT(*) FROM itens WHERE fila = ? GROUP BY estado", (self.nome,)).fetchall()
+        contagem = {PENDENTE: 0, EM_ANDAMENTO: 0, CONCLUIDO: 0, FALHOU: 0}
+        contagem.update(dict(linhas))
+        return contagem
+
+    def falhos(self):
+        with self._transacao() as conn:
+            return conn.execute("SELECT item, tentativas, erro FROM itens WHERE fila = ? AND estado = ?",
+                                (self.nome, FALHOU)).fetchall()
+
+@contextmanager
+def renovacao_lease(fila, itens, worker=None, intervalo=None):
+    """
+    Renova o lease dos itens em uma thread enquanto o bloco executa (a cada 1/3 da duração do lease, por padrão),
+    para que lotes mais demorados que `fila.duracao_lease` não voltem para a fila e sejam executados de novo.
+    """
+    worker = worker or identificador_worker()
+    intervalo = intervalo if intervalo is not None else fila.duracao_lease / 3
+    parar = threading.Event()
+
+    def renova():
+        while not parar.wait(intervalo):
+            try:
+                fila.renova(itens, worker)
+            except sqlite3.Error as e:
+                print(f"[{worker}] Erro ao renovar o lease de {len(itens)} itens: {e}")
+
+    thread = threading.Thread(target=renova, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        parar.set()
+        thread.join()
+
+def trabalhador(nome_fila, funcao, tamanho_lote=10, argumentos=(), caminho=CAMINHO_FILA, duracao_lease=DURACAO_LEASE, max_tentativas=MAX_TENTATIVAS):
+    """
+    Loop de um worker: reivindica lotes da fila e chama `funcao(lote, *argumentos)`, onde `lote` é uma lista
+    de (id, dados), até que a fila se esgote. Enquanto a função executa, o lease do lote é renovado
+    (ver renovacao_lease). A função pode retornar os ids concluídos (os demais voltam à fila);
+    se retornar None, todo o lote é considerado concluído. Exceções devolvem o lote inteiro à fila.
+    Retorna o número de itens concluídos por este worker.
+    """
+    fila = FilaTrabalho(nome_fila, caminho, duracao_lease, max_tentativas)
+    worker = identificador_worker()
+    concluidos = 0
+    while True:
+        lote = fila.reivindica(tamanho_lote, worker)
+        if not lote:
+            contagem = fila.estado()
+            if contagem[PENDENTE] > 0:
+                # Outro worker reivindicou os itens livres antes deste: espera um pouco em vez de consultar sem parar
+                time.sleep(ESPERA_DISPUTA)
+                continue
+            if contagem[EM_ANDAMENTO] == 0:
+                return concluidos
+            # Outros workers ainda estão com itens: espera, pois algum lease pode expirar e voltar para a fila
+            time.sleep(ESPERA_VAZIA)
+            continue
+        ids = [item for item, _ in lote]
+        try:
+            with renovacao_lease(fila, ids, worker):
+                retorno = funcao(lote, *argumentos)
+        except Exception as e:
+            print(f"[{worker}] Erro ao processar lote ({len(lote)} itens): {e}")
+            fila.devolve(ids, erro=str(e), worker=worker)
+            continue
+        ok = ids if retorno is None else [str(item) for item in retorno]
+        fila.conclui(ok, worker)
+        restantes = [item for item in ids if item not in set(ok)]
+        if restantes:
+            fila.devolve(restantes, erro='não concluído pelo worker', worker=worker)
+        concluidos += len(ok)
+
+def _executa_trabalhador(*parametros):
+    # Ponto de entrada dos processos iniciados por executa_workers
+    concluidos = trabalhador(*parametros)
+    print(f"[{identificador_worker()}] {concluidos} itens concluídos")
+
+def executa_workers(nome_fila, funcao, num_workers=4, tamanho_lote=10, argumentos=(), caminho=CAMINHO_FILA,
+                    duracao_lease=DURACAO_LEASE, max_tentativas=MAX_TENTATIVAS):
+    """
+    Inicia `num_workers` processos consumindo a mesma fila e espera todos terminarem.
+    `funcao` precisa estar definida no nível de um módulo (para ser enviada aos processos) e os argumentos
+    precisam ser serializáveis em JSON: ficam registrados na fila, e outros workers podem ser iniciados em
+    paralelo (em outros terminais) com `python fila_trabalho.py worker <nome_fila>`.
+    Os processos não são daemon, então a função pode abrir seus próprios pools de processos.
+    Retorna o estado final da fila.
+    """
+    fila = FilaTrabalho(nome_fila, caminho, duracao_lease, max_tentativas)
+    fila.registra_workers(funcao, tamanho_lote, argumentos)
+    parametros = (nome_fila, funcao, tamanho_lote, argumentos, caminho, duracao_lease, max_tentativas)
+    if num_workers <= 1:
+        _executa_trabalhador(*parametros)
+    else:
+        processos = [multiprocessing.Process(target=_executa_trabalhador, args=parametros) for _ in range(num_workers)]
+        for processo in processos:
+            processo.start()
+        for processo in processos:
+            processo.join()
+        falhos = [processo.exitcode for processo in processos if processo.exitcode != 0]
+        if falhos:
+            print(f"{len(falhos)} workers terminaram com erro (códigos de saída: {falhos})")
+    return fila.estado()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Workers e estado das filas de trabalho.")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+    parser_worker = subparsers.add_parser('worker', help="Consome uma fila com a função registrada por executa_workers")
+    parser_worker.add_argument('fila')
+    parser_worker.add_argument('--processos', type=int, default=1, help="Workers iniciados por este comando")
+    parser_estado = subparsers.add_parser('estado', help="Itens da fila em cada estado")
+    parser_estado.add_argument('fila')
+    args = parser.parse_args()
+
+    fila = FilaTrabalho(args.fila)
+    if args.comando == 'estado':
+        print(fila.estado())
+        for item, tentativas, erro in fila.falhos():
+            print(f"  falhou: {item} ({tentativas} tentativas): {erro}")
+    else:
+        registrados = fila.workers_registrados()
+        if registrados is None:
+            sys.exit(f"A fila '{args.fila}' não tem workers registrados (ela é criada pelo pipeline com --workers).")
+        funcao, tamanho_lote, argumentos = registrados
+        print(executa_workers(args.fila, funcao, args.processos, tamanho_lote, argumentos))
@@ -0,0 +1,121 @@
+"""
+Motor de filtros compartilhado pelos callbacks do dashboard (app.py).
+
+As máscaras booleanas de cada valor dos filtros (impacto geral, UF, moeda, faixa log10 da multa e multa > 0)
+são calculadas uma única vez no carregamento; cada combinação de filtros é resolvida com E/OU bit a bit
+entre essas máscaras e o resultado (posições das linhas) fica memorizado em um cache LRU, reaproveitado
+por todos os callbacks disparados pela mesma interação.
+"""
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+# Combinações de filtros memorizadas
+TAMANHO_CACHE_FILTROS = 256
+
+def faixa_log(valores):
+    """
+    Faixa log10 de cada valor: k para valores em [10^k, 10^(k+1)); valores <= 0 ou nulos ficam fora (NaN).
+    """
+    valores = np.asarray(valores, dtype=float)
+    positivos = valores > 0
+    faixas = np.full(len(valores), np.nan)
+    faixas[positivos] = np.floor(np.log10(valores[positivos]))
+    # Corrige arredondamentos do log10 perto das potências de 10
+    faixas[positivos & (10.0 ** faixas > valores)] -= 1
+    faixas[positivos & (10.0 ** (faixas + 1) <= valores)] += 1
+    return faixas
+
+class MotorFiltros:
+    """
+    Filtra um DataFrame fixo pelas colunas categóricas, pelo valor da multa e pela faixa log10,
+    usando máscaras pré-calculadas e memorizando as posições das linhas de cada combinação de filtros.
+    """
+    def __init__(self, df, colunas=('tipo_impacto_geral', 'uf', 'moeda'), coluna_valor='valor_multa_numerico',
+                 tamanho_cache=TAMANHO_CACHE_FILTROS):
+        self.df = df
+        self.total = len(df)
+        # Códigos categóricos e uma máscara por valor distinto de cada coluna de filtro
+        self.codigos = {}
+        self.categorias = {}
+        self.mascaras = {}
+        for coluna in colunas:
+            codigos, categorias = pd.factorize(df[coluna])
+            self.codigos[coluna] = codigos
+            self.categorias[coluna] = categorias
+            self.mascaras[coluna] = {valor: codigos == codigo for codigo, valor in enumerate(categorias)}
+        self.valores = df[coluna_valor].to_numpy(dtype=float, na_value=np.nan)
+        self.mascara_positivos = self.valores > 0
+        self.faixas = faixa_log(self.valores)
+        self.mascaras_faixa = {int(faixa): self.faixas == faixa for faixa in np.unique(self.faixas[~np.isnan(self.faixas)])}
+        self._indices = lru_cache(maxsize=tamanho_cache)(self._calcula_indices)
+
+    @staticmethod
+    def chave(geral=None, ufs=None, moedas=None, ocultar_zero=False, faixa=None):
+        """
+        Chave normalizada (e hashable) de uma combinação de filtros; seleções vazias não filtram.
+        """
+        return (
+            tuple(sorted(geral or ())), tuple(sorted(ufs or ())), tuple(sorted(moedas or ())),
+            bool(ocultar_zero), tuple(int(limite) for limite in faixa) if faixa is not None else None,
+        )
+
+    def _mascara_valores(self, coluna, selecionados):
+        mascara = np.zeros(self.total, dtype=bool)
+        for valor in selecionados:
+            if valor in self.mascaras[coluna]:
+                mascara |= self.mascaras[coluna][valor]
+        return mascara
+
+    def _mascara_faixa(self, inferior, superior):
+        # valor entre 10^inferior e 10^superior (inclusive): faixas inferior..superior-1 e o próprio 10^superior
+        mascara = self.valores == 10.0 ** superior
+        for faixa in range(inferior, superior):
+            if faixa in self.mascaras_faixa:
+                mascara |= self.mascaras_faixa[faixa]
+        return mascara
+
+    def _calcula_indices(self, chave):
+        geral, ufs, moedas, ocultar_zero, faixa = chave
+        mascara = np.ones(self.total, dtype=bool)
+        for coluna, selecionados in (('tipo_impacto_geral', geral), ('uf', ufs), ('moeda', moedas)):
+            if selecionados:
+                mascara &= self._mascara_valores(coluna, selecionados)
+        if ocultar_zero:
+            mascara &= self.mascara_positivos
+        if faixa is not None:
+            mascara &= self._mascara_faixa(*faixa)
+        indices = np.flatnonzero(mascara)
+        indices.setflags(write=False)
+        return indices
+
+    def indices(self, geral=None, ufs=None, moedas=None, ocultar_zero=False, faixa=None):
+        """
+        Posições (iloc) das linhas que atendem aos filtros, em ordem; o array é compartilhado e somente leitura.
+        """
+        return self._indices(self.chave(geral, ufs, moedas, ocultar_zero, faixa))
+
+    def indices_da_chave(self, chave):
+        """
+        Posições das linhas para uma chave já normalizada (MotorFiltros.chave).
+        """
+        return self._indices(chave)
+
+    def filtra(self, geral=None, ufs=None, moedas=None, ocultar_zero=False, faixa=None, colunas=None):
+        """
+        Linhas do DataFrame que atendem aos filtros. Com `colunas`, só essas colunas são montadas
+        (cada coluna de texto copiada custa caro em bases grandes).
+        """
+        df = self.df if colunas is None else self.df[list(colunas)]
+        return df.iloc[self.indices(geral, ufs, moedas, ocultar_zero, faixa)]
+
+    def valores_presentes(self, coluna, indices):
+        """
+        Valores distintos de uma coluna de filtro entre as linhas indicadas, sem montar o DataFrame.
+        """
+        codigos = np.unique(self.codigos[coluna][indices])
+        return self.categorias[coluna][codigos[codigos >= 0]].tolist()
+
+    def estatisticas(self):
+        info = self._indices.cache_info()
+        return {'hits': info.hits, 'misses': info.misses, 'combinacoes': info.currsize}
@@ -1,23 +1,104 @@
-import time
+import re
+import asyncio
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from pydantic import BaseModel
 import os
 from google import genai
+from tqdm import tqdm
 import json
+import unicodedata
+import pandas as pd
+from pool_chaves import pool_padrao
+from cache_respostas import RespostaCache, cache_padrao, chave_cache
+
+# Modelo utilizado em todas as requisições ao Gemini
+MODELO_GEMINI = "gemini-2.0-flash"
+
+# Número máximo de rodadas sobre todas as chaves quando todas estão no limite de uso (erro 429)
+MAX_TENTATIVAS_LIMITE = 5
 
 # Classe usada para retornar uma resposta padrão em caso de falha
 class FailResponse:
     def __init__(self, data: dict):
         self.text = json.dumps(data) # Converte o dicionário em uma string JSON
 
-# Função principal que verifica se o texto contém um dano ambiental
-def verifica_dano_ambiental(texto):
-    """
-    Função que verifica se o texto possui dano ambiental.
-    Se houver, justifica a resposta. Caso contrário, responde "Não há dano ambiental".
-    """
+# Classe usada para retornar respostas montadas localmente (ex.: um item de uma resposta em lote)
+class RespostaLocal:
+    def __init__(self, data: dict):
+        self.text = json.dumps(data, ensure_ascii=False)
+
+# --- Formatos de resposta esperados do modelo (esquemas JSON) ---
+
+class FormatoRespostaDano(BaseModel):
+    isDanoAmbiental: bool
+    justificativa: str
+
+class ItemDanoLote(BaseModel):
+    id: int
+    isDanoAmbiental: bool
+    justificativa: str
+
+class FormatoRespostaDanoLote(BaseModel):
+    resultados: list[ItemDanoLote]
+
+class FormatoRespostaSentenca(BaseModel):
+    numero_processo: str
+    georreferencia: str
+    uf: str
+    municipio: str
+    responsavel: str
+    categoria_responsavel: str
+    tipo_impacto: str
+    descricao_impacto: str
+    data_impacto: str
+    area_afetada: str
+    unidade_area: str
+    houve_compensacao: bool
+    categoria_compensacao: str
+    tipo_multa: int | str
+    valor_multa: float | str
+    valor_multa_diaria: float | str
+
+class FormatoRespostaTipo(BaseModel):
+    categoria_generalizada: str
+
+class ItemTipoLote(BaseModel):
+    id: int
+    categoria_generalizada: str
+
+class FormatoRespostaTiposLote(BaseModel):
+    resultados: list[ItemTipoLote]
+
+# --- Prompts ---
+
+# Categorias gerais usadas na generalização do tipo de impacto
+CATEGORIAS_GERAIS = [
+    'Poluição Hídrica',
+    'Poluição do Solo',
+    'Poluição do Ar e Sonora',
+    'Desmatamento e Danos à Flora',
+    'Incêndios e Queimadas',
+    'Danos à Fauna',
+    'Gestão Inadequada de Resíduos',
+    'Ocupação e Construção Irregular',
+    'Erosão, Assoreamento e Impactos Geológicos',
+    'Extração Ilegal de Recursos Naturais',
+    'Falhas e Riscos de Infraestrutura',
+    'Impactos Sociais e à Saúde Pública',
+    'Danos ao Patrimônio e Bens Públicos',
+    'Infrações Administrativas e Legais',
+    'Derramamento de Petróleo',
+    'Dano Ambiental Genérico / Outros'
+]
+
+# Lista das categorias no formato em que aparece nos prompts
+_CATEGORIAS_PROMPT = ",\n".join(f"        '{categoria}'" for categoria in CATEGORIAS_GERAIS)
+
+def prompt_dano_ambiental(texto):
     # Prompt que será enviado ao modelo de linguagem para avaliação do texto
-
-    prompt = f"""
+    return f"""
     Você é um especialista em direito ambiental.
     Analise o texto abaixo e verifique exclusivamente se ele descreve um dano ao meio ambiente.
 
@@ -44,57 +125,44 @@ def verifica_dano_ambiental(texto):
 
     Texto: {texto}
     """
-    
-    # Define o formato esperado da resposta vinda do modelo (como um esquema JSON)
-    class FormatoResposta(BaseModel):
-        isDanoAmbiental: bool
-        justificativa: str
-
-    # Função auxiliar que faz a requisição para o modelo Gemini usando a chave especificada
-    def requisicao_gemini(key):
-        client = genai.Client(api_key=os.getenv(key))
-        response = client.models.generate_content(
-            model="gemini-2.0-flash", #modelo utilzado
-            contents=prompt, #prompt criado acima
-            config={
-                "response_mime_type": "application/json", # Formato da resposta esperada
-                'response_schema': FormatoResposta,       # Validação da estrutura da resposta
-                'temperature': 1.0                        # Grau de aleatoriedade da resposta
-                # 'max_output_tokens': 500,
-            }
-        )
-        time.sleep(2)
-        return response
-
-    # Lista de chaves para tentativa sequencial, caso alguma falhe
-    chaves = ['GEMINI_API_KEY', 'GEMINI_API_KEY_2', 'GEMINI_API_KEY_3', 'GEMINI_API_KEY_4', 'GEMINI_API_KEY_5']
-
-    # Tenta usar cada chave para fazer a requisição até obter uma resposta válida
-    for chave in chaves:
-        try:
-            resposta = requisicao_gemini(chave)
-            return resposta # Se funcionar, retorna imediatamente
-        except Exception as e:
-            # Se houver erro, espera um pouco e tenta com a próxima chave
-            # print(f"Erro com chave {chave}: {e}")
-            time.sleep(5)
-            continue
 
-    # Se todas as tentativas falharem, retorna uma resposta padrão com erro
-    fallback_data = {
-        "isDanoAmbiental": False,
-        "justificativa": "Erro na classificação automática"
-    }
+def prompt_dano_ambiental_lote(documentos):
+    # Prompt para avaliar vários documentos em uma única requisição.
+    # `documentos` é uma lista de tuplas (id, texto)
+    textos = "\n\n".join(f'<documento id="{id_doc}">\n{texto}\n</documento>' for id_doc, texto in documentos)
+    return f"""
+    Você é um especialista em direito ambiental.
+    Analise separadamente cada um dos documentos abaixo e verifique exclusivamente se ele descreve um dano ao meio ambiente.
 
-    return FailResponse(fallback_data)
+    Dano ambiental, para fins desta análise, é qualquer impacto negativo ao meio ambiente natural — incluindo água, solo, ar, fauna, flora ou paisagem — causado por ação ou omissão humana.
 
-def analisa_sentenca(texto_extraido):
-    """
-    Função que extrai informações de um texto judicial relacionado a danos ambientais.
-    O texto deve ser um texto bruto que descreve um processo judicial relacionado a algum dano ambiental.
+    Ignore qualquer outro tipo de dano (como material, moral/ao consumidor ou patrimonial). Não considere fundamentos jurídicos fora do conceito de dano ambiental.
+
+    Importante: classifique como dano ambiental apenas se houver evidências claras de impacto negativo ao meio ambiente natural. Não considere danos indiretos ou potenciais, apenas danos efetivos e diretos.
+
+    Alguns exemplos de danos ambientais incluem:
+    - Desmatamento ilegal de áreas protegidas
+    - Contaminação de corpos d'água por produtos químicos
+    - Poluição do ar por emissões industriais
+    - Destruição de habitats naturais
+    - Derramamento de óleo em ecossistemas aquáticos
+    Não considere como dano ambiental:
+    - Danos materiais a propriedades privadas sem relação direta ou indireta com o meio ambiente
+    - Danos morais a indivíduos ou comunidades sem relação direta ou indireta com o meio ambiente 
+    - Questões de responsabilidade civil sem relação direta ou indireta com o meio ambiente
+    - Questões de direito do consumidor sem relação direta ou indireta com o meio ambiente
+    - Questões patrimoniais sem relação direta ou indireta com o meio ambiente
+
+    Para cada documento, se houver dano ambiental, responda com uma justificativa de no máximo 20 palavras. Caso contrário, responda apenas: "Não há dano ambiental".
+    Devolva exatamente um resultado para cada documento, usando o mesmo id do documento. Não misture informações entre documentos.
+
+    Documentos:
+    {textos}
     """
+
+def prompt_sentenca(texto_extraido):
     # Cria um prompt longo e detalhado para instruir o modelo de IA sobre como extrair dados estruturados do texto judicial.
-    prompt = f"""
+    return f"""
         SYSTEM: Você é meu assistente especialista em análise e extração de elementos de textos judiciais. Você irá realizar extrações especificamente sobre
         danos socioambientais de diversos tipos, pensando em futuramente usar a tabela gerada para fazer uma modelagem preditiva de multas para danos socioambientais.
 
@@ -171,79 +239,259 @@ def analisa_sentenca(texto_extraido):
         Texto para análise:
         {texto_extraido}
     """
-    
-    # Define a estrutura esperada da resposta do modelo, usando o pydantic BaseModel.
-    # Isso permite validar e estruturar a resposta JSON automaticamente.
-    class FormatoResposta2(BaseModel):
-        numero_processo: str
-        georreferencia: str
-        uf: str
-        municipio: str
-        responsavel: str
-        categoria_responsavel: str
-        tipo_impacto: str
-        descricao_impacto: str
-        data_impacto: str
-        area_afetada: str
-        unidade_area: str
-        houve_compensacao: bool
-        categoria_compensacao: str
-        tipo_multa: int | str
-        valor_multa: float | str
-        valor_multa_diaria: float | str
-
-    # Função auxiliar para enviar o prompt ao modelo Gemini via API.
-    def requisicao_gemini(key):
-        client = genai.Client(api_key=os.getenv(key))
-        response = client.models.generate_content(
-            model="gemini-2.0-flash", # modelo utilizado
-            contents=prompt, # prompt criado acima
-            config={
-                "response_mime_type": "application/json", # Formato da resposta esperada
-                'response_schema': FormatoResposta2,       # Validação da estrutura da resposta
-                'temperature': 1.0    ,                        # Grau de aleatoriedade da resposta
-                # 'max_output_tokens': 500,
-            }
-        )
-        time.sleep(2)
-        return response
-
-    # Lista de chaves de API a serem testadas em sequência caso ocorram erros (como limites de uso).
-    chaves = ['GEMINI_API_KEY', 'GEMINI_API_KEY_2', 'GEMINI_API_KEY_3', 'GEMINI_API_KEY_4', 'GEMINI_API_KEY_5']
-    # Tenta usar cada chave até obter uma resposta válida ou esgotar todas as opções.
-    for chave in chaves:
+
+def prompt_tipo(tipo_impacto):
+    # Prompt que será enviado ao modelo de linguagem para categorização do tipo de impacto ambiental.
+    return f"""
+        SYSTEM: Você é um especialista em meio ambiente e direito ambiental.
+
+        INSTRUCTION: Sua tarefa é analisar o tipo de impacto específico fornecido e classificá-lo dentro de apenas uma das categorias generalizadas listadas a seguir. 
+        Considere que cada tipo de impacto pode ser classificado em apenas uma categoria. 
+        Em caso de um valor NULL, também devolva NULL. 
+        Em caso de um impacto específico idêntico a uma das categorias generalizadas, apenas devolva esta mesma categoria.
+
+        CATEGORIAS GERAIS: 
+{_CATEGORIAS_PROMPT}
+
+        USER: Aqui está o tipo de impacto que você deve generalizar: {tipo_impacto}   
+        """
+
+def prompt_tipos_lote(itens):
+    # Prompt para generalizar vários tipos de impacto em uma única requisição.
+    # `itens` é uma lista de dicionários {"id": ..., "tipo_impacto": ...}
+    return f"""
+        SYSTEM: Você é um especialista em meio ambiente e direito ambiental.
+
+        INSTRUCTION: Sua tarefa é analisar cada tipo de impacto específico da lista fornecida e classificá-lo dentro de apenas uma das categorias generalizadas listadas a seguir. 
+        Considere que cada tipo de impacto pode ser classificado em apenas uma categoria. 
+        Devolva exatamente um resultado para cada item, usando o mesmo "id" do item de entrada.
+        Use apenas os nomes das categorias exatamente como estão escritos abaixo.
+
+        CATEGORIAS GERAIS: 
+{_CATEGORIAS_PROMPT}
+
+        USER: Aqui está a lista (JSON) de tipos de impacto que você deve generalizar: {json.dumps(itens, ensure_ascii=False)}
+        """
+
+# --- Respostas padrão em caso de falha ---
+
+ERRO_CLASSIFICACAO = "Erro na classificação automática"
+
+FALLBACK_DANO = {
+    "isDanoAmbiental": False,
+    "justificativa": ERRO_CLASSIFICACAO
+}
+
+FALLBACK_SENTENCA = {campo: ERRO_CLASSIFICACAO for campo in FormatoRespostaSentenca.model_fields}
+
+FALLBACK_TIPO = {
+    "categoria_generalizada": ERRO_CLASSIFICACAO
+}
+
+# Tarefas disponíveis para classificação: nome -> (função do prompt, formato da resposta, resposta de falha)
+TAREFAS_GEMINI = {
+    'verifica_dano_ambiental': (prompt_dano_ambiental, FormatoRespostaDano, FALLBACK_DANO),
+    'analisa_sentenca': (prompt_sentenca, FormatoRespostaSentenca, FALLBACK_SENTENCA),
+    'analisa_tipo': (prompt_tipo, FormatoRespostaTipo, FALLBACK_TIPO),
+}
+
+# Versão de cada prompt, usada na chave do cache de respostas.
+# Deve ser incrementada sempre que o texto do prompt ou o formato da resposta mudar.
+VERSOES_PROMPT = {
+    'verifica_dano_ambiental': 1,
+    'analisa_sentenca': 1,
+    'analisa_tipo': 1,
+}
+
+# --- Tratamento de limite de uso (429) ---
+
+def erro_limite_taxa(erro):
+    """
+    Indica se o erro retornado pela API corresponde a limite de uso excedido (HTTP 429 / RESOURCE_EXHAUSTED).
+    """
+    if getattr(erro, 'code', None) == 429:
+        return True
+    return 'RESOURCE_EXHAUSTED' in str(erro)
+
+def espera_sugerida(erro):
+    """
+    Retorna o tempo de espera (em segundos) indicado pela API no campo 'retryDelay', ou None se não houver.
+    """
+    match = re.search(r"retryDelay['\"]?\s*:\s*['\"]?(\d+(?:\.\d+)?)s", str(erro))
+    return float(match.group(1)) if match else None
+
+def estima_tokens(texto):
+    # Estimativa grosseira usada para reservar a cota de tokens por minuto (~4 caracteres por token)
+    return len(texto) // 4 + 1
+
+def tokens_usados(resposta):
+    # Número real de tokens informado pela API, quando disponível
+    return getattr(getattr(resposta, 'usage_metadata', None), 'total_token_count', None)
+
+# --- Requisições ao Gemini ---
+
+def _config_gemini(formato):
+    return {
+        "response_mime_type": "application/json", # Formato da resposta esperada
+        'response_schema': formato,               # Validação da estrutura da resposta
+        'temperature': 1.0                        # Grau de aleatoriedade da resposta
+        # 'max_output_tokens': 500,
+    }
+
+# --- Registro de clientes do Gemini ---
+# Cada chave tem um único genai.Client, criado na primeira vez em que é usada, para reaproveitar
+# as conexões HTTP (e o handshake TLS) entre requisições.
+_clientes = {}
+# Clientes usados pela API assíncrona: as conexões ficam presas ao event loop em que foram abertas,
+# então há um registro por loop (descartado automaticamente quando o loop deixa de existir)
+_clientes_por_loop = weakref.WeakKeyDictionary()
+_lock_clientes = threading.Lock()
+
+def obtem_cliente(chave):
+    """
+    Retorna o cliente do Gemini associado à chave, criando-o apenas na primeira chamada.
+    """
+    with _lock_clientes:
+        if chave not in _clientes:
+            _clientes[chave] = genai.Client(api_key=os.getenv(chave))
+        return _clientes[chave]
+
+def obtem_cliente_async(chave):
+    """
+    Retorna o cliente do Gemini associado à chave para o event loop em execução.
+    """
+    loop = asyncio.get_running_loop()
+    with _lock_clientes:
+        clientes_loop = _clientes_por_loop.setdefault(loop, {})
+        if chave not in clientes_loop:
+            clientes_loop[chave] = genai.Client(api_key=os.getenv(chave))
+        return clientes_loop[chave]
+
+def requisicao_gemini(chave, prompt, formato, cliente=None):
+    """
+    Faz a requisição ao modelo Gemini usando a chave especificada.
+    Se `cliente` for informado (ex.: um cliente falso em testes), ele é usado no lugar do cliente da chave.
+    """
+    client = cliente or obtem_cliente(chave)
+    return client.models.generate_content(
+        model=MODELO_GEMINI,
+        contents=prompt,
+        config=_config_gemini(formato)
+    )
+
+async def requisicao_gemini_async(chave, prompt, formato, cliente=None):
+    """
+    Versão assíncrona de requisicao_gemini.
+    """
+    client = cliente or obtem_cliente_async(chave)
+    return await client.aio.models.generate_content(
+        model=MODELO_GEMINI,
+        contents=prompt,
+        config=_config_gemini(formato)
+    )
+
+def requisicao_com_pool(prompt, formato, fallback, pool=None, cliente=None):
+    """
+    Faz a requisição usando a chave indicada pelo pool (a que estiver disponível primeiro).
+    Em caso de erro 429, apenas a chave que recebeu o erro é bloqueada e a requisição é refeita com outra.
+    Caso nenhuma tentativa funcione, retorna uma resposta padrão de falha.
+    """
+    pool = pool or pool_padrao()
+    tokens = estima_tokens(prompt)
+    outros_erros = 0
+    for _ in range(MAX_TENTATIVAS_LIMITE * len(pool.chaves)):
+        chave = pool.adquire(tokens)
         try:
-            resposta = requisicao_gemini(chave)
-            return resposta # Retorna a primeira resposta válida recebida
+            resposta = requisicao_gemini(chave, prompt, formato, cliente)
         except Exception as e:
-            # Se ocorrer um erro, espera um pouco e tenta com a próxima chave
+            pool.libera(chave, tokens, sucesso=False)
             # print(f"Erro com chave {chave}: {e}")
-            time.sleep(5)
+            if erro_limite_taxa(e):
+                pool.reporta_limite(chave, espera_sugerida(e))
+                continue
+            # Erro que não é de limite de uso: tenta as demais chaves e depois desiste
+            outros_erros += 1
+            if outros_erros >= len(pool.chaves):
+                break
             continue
-    
-    # Caso todas as requisições falhem, retorna uma resposta padrão indicando erro em todos os campos.
-    fallback_data = {
-        "numero_processo" : "Erro na classificação automática",
-        "georreferencia" : "Erro na classificação automática",
-        "uf" : "Erro na classificação automática",
-        "municipio" : "Erro na classificação automática",
-        "responsavel" : "Erro na classificação automática",
-        "categoria_responsavel" : "Erro na classificação automática",
-        "tipo_impacto" : "Erro na classificação automática",
-        "descricao_impacto" : "Erro na classificação automática",
-        "data_impacto" : "Erro na classificação automática",
-        "area_afetada" : "Erro na classificação automática",
-        "unidade_area" : "Erro na classificação automática",
-        "houve_compensacao" : "Erro na classificação automática",
-        "categoria_compensacao" : "Erro na classificação automática",
-        "tipo_multa" : "Erro na classificação automática",
-        "valor_multa" : "Erro na classificação automática",
-        "valor_multa_diaria" : "Erro na classificação automática"
-    }
+        pool.libera(chave, tokens, tokens_usados(resposta))
+        return resposta # Se funcionar, retorna imediatamente
 
-    return FailResponse(fallback_data)
+    return FailResponse(fallback)
+
+async def requisicao_com_pool_async(prompt, formato, fallback, pool=None, cliente=None):
+    """
+    Versão assíncrona de requisicao_com_pool.
+    """
+    pool = pool or pool_padrao()
+    tokens = estima_tokens(prompt)
+    outros_erros = 0
+    for _ in range(MAX_TENTATIVAS_LIMITE * len(pool.chaves)):
+        chave = await pool.adquire_async(tokens)
+        try:
+            resposta = await requisicao_gemini_async(chave, prompt, formato, cliente)
+        except Exception as e:
+            pool.libera(chave, tokens, sucesso=False)
+            if erro_limite_taxa(e):
+                pool.reporta_limite(chave, espera_sugerida(e))
+                continue
+            outros_erros += 1
+            if outros_erros >= len(pool.chaves):
+                break
+            continue
+        pool.libera(chave, tokens, tokens_usados(resposta))
+        return resposta
+
+    return FailResponse(fallback)
+
+# --- Cache de respostas ---
+
+def _chave_tarefa(tarefa, texto):
+    return chave_cache(tarefa, MODELO_GEMINI, VERSOES_PROMPT[tarefa], texto)
+
+def _armazena_no_cache(cache, chave, tarefa, resposta):
+    # Apenas respostas válidas da API são armazenadas (falhas devem ser refeitas na próxima execução)
+    if isinstance(resposta, FailResponse):
+        return
+    try:
+        json.loads(resposta.text)
+    except (TypeError, ValueError):
+        return
+    cache.salva(chave, tarefa, resposta.text)
+
+def executa_tarefa(tarefa, texto, cliente=None, usar_cache=True):
+    """
+    Executa uma das tarefas de TAREFAS_GEMINI para o texto, consultando antes o cache de respostas.
+    """
+    funcao_prompt, formato, fallback = TAREFAS_GEMINI[tarefa]
+    cache = cache_padrao() if usar_cache else None
+    if cache is not None:
+        chave = _chave_tarefa(tarefa, texto)
+        texto_resposta = cache.obtem(chave)
+        if texto_resposta is not None:
+            return RespostaCache(texto_resposta)
+    resposta = requisicao_com_pool(funcao_prompt(texto), formato, fallback, cliente=cliente)
+    if cache is not None:
+        _armazena_no_cache(cache, chave, tarefa, resposta)
+    return resposta
+
+# Função principal que verifica se o texto contém um dano ambiental
+def verifica_dano_ambiental(texto, cliente=None, usar_cache=True):
+    """
+    Função que verifica se o texto possui dano ambiental.
+    Se houver, justifica a resposta. Caso contrário, responde "Não há dano ambiental".
+    """
+    return executa_tarefa('verifica_dano_ambiental', texto, cliente, usar_cache)
+
+def analisa_sentenca(texto_extraido, cliente=None, usar_cache=True):
+    """
+    Função que extrai informações de um texto judicial relacionado a danos ambientais.
+    O texto deve ser um texto bruto que descreve um processo judicial relacionado a algum dano ambiental.
+    """
+    return executa_tarefa('analisa_sentenca', texto_extraido, cliente, usar_cache)
 
 def divide_lista_em_partes(lista, num_partes):
+    # Para processar as partes em paralelo sem dividir a lista manualmente, veja fila_trabalho.FilaTrabalho
     # Divisão exata: a lista pode ser dividida igualmente sem sobras.
     if len(lista) % num_partes == 0:
         # Dvisão exata
@@ -264,73 +512,232 @@ def divide_lista_em_partes(lista, num_partes):
                 partes.append(lista[i * tamanho_parte:(i + 1) * tamanho_parte])
     return partes
 
-def analisa_tipo(tipo_impacto):
-        # Prompt que será enviado ao modelo de linguagem para categorização do tipo de impacto ambiental.
-        prompt = f"""
-        SYSTEM: Você é um especialista em meio ambiente e direito ambiental.
+def analisa_tipo(tipo_impacto, cliente=None, usar_cache=True):
+    """
+    Função que generaliza um tipo de impacto específico em uma das categorias gerais.
+    """
+    return executa_tarefa('analisa_tipo', tipo_impacto, cliente, usar_cache)
 
-        INSTRUCTION: Sua tarefa é analisar o tipo de impacto específico fornecido e classificá-lo dentro de apenas uma das categorias generalizadas listadas a seguir. 
-        Considere que cada tipo de impacto pode ser classificado em apenas uma categoria. 
-        Em caso de um valor NULL, também devolva NULL. 
-        Em caso de um impacto específico idêntico a uma das categorias generalizadas, apenas devolva esta mesma categoria.
+# --- Triagem de dano ambiental em lote ---
 
-        CATEGORIAS GERAIS: 
-        'Poluição Hídrica',
-        'Poluição do Solo',
-        'Poluição do Ar e Sonora',
-        'Desmatamento e Danos à Flora',
-        'Incêndios e Queimadas',
-        'Danos à Fauna',
-        'Gestão Inadequada de Resíduos',
-        'Ocupação e Construção Irregular',
-        'Erosão, Assoreamento e Impactos Geológicos',
-        'Extração Ilegal de Recursos Naturais',
-        'Falhas e Riscos de Infraestrutura',
-        'Impactos Sociais e à Saúde Pública',
-        'Danos ao Patrimônio e Bens Públicos',
-        'Infrações Administrativas e Legais',
-        'Derramamento de Petróleo',
-        'Dano Ambiental Genérico / Outros'
+def _agrupa_por_orcamento(indices, tokens, orcamento_tokens, max_documentos):
+    """
+    Agrupa os índices dos documentos em lotes cuja soma estimada de tokens não passe do orçamento.
+    """
+    lotes, atual, soma = [], [], 0
+    for i in indices:
+        if atual and (soma + tokens[i] > orcamento_tokens or len(atual) >= max_documentos):
+            lotes.append(atual)
+            atual, soma = [], 0
+        atual.append(i)
+        soma += tokens[i]
+    if atual:
+        lotes.append(atual)
+    return lotes
+
+def _verifica_lote(textos, indices, cliente=None, usar_cache=True):
+    """
+    Classifica os documentos `indices` em uma única requisição.
+    Se a resposta vier malformada ou incompleta, divide os documentos faltantes ao meio e tenta novamente;
+    um documento isolado é classificado por verifica_dano_ambiental.
+    Se a própria requisição falhar (indisponibilidade ou cota esgotada), não divide: dividir só multiplicaria
+    as requisições que também falhariam, então todos os documentos recebem FALLBACK_DANO.
+    Retorna um dicionário índice -> dicionário de resposta.
+    """
+    if len(indices) == 1:
+        i = indices[0]
+        return {i: json.loads(verifica_dano_ambiental(textos[i], cliente, usar_cache).text)}
+
+    resposta = requisicao_com_pool(
+        prompt_dano_ambiental_lote([(i, textos[i]) for i in indices]),
+        FormatoRespostaDanoLote, {"resultados": []}, cliente=cliente
+    )
+    if isinstance(resposta, FailResponse):
+        return {i: dict(FALLBACK_DANO) for i in indices}
+    resultados = {}
+    try:
+        for item in json.loads(resposta.text)["resultados"]:
+            i = int(item["id"])
+            if i in indices and i not in resultados:
+                resultados[i] = {"isDanoAmbiental": bool(item["isDanoAmbiental"]), "justificativa": str(item["justificativa"])}
+    except (TypeError, ValueError, KeyError):
+        resultados = {}
+
+    faltantes = [i for i in indices if i not in resultados]
+    if faltantes:
+        meio = (len(faltantes) + 1) // 2
+        for parte in (faltantes[:meio], faltantes[meio:]):
+            if parte:
+                resultados.update(_verifica_lote(textos, parte, cliente, usar_cache))
+    return resultados
+
+def verifica_dano_ambiental_em_lote(textos, orcamento_tokens=8000, max_documentos=20, cliente=None, usar_cache=True, mostrar_progresso=True):
+    """
+    Versão em lote de verifica_dano_ambiental: agrupa vários documentos curtos em uma única requisição,
+    respeitando um orçamento estimado de tokens por requisição, para não repetir o prompt a cada documento.
+    Documentos maiores que o orçamento são enviados sozinhos.
+    Retorna uma lista, na ordem dos textos de entrada, de objetos com o atributo `.text` (como verifica_dano_ambiental).
+    """
+    textos = [str(texto) for texto in textos]
+    cache = cache_padrao() if usar_cache else None
+    respostas = [None] * len(textos)
+    pendentes = []
+    for i, texto in enumerate(textos):
+        texto_resposta = cache.obtem(_chave_tarefa('verifica_dano_ambiental', texto)) if cache is not None else None
+        if texto_resposta is not None:
+            respostas[i] = RespostaCache(texto_resposta)
+        else:
+            pendentes.append(i)
+
+    tokens = {i: estima_tokens(textos[i]) for i in pendentes}
+    lotes = _agrupa_por_orcamento(pendentes, tokens, orcamento_tokens, max_documentos)
+    for lote in tqdm(lotes, desc='verifica_dano_ambiental_em_lote', disable=not mostrar_progresso):
+        for i, dados in _verifica_lote(textos, lote, cliente, usar_cache).items():
+            resposta = RespostaLocal(dados)
+            if cache is not None and dados.get("justificativa") != ERRO_CLASSIFICACAO:
+                _armazena_no_cache(cache, _chave_tarefa('verifica_dano_ambiental', textos[i]), 'verifica_dano_ambiental', resposta)
+            respostas[i] = resposta
+    return respostas
+
+# --- Generalização de tipos de impacto em DataFrames ---
+
+# Valores tratados como nulos na coluna de tipo de impacto
+_VALORES_NULOS = {'', 'null', 'nan', 'none', 'n/a'}
+
+def normaliza_texto(texto):
+    """
+    Normaliza um texto para comparação: sem acentos, minúsculo e com espaços simples.
+    """
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.casefold().split()).strip(' .;')
 
-        USER: Aqui está o tipo de impacto que você deve generalizar: {tipo_impacto}   
-        """
+_CATEGORIAS_NORMALIZADAS = {normaliza_texto(categoria): categoria for categoria in CATEGORIAS_GERAIS}
 
-        # Define a estrutura esperada da resposta do modelo, usando o pydantic BaseModel.
-        class FormatoResposta(BaseModel):
-            categoria_generalizada: str
-
-        def requisicao_gemini(key):
-            client = genai.Client(api_key=os.getenv(key))
-            response = client.models.generate_content(
-                model="gemini-2.0-flash", # modelo utilizado
-                contents=prompt, # prompt criado acima
-                config={
-                    "response_mime_type": "application/json", # Formato da resposta esperada
-                    'response_schema': FormatoResposta,  # Validação da estrutura da resposta
-                    'temperature': 1.0 # Grau de aleatoriedade da resposta
-                    # 'max_output_tokens': 500,
-                }
-            )
-            time.sleep(1)
-            return response
-        
-        # Lista de chaves de API a serem testadas em sequência caso ocorram erros (como limites de uso).
-        chaves = ['GEMINI_API_KEY', 'GEMINI_API_KEY_2', 'GEMINI_API_KEY_3', 'GEMINI_API_KEY_4']
-
-        # Tenta usar cada chave até obter uma resposta válida ou esgotar todas as opções.
-        for chave in chaves:
-            try:
-                resposta = requisicao_gemini(chave) # Retorna a primeira resposta válida recebida
-                return resposta 
-            except Exception as e:
-                # Se ocorrer um erro, espera um pouco e tenta com a próxima chave
-                # print(f"Erro com chave {chave}: {e}")
-                time.sleep(5)
-                continue
+def _categoria_valida(categoria):
+    # Retorna a categoria com a grafia oficial, ou None se não for uma das categorias gerais
+    return _CATEGORIAS_NORMALIZADAS.get(normaliza_texto(categoria))
 
-        # Caso todas as requisições falhem, retorna uma resposta padrão indicando erro.
-        fallback_data = {
-            "categoria_generalizada" : "Erro na classificação automática"
-        }
+def _generaliza_lote(valores, cliente=None):
+    """
+    Generaliza vários tipos de impacto em uma única requisição.
+    Retorna um dicionário valor -> categoria apenas para os valores com resposta válida.
+    """
+    itens = [{"id": i, "tipo_impacto": valor} for i, valor in enumerate(valores)]
+    resposta = requisicao_com_pool(prompt_tipos_lote(itens), FormatoRespostaTiposLote, {"resultados": []}, cliente=cliente)
+    try:
+        resultados = json.loads(resposta.text)["resultados"]
+    except (TypeError, ValueError, KeyError):
+        return {}
+    categorias = {}
+    for item in resultados:
+        try:
+            valor = valores[int(item["id"])]
+        except (KeyError, ValueError, TypeError, IndexError):
+            continue
+        categoria = _categoria_valida(item.get("categoria_generalizada", ""))
+        if categoria is not None:
+            categorias[valor] = categoria
+    return categorias
 
-        return FailResponse(fallback_data)
\ No newline at end of file
+def generaliza_tipos(serie, tamanho_lote=40, cliente=None, usar_cache=True, mostrar_progresso=True):
+    """
+    Generaliza uma coluna inteira de tipos de impacto (pd.Series) nas CATEGORIAS_GERAIS.
+    Os valores são reduzidos aos únicos (após normalização); nulos e valores idênticos a uma categoria
+    são resolvidos localmente e o restante é enviado ao Gemini em lotes de `tamanho_lote` valores por requisição.
+    Retorna uma pd.Series com o mesmo índice da entrada.
+    Ex.: df["tipo_impacto_geral"] = generaliza_tipos(df["tipo_impacto"])
+    """
+    serie = pd.Series(serie)
+    chaves = serie.map(lambda valor: 'null' if pd.isna(valor) else normaliza_texto(valor))
+
+    # Um valor original representativo para cada valor normalizado
+    representantes = {}
+    for chave, valor in zip(chaves, serie):
+        representantes.setdefault(chave, valor)
+
+    categorias = {}
+    pendentes = []
+    cache = cache_padrao() if usar_cache else None
+    for chave, valor in representantes.items():
+        if chave in _VALORES_NULOS:
+            categorias[chave] = 'NULL'
+        elif chave in _CATEGORIAS_NORMALIZADAS:
+            categorias[chave] = _CATEGORIAS_NORMALIZADAS[chave]
+        else:
+            texto_resposta = cache.obtem(_chave_tarefa('analisa_tipo', valor)) if cache is not None else None
+            if texto_resposta is not None:
+                categorias[chave] = json.loads(texto_resposta)["categoria_generalizada"]
+            else:
+                pendentes.append(chave)
+
+    lotes = [pendentes[i:i + tamanho_lote] for i in range(0, len(pendentes), tamanho_lote)]
+    for lote in tqdm(lotes, desc='generaliza_tipos', disable=not mostrar_progresso):
+        valores = [str(representantes[chave]) for chave in lote]
+        resultados = _generaliza_lote(valores, cliente)
+        for chave, valor in zip(lote, valores):
+            if valor in resultados:
+                categorias[chave] = resultados[valor]
+                if cache is not None:
+                    cache.salva(_chave_tarefa('analisa_tipo', representantes[chave]), 'analisa_tipo',
+                                json.dumps({"categoria_generalizada": resultados[valor]}, ensure_ascii=False))
+            else:
+                # Item ausente ou com categoria inválida na resposta do lote: classifica individualmente
+                resposta = analisa_tipo(representantes[chave], cliente, usar_cache)
+                categorias[chave] = json.loads(resposta.text)["categoria_generalizada"]
+
+    return chaves.map(categorias)
+
+# --- Classificação concorrente em lote ---
+
+def _executa_corrotina(corrotina):
+    """
+    Executa uma corrotina a partir de código síncrono.
+    Dentro do Jupyter já existe um event loop rodando, então a corrotina é executada em outra thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(corrotina)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, corrotina).result()
+
+async def classifica_em_lote_async(textos, tarefa='verifica_dano_ambiental', concorrencia=8, pool=None, cliente=None, mostrar_progresso=True, usar_cache=True):
+    """
+    Classifica vários textos concorrentemente, mantendo no máximo `concorrencia` requisições em andamento
+    distribuídas pelo pool entre todas as chaves. Os resultados são retornados na mesma ordem dos textos de entrada,
+    como objetos com o atributo `.text` (iguais aos retornados pelas funções síncronas).
+    Textos que já estão no cache de respostas não geram requisições.
+    """
+    funcao_prompt, formato, fallback = TAREFAS_GEMINI[tarefa]
+    semaforo = asyncio.Semaphore(concorrencia)
+    cache = cache_padrao() if usar_cache else None
+    barra = tqdm(total=len(textos), desc=tarefa, disable=not mostrar_progresso)
+
+    async def processa(texto):
+        if cache is not None:
+            chave = _chave_tarefa(tarefa, texto)
+            texto_resposta = cache.obtem(chave)
+            if texto_resposta is not None:
+                barra.update(1)
+                return RespostaCache(texto_resposta)
+        async with semaforo:
+            resposta = await requisicao_com_pool_async(funcao_prompt(texto), formato, fallback, pool, cliente)
+        if cache is not None:
+            _armazena_no_cache(cache, chave, tarefa, resposta)
+        barra.update(1)
+        return resposta
+
+    try:
+        return await asyncio.gather(*(processa(texto) for texto in textos))
+    finally:
+        barra.close()
+
+def classifica_em_lote(textos, tarefa='verifica_dano_ambiental', concorrencia=8, pool=None, cliente=None, mostrar_progresso=True, usar_cache=True):
+    """
+    Versão síncrona de classifica_em_lote_async, que pode ser chamada diretamente dos notebooks.
+    Ex.: respostas = classifica_em_lote(textos, tarefa='analisa_sentenca', concorrencia=10)
+    """
+    return _executa_corrotina(
+        classifica_em_lote_async(textos, tarefa, concorrencia, pool, cliente, mostrar_progresso, usar_cache)
+    )
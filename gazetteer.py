@@ -0,0 +1,151 @@
+"""
+Geocodificação offline de municípios brasileiros a partir de uma tabela local (UF, município) -> latitude/longitude.
+
+A tabela fica em docs/municipios_brasil.csv. Para atualizá-la com a lista completa de municípios
+(github.com/kelvins/municipios-brasileiros, coordenadas das sedes municipais), execute:
+    python gazetteer.py atualiza
+"""
+import io
+import os
+import sys
+import difflib
+import unicodedata
+import pandas as pd
+from cache_geocodificacao import Localizacao
+
+CAMINHO_MUNICIPIOS = 'docs/municipios_brasil.csv'
+URL_MUNICIPIOS = 'https://raw.githubusercontent.com/kelvins/municipios-brasileiros/main/csv/municipios.csv'
+URL_ESTADOS = 'https://raw.githubusercontent.com/kelvins/municipios-brasileiros/main/csv/estados.csv'
+
+# Semelhança mínima (0 a 1) para aceitar um nome aproximado (erros de digitação, grafias antigas)
+SIMILARIDADE_MINIMA = 0.88
+
+ESTADOS = {
+    'AC': 'Acre', 'AL': 'Alagoas', 'AP': 'Amapá', 'AM': 'Amazonas', 'BA': 'Bahia', 'CE': 'Ceará',
+    'DF': 'Distrito Federal', 'ES': 'Espírito Santo', 'GO': 'Goiás', 'MA': 'Maranhão', 'MT': 'Mato Grosso',
+    'MS': 'Mato Grosso do Sul', 'MG': 'Minas Gerais', 'PA': 'Pará', 'PB': 'Paraíba', 'PR': 'Paraná',
+    'PE': 'Pernambuco', 'PI': 'Piauí', 'RJ': 'Rio de Janeiro', 'RN': 'Rio Grande do Norte',
+    'RS': 'Rio Grande do Sul', 'RO': 'Rondônia', 'RR': 'Roraima', 'SC': 'Santa Catarina', 'SP': 'São Paulo',
+    'SE': 'Sergipe', 'TO': 'Tocantins',
+}
+
+# Prefixos comuns no campo município extraído das sentenças
+_PREFIXOS = ('municipio de ', 'comarca de ', 'cidade de ', 'foro de ', 'foro distrital de ')
+
+def normaliza_nome(nome):
+    """
+    Nome sem acentos, em minúsculas, sem apóstrofos/hífens e com espaços padronizados.
+    Ex.: "Olho-d'Água das Cunhas" -> "olho d agua das cunhas"
+    """
+    texto = unicodedata.normalize('NFKD', str(nome))
+    texto = ''.join(caractere for caractere in texto if not unicodedata.combining(caractere)).lower()
+    for caractere in "'’`´-.":
+        texto = texto.replace(caractere, ' ')
+    return ' '.join(texto.split())
+
+_UF_POR_NOME = {normaliza_nome(nome): sigla for sigla, nome in ESTADOS.items()}
+_UF_POR_NOME['federal district'] = 'DF'
+
+def normaliza_uf(uf):
+    """
+    Sigla da UF a partir da sigla ou do nome do estado ("sp", "São Paulo", "SP - São Paulo" -> "SP").
+    Retorna None se não for possível identificar a UF.
+    """
+    texto = normaliza_nome(uf)
+    if texto.upper() in ESTADOS:
+        return texto.upper()
+    if texto in _UF_POR_NOME:
+        return _UF_POR_NOME[texto]
+    primeira = texto.split(' ')[0].upper() if texto else ''
+    return primeira if primeira in ESTADOS else None
+
+def limpa_municipio(municipio, uf=None):
+    # Remove prefixos ("Comarca de ...") e a UF no final ("Santos/SP", "Santos - SP")
+    nome = normaliza_nome(str(municipio).split('/')[0])
+    for prefixo in _PREFIXOS:
+        if nome.startswith(prefixo):
+            nome = nome[len(prefixo):]
+    if uf and nome.endswith(' ' + uf.lower()):
+        nome = nome[:-3].strip()
+    return nome
+
+class Gazetteer:
+    """
+    Tabela local de municípios para geocodificação offline, com busca sem acentos e por aproximação.
+    """
+    def __init__(self, caminho=CAMINHO_MUNICIPIOS, similaridade_minima=SIMILARIDADE_MINIMA):
+        self.similaridade_minima = similaridade_minima
+        tabela = pd.read_csv(caminho, dtype={'uf': str, 'municipio': str})
+        self._coordenadas = {}
+        self._nomes_por_uf = {}
+        for uf, municipio, latitude, longitude in tabela[['uf', 'municipio', 'latitude', 'longitude']].itertuples(index=False):
+            chave = (uf, limpa_municipio(municipio, uf))
+            self._coordenadas.setdefault(chave, (float(latitude), float(longitude), f"{municipio}, {uf}, Brasil"))
+            self._nomes_por_uf.setdefault(uf, []).append(chave[1])
+        self._resultados = {}
+
+    def __len__(self):
+        return len(self._coordenadas)
+
+    def localiza(self, municipio, uf):
+        """
+        Retorna a Localizacao do município (ou None se não estiver na tabela).
+        Aceita a UF por sigla ou nome e nomes com ou sem acentos; nomes que não são encontrados exatamente
+        são comparados por similaridade com os municípios da mesma UF. Os resultados ficam memorizados.
+        """
+        chave = (municipio, uf)
+        if chave not in self._resultados:
+            self._resultados[chave] = self._busca(municipio, uf)
+        return self._resultados[chave]
+
+    def _busca(self, municipio, uf):
+        sigla = normaliza_uf(uf)
+        if sigla is None or municipio is None:
+            return None
+        nome = limpa_municipio(municipio, sigla)
+        resultado = self._coordenadas.get((sigla, nome))
+        if resultado is None:
+            parecidos = difflib.get_close_matches(nome, self._nomes_por_uf.get(sigla, []), n=1, cutoff=self.similaridade_minima)
+            if not parecidos:
+                return None
+            resultado = self._coordenadas[(sigla, parecidos[0])]
+        return Localizacao(*resultado)
+
+# Gazetteer compartilhado por padrão
+_gazetteer_padrao = None
+
+def gazetteer_padrao():
+    """
+    Retorna o gazetteer compartilhado (carregado na primeira chamada), ou None se a tabela não existir.
+    """
+    global _gazetteer_padrao
+    if _gazetteer_padrao is None and os.path.exists(CAMINHO_MUNICIPIOS):
+        _gazetteer_padrao = Gazetteer()
+    return _gazetteer_padrao
+
+def atualiza_tabela(caminho=CAMINHO_MUNICIPIOS):
+    """
+    Baixa a lista completa de municípios (kelvins/municipios-brasileiros) e a junta à tabela local.
+    Os municípios baixados têm prioridade; os que só existem na tabela local são mantidos.
+    """
+    import requests
+    municipios = pd.read_csv(io.StringIO(requests.get(URL_MUNICIPIOS, timeout=60).text))
+    estados = pd.read_csv(io.StringIO(requests.get(URL_ESTADOS, timeout=60).text))
+    municipios = municipios.merge(estados[['codigo_uf', 'uf']], on='codigo_uf')
+    novos = pd.DataFrame({
+        'uf': municipios['uf'], 'municipio': municipios['nome'],
+        'latitude': municipios['latitude'], 'longitude': municipios['longitude'], 'fonte': 'IBGE (kelvins)',
+    })
+    if os.path.exists(caminho):
+        novos = pd.concat([novos, pd.read_csv(caminho)], ignore_index=True)
+    chave = novos['uf'] + '|' + novos['municipio'].map(normaliza_nome)
+    tabela = novos[~chave.duplicated()].sort_values(['uf', 'municipio'])
+    tabela.to_csv(caminho, index=False)
+    return tabela
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ['atualiza']:
+        tabela = atualiza_tabela()
+        print(f"Tabela atualizada: {len(tabela)} municípios.")
+    else:
+        print(__doc__)
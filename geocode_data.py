@@ -1,93 +1,34 @@
 import pandas as pd
-from geopy.geocoders import Nominatim
-from geopy.extra.rate_limiter import RateLimiter
 import numpy as np
-import re
 import time  # Para medir o tempo
 import os    # Para criar o diretório 'docs'
-
-# --- Funções de parsing de DMS (inalteradas) ---
-def dms_to_dd(dms_str, original_full_ref=""):
-    if pd.isna(dms_str) or not isinstance(dms_str, str) or dms_str.strip().upper() == 'NULL' or dms_str.strip() == "":
-        return None
-    dms_str = dms_str.replace("‘", "’").replace("“", "”").replace("''", "”").replace("'", "’")
-    dms_str = dms_str.replace("`", "’")
-    match = re.search(r"(\d+)\s*(?:°|º|DEG|GRAUS|\s)\s*(\d+)\s*(?:’|'|MIN|\s)\s*([\d\.,]+)\s*(?:”|\"|SEC|\s)\s*([NSEWLO])",
-                      dms_str, re.IGNORECASE)
-    if not match:
-        match_simple = re.search(r"(\d+)\s*(?:°|º|DEG|GRAUS)\s*([\d\.,]+)\s*(?:’|'|MIN)\s*([NSEWLO])",
-                                   dms_str, re.IGNORECASE)
-        if match_simple:
-            degrees, minutes, direction = match_simple.groups()
-            seconds = "0"
-        else:
-            return None
-    else:
-        degrees, minutes, seconds, direction = match.groups()
-    try:
-        seconds = seconds.replace(',', '.')
-        minutes = minutes.replace(',', '.')
-        dd = float(degrees) + float(minutes)/60 + float(seconds)/(3600)
-    except ValueError:
-        return None
-    direction = direction.upper()
-    if direction in ['S', 'O', 'W']:
-        dd *= -1
-    elif direction not in ['N', 'E', 'L']:
-        return None
-    return dd
-
-
-def parse_georreferencia(georref_str):
-    if pd.isna(georref_str) or not isinstance(georref_str, str) or georref_str.strip().upper() == 'NULL' or georref_str.strip() == "":
-        return None, None
-    georref_str = georref_str.strip()
-    georref_str = georref_str.replace("‘", "’").replace("“", "”").replace("''", "”").replace("'", "’").replace("`", "’")
-    dms_pattern = r"\d+\s*(?:°|º|DEG|GRAUS|\s)\s*\d+\s*(?:’|'|MIN|\s)\s*[\d\.,]+\s*(?:”|\"|SEC|\s)\s*[NSEWLO]"
-    simple_pattern = r"\d+\s*(?:°|º|DEG|GRAUS)\s*[\d\.,]+\s*(?:’|'|MIN)\s*[NSEWLO]"
-    coords = list(re.finditer(dms_pattern, georref_str, re.IGNORECASE))
-    if len(coords) < 2:
-        coords = list(re.finditer(simple_pattern, georref_str, re.IGNORECASE))
-    lat_dd, lon_dd = None, None
-    if len(coords) == 2:
-        c1, c2 = coords[0].group(0), coords[1].group(0)
-        lat_str, lon_str = None, None
-        if re.search(r"[NS]$", c1, re.IGNORECASE) and re.search(r"[EWLO]$", c2, re.IGNORECASE):
-            lat_str, lon_str = c1, c2
-        elif re.search(r"[EWLO]$", c1, re.IGNORECASE) and re.search(r"[NS]$", c2, re.IGNORECASE):
-            lat_str, lon_str = c2, c1
-        if lat_str and lon_str:
-            lat_dd = dms_to_dd(lat_str, georref_str)
-            lon_dd = dms_to_dd(lon_str, georref_str)
-    if lat_dd is None or lon_dd is None:
-        decs = re.findall(r"([+-]?\d+\.\d+)", georref_str)
-        if len(decs) == 2:
-            try:
-                v1, v2 = float(decs[0]), float(decs[1])
-                if -90 <= v1 <= 90 and -180 <= v2 <= 180:
-                    lat_dd, lon_dd = v1, v2
-                elif -90 <= v2 <= 90 and -180 <= v1 <= 180:
-                    lat_dd, lon_dd = v2, v1
-            except ValueError:
-                pass
-    if lat_dd is not None and not (-90 <= lat_dd <= 90): lat_dd = None
-    if lon_dd is not None and not (-180 <= lon_dd <= 180): lon_dd = None
-    if lat_dd is None or lon_dd is None:
-        return None, None
-    return lat_dd, lon_dd
+import sys
+import json
+import hashlib
+from dados import CAMINHO_BASE_UNIFICADA, CAMINHO_GEOCODIFICADA, carrega_parquet, salva_parquet
+from cache_geocodificacao import consulta_municipio, consulta_regiao
+from gazetteer import gazetteer_padrao
+from geocodificadores import geocodificador_padrao
+from coordenadas import parse_georreferencia_vetorizado, zona_utm
+from banco_resultados import id_caso, para_texto
+
+# Relatório da geocodificação incremental (registros novos, alterados e removidos desde a execução anterior)
+CAMINHO_RELATORIO_DELTA = 'docs/geocodificacao_delta.csv'
+
+# Campos que determinam as coordenadas de um registro: se nenhum mudar, as coordenadas anteriores valem
+CAMPOS_LOCALIZACAO = ['fonte_dados', 'georreferencia', 'pais', 'uf', 'municipio', 'regiao']
 
 # --- Função principal de geocodificação ---
-def geocode_dataframe(df_input):
+def geocode_dataframe(df_input, geocodificador=None):
     df = df_input.copy()
-    geolocator = Nominatim(user_agent="meu_aplicativo_consultoria_v2")
-    geocode = RateLimiter(geolocator.geocode, min_delay_seconds=1.2, error_wait_seconds=10.0, max_retries=3)
-    geocode_cache = {}
+    # Provedores de geocodificação (Nominatim público ou instâncias próprias, em paralelo) com o cache
+    # persistente compartilhado com mapping.py: só lugares novos são consultados na rede
+    geocodificador = geocodificador or geocodificador_padrao()
+    # Tabela local de municípios: resolve município/UF sem acessar a rede
+    gazetteer = gazetteer_padrao()
 
-    parsed_from_georef_count = 0
     geocoded_by_municipio_count = 0
-    geocoded_by_regiao_count = 0
-    failed_to_geocode_count = 0
-    data_insufficient_count = 0
+    geocoded_by_gazetteer_count = 0
 
     df['latitude'] = np.nan
     df['longitude'] = np.nan
@@ -96,91 +37,158 @@ def geocode_dataframe(df_input):
     total = len(df)
     print(f"Iniciando geocodificação de {total} registros...")
 
-    for idx, row in df.iterrows():
-        print(f" Processando {idx+1}/{total} (Processo: {row.get('numero_processo','N/A')})... Fonte: {row.get('fonte_dados')}")
-        lat, lon = parse_georreferencia(row.get('georreferencia'))
-        if lat is not None and lon is not None:
-            df.at[idx, 'latitude'] = lat
-            df.at[idx, 'longitude'] = lon
-            df.at[idx, 'geo_precisao'] = 'Precisa (Original)'
-            parsed_from_georef_count += 1
-            continue
-
-        fonte = str(row.get('fonte_dados', '')).strip().lower()
-        # IOPC: geocode via 'regiao'
-        if fonte == 'iopc':
-            region = row.get('regiao')
-            if pd.notna(region) and isinstance(region, str) and region.strip():
-                query = region.strip()
-                loc = geocode_cache.get(query)
-                if loc is None and query not in geocode_cache:
-                    print(f"  Geocodificando região: {query}")
-                    try:
-                        loc = geocode(query, timeout=15)
-                    except Exception as e:
-                        print(f"    Erro geocodificação região '{query}': {e}")
-                        loc = None
-                    geocode_cache[query] = loc
-                if loc:
-                    df.at[idx, 'latitude'] = loc.latitude
-                    df.at[idx, 'longitude'] = loc.longitude
-                    df.at[idx, 'geo_precisao'] = 'Região (Aprox.)'
-                    geocoded_by_regiao_count += 1
-                else:
-                    df.at[idx, 'geo_precisao'] = 'Falha na Geocodificação'
-                    failed_to_geocode_count += 1
-            else:
-                df.at[idx, 'geo_precisao'] = 'Dados Insuficientes'
-                data_insufficient_count += 1
-            continue
-
-        # JusBrasil e Juscraper: geocode via município/UF
-        if pd.notna(row.get('municipio')) and pd.notna(row.get('uf')):
-            mun = str(row['municipio']).strip()
-            uf = str(row['uf']).strip()[:2].upper()
-            query = f"{mun}, {uf}, Brasil"
-            loc = geocode_cache.get(query)
-            if loc is None and query not in geocode_cache:
-                print(f"  Geocodificando município: {query}")
-                try:
-                    loc = geocode(query, timeout=15)
-                except Exception as e:
-                    print(f"    Erro geocodificação município '{query}': {e}")
-                    loc = None
-                geocode_cache[query] = loc
-            if loc:
-                df.at[idx, 'latitude'] = loc.latitude
-                df.at[idx, 'longitude'] = loc.longitude
-                df.at[idx, 'geo_precisao'] = 'Município (Aprox.)'
-                geocoded_by_municipio_count += 1
-            else:
-                df.at[idx, 'geo_precisao'] = 'Falha na Geocodificação'
-                failed_to_geocode_count += 1
-        else:
-            df.at[idx, 'geo_precisao'] = 'Dados Insuficientes'
-            data_insufficient_count += 1
+    # Coordenadas da coluna georreferencia, calculadas para todas as linhas de uma vez.
+    # Textos UTM sem zona usam a zona do município (pela tabela local)
+    zonas = None
+    com_georreferencia = df['georreferencia'].notna() & df['municipio'].notna() & df['uf'].notna()
+    if gazetteer is not None and com_georreferencia.any():
+        locais = [gazetteer.localiza(municipio, uf) for municipio, uf in df.loc[com_georreferencia, ['municipio', 'uf']].itertuples(index=False)]
+        zonas = pd.Series([zona_utm(loc.longitude) if loc else np.nan for loc in locais], index=df.index[com_georreferencia])
+    coordenadas = parse_georreferencia_vetorizado(df['georreferencia'], zonas_utm=zonas)
+    precisas = coordenadas['latitude'].notna()
+    df.loc[precisas, ['latitude', 'longitude']] = coordenadas.loc[precisas, ['latitude', 'longitude']]
+    df.loc[precisas, 'geo_precisao'] = 'Precisa (Original)'
+    parsed_from_georef_count = int(precisas.sum())
+
+    # IOPC é geocodificado pela 'regiao'; JusBrasil e juscraper, pelo município/UF
+    iopc = (df['fonte_dados'].astype('string').str.strip().str.lower() == 'iopc').fillna(False)
+    com_regiao = df['regiao'].map(lambda regiao: isinstance(regiao, str) and regiao.strip() != '').astype(bool)
+    com_municipio = df['municipio'].notna() & df['uf'].notna()
+    insuficientes = ~precisas & ((iopc & ~com_regiao) | (~iopc & ~com_municipio))
+    df.loc[insuficientes, 'geo_precisao'] = 'Dados Insuficientes'
+    data_insufficient_count = int(insuficientes.sum())
+
+    # Municípios da tabela local: uma busca por par (município, UF) distinto
+    por_municipio = ~precisas & ~iopc & com_municipio
+    if gazetteer is not None and por_municipio.any():
+        pares = pd.Series(list(zip(df.loc[por_municipio, 'municipio'], df.loc[por_municipio, 'uf'])),
+                          index=df.index[por_municipio])
+        locais = {par: gazetteer.localiza(*par) for par in pares.unique()}
+        encontrados = {par: loc for par, loc in locais.items() if loc is not None}
+        no_gazetteer = pares.isin(list(encontrados))
+        if no_gazetteer.any():
+            indices = no_gazetteer[no_gazetteer].index
+            df.loc[indices, 'latitude'] = pares[indices].map({par: loc.latitude for par, loc in encontrados.items()})
+            df.loc[indices, 'longitude'] = pares[indices].map({par: loc.longitude for par, loc in encontrados.items()})
+            df.loc[indices, 'geo_precisao'] = 'Município (Aprox.)'
+        geocoded_by_gazetteer_count = geocoded_by_municipio_count = int(no_gazetteer.sum())
+        por_municipio = por_municipio & ~df.index.isin(no_gazetteer[no_gazetteer].index)
+
+    # Restante (regiões e municípios fora da tabela local): uma consulta por lugar distinto, pelo cache
+    # persistente ou pelos provedores remotos, em paralelo
+    residuais = df.index[(~precisas & iopc & com_regiao) | por_municipio]
+    consultas = pd.Series(
+        [consulta_regiao(df.at[idx, 'regiao']) if iopc[idx] else consulta_municipio(df.at[idx, 'municipio'], df.at[idx, 'uf'])
+         for idx in residuais], index=residuais, dtype=object)
+    print(f"Geocodificando {len(residuais)} registros restantes ({consultas.nunique()} lugares distintos)...")
+    locais = geocodificador.geocodifica_varias(consultas)
+    encontrados = consultas.map(lambda consulta: locais[consulta] is not None).astype(bool)
+    df.loc[residuais, 'latitude'] = consultas.map(lambda consulta: locais[consulta].latitude if locais[consulta] else np.nan)
+    df.loc[residuais, 'longitude'] = consultas.map(lambda consulta: locais[consulta].longitude if locais[consulta] else np.nan)
+    df.loc[residuais, 'geo_precisao'] = np.where(~encontrados, 'Falha na Geocodificação',
+                                                 np.where(iopc[residuais], 'Região (Aprox.)', 'Município (Aprox.)'))
+    geocoded_by_regiao_count = int((encontrados & iopc[residuais]).sum())
+    geocoded_by_municipio_count += int((encontrados & ~iopc[residuais]).sum())
+    failed_to_geocode_count = int((~encontrados).sum())
 
     # Resumo
     print("\n--- Resumo do Processamento Geo ---")
     print(f"Total de registros: {total}")
     print(f"Da coluna georreferencia: {parsed_from_georef_count}")
     print(f"Via Região (IOPC): {geocoded_by_regiao_count}")
-    print(f"Via Município/UF: {geocoded_by_municipio_count}")
+    print(f"Via Município/UF: {geocoded_by_municipio_count} ({geocoded_by_gazetteer_count} pela tabela local de municípios)")
     print(f"Falhas na geocodificação: {failed_to_geocode_count}")
     print(f"Dados insuficientes: {data_insufficient_count}")
     sem_coords = total - parsed_from_georef_count - geocoded_by_regiao_count - geocoded_by_municipio_count
     print(f"Sem coordenadas no final: {sem_coords}")
+    print(f"Cache de geocodificação: {geocodificador.cache.estatisticas()}")
+    print(f"Provedores: {geocodificador.estatisticas()}")
     return df
 
 
+# --- Geocodificação incremental ---
+def chaves_incrementais(df):
+    """
+    Identificador estável de cada registro (id_caso, o mesmo do banco de resultados) e hash dos seus campos
+    de localização (CAMPOS_LOCALIZACAO), no mesmo índice do DataFrame.
+    """
+    registros = df.to_dict('records')
+    hashes = [hashlib.sha1(json.dumps([para_texto(registro.get(coluna)) for coluna in CAMPOS_LOCALIZACAO]).encode('utf-8')).hexdigest()[:16]
+              for registro in registros]
+    return pd.DataFrame({'id_caso': [id_caso(registro) for registro in registros], 'hash_localizacao': hashes},
+                        index=df.index)
+
+def geocode_incremental(df_input, df_anterior, geocodificador=None):
+    """
+    Geocodifica só os registros novos ou com campos de localização alterados desde a geocodificação anterior
+    (df_anterior, com latitude/longitude/geo_precisao); os demais reaproveitam as coordenadas anteriores.
+    Registros que falharam antes são tentados de novo (o cache evita repetir consultas recentes).
+    Retorna o DataFrame geocodificado, na ordem de df_input, e o relatório das diferenças (delta).
+    """
+    df = df_input.copy()
+    chaves = chaves_incrementais(df)
+    chaves_anteriores = chaves_incrementais(df_anterior)
+    anterior = pd.concat([chaves_anteriores, df_anterior[['latitude', 'longitude', 'geo_precisao']]], axis=1)
+    anterior = anterior.drop_duplicates(['id_caso', 'hash_localizacao']).set_index(['id_caso', 'hash_localizacao'])
+
+    chave = pd.MultiIndex.from_frame(chaves)
+    conhecidos = chave.isin(anterior.index)
+    falhas = conhecidos & (anterior['geo_precisao'].reindex(chave) == 'Falha na Geocodificação').to_numpy()
+    por_id = df_anterior['geo_precisao'].groupby(chaves_anteriores['id_caso']).first()
+    precisao_anterior = chaves['id_caso'].map(por_id)
+    reaproveitados = conhecidos & ~falhas
+
+    situacao = pd.Series('inalterado', index=df.index, dtype=object)
+    situacao[~conhecidos] = np.where(chaves.loc[~conhecidos, 'id_caso'].isin(chaves_anteriores['id_caso']), 'alterado', 'novo')
+    situacao[falhas] = 'nova tentativa'
+
+    df['latitude'] = np.nan
+    df['longitude'] = np.nan
+    df['geo_precisao'] = 'Nenhuma'
+    for coluna in ['latitude', 'longitude', 'geo_precisao']:
+        df.loc[reaproveitados, coluna] = anterior[coluna].reindex(chave[reaproveitados]).to_numpy()
+
+    pendentes = ~reaproveitados
+    print(f"Geocodificação incremental: {int(reaproveitados.sum())} registros reaproveitados, {int(pendentes.sum())} a geocodificar")
+    if pendentes.any():
+        geocodificados = geocode_dataframe(df_input[pendentes], geocodificador)
+        df.loc[pendentes, ['latitude', 'longitude', 'geo_precisao']] = geocodificados[['latitude', 'longitude', 'geo_precisao']]
+
+    # Relatório: registros geocodificados nesta execução e casos que saíram da base
+    colunas_relatorio = [coluna for coluna in ['fonte_dados', 'numero_processo', 'processoID', *CAMPOS_LOCALIZACAO[1:]] if coluna in df.columns]
+    delta = pd.concat([chaves[['id_caso']], situacao.rename('situacao'), df[colunas_relatorio],
+                       precisao_anterior.rename('geo_precisao_anterior'), df[['geo_precisao', 'latitude', 'longitude']]], axis=1)[pendentes]
+    removidos = ~chaves_anteriores['id_caso'].isin(chaves['id_caso'])
+    if removidos.any():
+        saidas = df_anterior.loc[removidos, [coluna for coluna in colunas_relatorio if coluna in df_anterior.columns]].copy()
+        saidas.insert(0, 'id_caso', chaves_anteriores.loc[removidos, 'id_caso'])
+        saidas.insert(1, 'situacao', 'removido')
+        saidas['geo_precisao_anterior'] = df_anterior.loc[removidos, 'geo_precisao']
+        delta = pd.concat([delta, saidas], ignore_index=True)
+    delta = delta.reset_index(drop=True)
+
+    print("\n--- Resumo da Geocodificação Incremental ---")
+    for nome, quantidade in pd.concat([situacao, delta['situacao'][delta['situacao'] == 'removido']]).value_counts().items():
+        print(f"{nome}: {quantidade}")
+    return df, delta
+
+def salva_relatorio_delta(delta, caminho=CAMINHO_RELATORIO_DELTA):
+    if os.path.dirname(caminho):
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    delta.to_csv(caminho, index=False)
+    print(f"Relatório de diferenças salvo em: {caminho} ({len(delta)} linhas)")
+
+
 if __name__ == "__main__":
     start = time.time()
-    input_path = 'docs\df_jusbrasil_iopc_juscraper.xlsx'
-    output_path = 'docs/results_geocoded.xlsx'
+    input_path = CAMINHO_BASE_UNIFICADA
+    output_path = CAMINHO_GEOCODIFICADA
+    exportar_excel = '--excel' in sys.argv[1:]  # Também grava docs/results_geocoded.xlsx
+    completo = '--completo' in sys.argv[1:]      # Regeocodifica todos os registros, ignorando o resultado anterior
     os.makedirs('docs', exist_ok=True)
     print(f"Carregando dados de: {input_path}")
     try:
-        df_original = pd.read_excel(input_path)
+        df_original = carrega_parquet(input_path)
         print(f"Linhas carregadas: {len(df_original)}")
     except FileNotFoundError:
         print(f"ERRO: '{input_path}' não encontrado.")
@@ -195,11 +203,16 @@ if __name__ == "__main__":
             print(f"AVISO: coluna '{col}' ausente. Criando vazia.")
             df_original[col] = pd.NA
 
-    df_geocoded = geocode_dataframe(df_original)
+    # Por padrão, só os registros novos ou alterados desde o último resultado são geocodificados
+    if not completo and os.path.exists(output_path):
+        df_geocoded, delta = geocode_incremental(df_original, carrega_parquet(output_path))
+        salva_relatorio_delta(delta)
+    else:
+        df_geocoded = geocode_dataframe(df_original)
 
     print(f"\nSalvando em: {output_path}")
     try:
-        df_geocoded.to_excel(output_path, index=False)
+        salva_parquet(df_geocoded, output_path, excel=exportar_excel)
         print("Salvo com sucesso!")
     except Exception as e:
         print(f"ERRO ao salvar '{output_path}': {e}")
@@ -0,0 +1,336 @@
+"""
+Geocodificação com vários provedores, cada um com o seu limite de requisições.
+
+As consultas são deduplicadas antes de qualquer acesso. Cada lugar distinto é procurado primeiro nos
+provedores locais (tabela de municípios), depois no cache persistente e, por fim, em um dos provedores
+remotos (Nominatim público, instâncias próprias do Nominatim ou o servidor stub de testes). Os remotos
+são consultados em paralelo, dentro do limite de cada um, e o tempo total passa a depender do número
+de lugares distintos, não do número de linhas.
+
+Configuração (.env):
+    NOMINATIM_URLS   URLs de instâncias próprias do Nominatim, separadas por vírgula (ex.: http://localhost:8080).
+                     Sem elas, é usado o Nominatim público (1 requisição por vez, até 50 por minuto).
+    NOMINATIM_RPM    Limite de requisições por minuto de cada instância própria (padrão 600)
+
+Uso:
+    python geocodificadores.py stub [porta]   # servidor stub (API do Nominatim) com a tabela de municípios
+"""
+import os
+import sys
+import json
+import time
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pool_chaves import BaldeTokens
+from cache_geocodificacao import Localizacao, cache_geocodificacao_padrao, consulta_municipio, normaliza_consulta
+
+URL_NOMINATIM_PUBLICO = 'https://nominatim.openstreetmap.org'
+USER_AGENT = "meu_aplicativo_consultoria_v2"
+
+# Limites por provedor (a política do Nominatim público é de no máximo 1 requisição por segundo)
+LIMITE_RPM_NOMINATIM_PUBLICO = 50
+LIMITE_RPM_NOMINATIM_PROPRIO = int(os.getenv('NOMINATIM_RPM', 600))
+CONCORRENCIA_POR_PROVEDOR = 4
+
+# Tentativas por consulta (erros de rede, limite de requisições). Após um erro, o provedor fica
+# bloqueado por ESPERA_APOS_ERRO segundos, dobrando a cada erro seguido (até ESPERA_MAXIMA)
+TENTATIVAS = 3
+ESPERA_APOS_ERRO = 2.0
+ESPERA_MAXIMA = 120.0
+
+class Provedor:
+    """
+    Provedor de geocodificação. Os locais (sem acesso à rede) são consultados antes do cache e não têm
+    limite; os remotos têm limite de requisições por minuto (`rpm`) e de requisições simultâneas.
+    """
+    local = False
+
+    def __init__(self, nome, rpm=None, concorrencia=CONCORRENCIA_POR_PROVEDOR):
+        self.nome = nome
+        self.rpm = rpm
+        self.concorrencia = concorrencia
+        # Capacidade 1: as requisições ficam espaçadas uniformemente, sem rajadas
+        self.balde = BaldeTokens(1, rpm) if rpm else None
+        self.em_andamento = 0
+        self.bloqueado_ate = 0.0
+        self.erros_seguidos = 0
+        self.requisicoes = 0
+        self.encontrados = 0
+        self.erros = 0
+
+    def busca(self, consulta):
+        """
+        Retorna a localização da consulta (com os atributos latitude, longitude e address) ou None se o lugar
+        não for encontrado. Erros (rede, limite de requisições) devem ser propagados.
+        """
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.nome!r})"
+
+class ProvedorNominatim(Provedor):
+    """
+    API /search do Nominatim: o público, uma instância própria ou o ServidorStub.
+    """
+    def __init__(self, url=URL_NOMINATIM_PUBLICO, rpm=LIMITE_RPM_NOMINATIM_PROPRIO, concorrencia=CONCORRENCIA_POR_PROVEDOR,
+                 user_agent=USER_AGENT, timeout=15, nome=None):
+        from geopy.geocoders import Nominatim
+        partes = urllib.parse.urlsplit(url)
+        nome = nome or ('nominatim' if url == URL_NOMINATIM_PUBLICO else f"nominatim:{partes.netloc}")
+        super().__init__(nome, rpm, concorrencia)
+        self.url = url
+        self._geolocator = Nominatim(user_agent=user_agent, domain=partes.netloc + partes.path.rstrip('/'),
+                                     scheme=partes.scheme or 'https', timeout=timeout)
+
+    def busca(self, consulta):
+        return self._geolocator.geocode(consulta)
+
+class ProvedorGazetteer(Provedor):
+    """
+    Tabela local de municípios (gazetteer.py) para consultas "município, UF, Brasil".
+    """
+    local = True
+
+    def __init__(self, gazetteer=None):
+        super().__init__('gazetteer')
+        if gazetteer is None:
+            from gazetteer import Gazetteer
+            gazetteer = Gazetteer()
+        self.gazetteer = gazetteer
+
+    def busca(self, consulta):
+        # Só consultas no formato de consulta_municipio; as demais (ex.: regiões do IOPC) ficam para os remotos
+        partes = [parte.strip() for parte in str(consulta).split(',')]
+        if len(partes) != 3 or partes[2].lower() != 'brasil':
+            return None
+        return self.gazetteer.localiza(partes[0], partes[1])
+
+class GeocodificadorMultiplo:
+    """
+    Distribui as consultas distintas entre os provedores remotos, em paralelo, respeitando o limite de cada um.
+    O provedor escolhido é o que pode ser usado mais cedo; se ele falhar, a consulta é repetida em outro
+    e o provedor com erro fica bloqueado por algum tempo (backoff exponencial por provedor).
+    Os resultados dos remotos são guardados no cache persistente (cache_geocodificacao.py).
+    """
+    def __init__(self, provedores, cache=None, tentativas=TENTATIVAS):
+        self.locais = [provedor for provedor in provedores if provedor.local]
+        self.remotos = [provedor for provedor in provedores if not provedor.local]
+        self.cache = cache if cache is not None else cache_geocodificacao_padrao()
+        self.tentativas = tentativas
+        self._lock = threading.Lock()
+
+    def _tenta_reservar(self, excluidos):
+        """
+        Reserva um provedor remoto se houver algum disponível agora.
+        Retorna (provedor, 0) ou (None, espera) com o menor tempo de espera entre os provedores.
+        """
+        with self._lock:
+            agora = time.monotonic()
+            candidatos = [provedor for provedor in self.remotos if provedor not in excluidos] or self.remotos
+            melhor, melhor_ordem = None, None
+            for provedor in candidatos:
+                espera = max(provedor.bloqueado_ate - agora, provedor.balde.espera(1, agora) if provedor.balde else 0.0)
+                if provedor.em_andamento >= provedor.concorrencia:
+                    espera = max(espera, 0.05)
+                ordem = (espera, provedor.em_andamento)
+                if melhor_ordem is None or ordem < melhor_ordem:
+                    melhor, melhor_ordem = provedor, ordem
+            if melhor_ordem[0] > 0:
+                return None, melhor_ordem[0]
+            if melhor.balde:
+                melhor.balde.consome(1)
+            melhor.em_andamento += 1
+            melhor.requisicoes += 1
+            return melhor, 0.0
+
+    def _reserva(self, excluidos=()):
+        while True:
+            provedor, espera = self._tenta_reservar(excluidos)
+            if provedor is not None:
+                return provedor
+            time.sleep(espera)
+
+    def _libera(self, provedor, encontrado=False, erro=False):
+        with self._lock:
+            provedor.em_andamento -= 1
+            provedor.encontrados += int(encontrado)
+            if erro:
+                provedor.erros += 1
+                provedor.erros_seguidos += 1
+                espera = min(ESPERA_MAXIMA, ESPERA_APOS_ERRO * 2 ** (provedor.erros_seguidos - 1))
+                provedor.bloqueado_ate = max(provedor.bloqueado_ate, time.monotonic() + espera)
+            else:
+                provedor.erros_seguidos = 0
+
+    def _busca_remota(self, consulta):
+        # Retorna a localização (ou None, guardando o "não encontrado" no cache). Se todas as tentativas
+        # falharem, retorna None sem guardar nada: a consulta será refeita na próxima execução
+        falharam = set()
+        for _ in range(self.tentativas):
+            provedor = self._reserva(falharam)
+            try:
+                localizacao = provedor.busca(consulta)
+            except Exception as e:
+                self._libera(provedor, erro=True)
+                print(f"    Erro no provedor {provedor.nome} para '{consulta}': {e}")
+                falharam.add(provedor)
+                continue
+            if localizacao is not None:
+                localizacao = Localizacao(localizacao.latitude, localizacao.longitude, getattr(localizacao, 'address', '') or '')
+            self._libera(provedor, encontrado=localizacao is not None)
+            self.cache.salva(consulta, localizacao, fonte=provedor.nome)
+            return localizacao
+        return None
+
+    def _busca_local(self, consulta):
+        for provedor in self.locais:
+            provedor.requisicoes += 1
+            localizacao = provedor.busca(consulta)
+            if localizacao is not None:
+                provedor.encontrados += 1
+                return localizacao
+        return None
+
+    def geocodifica_varias(self, consultas):
+        """
+        Geocodifica as consultas (pode haver repetições) e retorna {consulta: Localizacao ou None}.
+        Cada lugar distinto (ver normaliza_consulta: sem diferenciar acentos, maiúsculas e espaços) é procurado
+        uma única vez.
+        """
+        consultas = list(consultas)
+        distintas = {}
+        for consulta in consultas:
+            distintas.setdefault(normaliza_consulta(consulta), consulta)
+
+        resultados, pendentes = {}, []
+        for chave, consulta in distintas.items():
+            localizacao = self._busca_local(consulta)
+            if localizacao is None:
+                em_cache, localizacao = self.cache.obtem(consulta)
+                if not em_cache:
+                    pendentes.append(chave)
+                    continue
+            resultados[chave] = localizacao
+
+        if pendentes and self.remotos:
+            print(f"  Geocodificando {len(pendentes)} lugares em {len(self.remotos)} provedor(es): "
+                  f"{', '.join(provedor.nome for provedor in self.remotos)}")
+            trabalhadores = min(len(pendentes), sum(provedor.concorrencia for provedor in self.remotos))
+            with ThreadPoolExecutor(max_workers=trabalhadores) as executor:
+                buscas = executor.map(lambda chave: self._busca_remota(distintas[chave]), pendentes)
+                resultados.update(zip(pendentes, buscas))
+        return {consulta: resultados.get(normaliza_consulta(consulta)) for consulta in consultas}
+
+    def estatisticas(self):
+        return {
+            provedor.nome: {'requisicoes': provedor.requisicoes, 'encontrados': provedor.encontrados, 'erros': provedor.erros}
+            for provedor in self.locais + self.remotos
+        }
+
+def provedores_configurados(user_agent=USER_AGENT):
+    """
+    Tabela local de municípios (se existir) e as instâncias do Nominatim de NOMINATIM_URLS
+    ou, se não houver nenhuma, o Nominatim público.
+    """
+    from gazetteer import gazetteer_padrao
+    provedores = []
+    gazetteer = gazetteer_padrao()
+    if gazetteer is not None:
+        provedores.append(ProvedorGazetteer(gazetteer))
+    urls = [url.strip() for url in os.getenv('NOMINATIM_URLS', '').split(',') if url.strip()]
+    if urls:
+        provedores.extend(ProvedorNominatim(url, user_agent=user_agent) for url in urls)
+    else:
+        provedores.append(ProvedorNominatim(URL_NOMINATIM_PUBLICO, rpm=LIMITE_RPM_NOMINATIM_PUBLICO, concorrencia=1, user_agent=user_agent))
+    return provedores
+
+# Geocodificador compartilhado por padrão
+_geocodificador_padrao = None
+_lock_geocodificador_padrao = threading.Lock()
+
+def geocodificador_padrao():
+    """
+    Retorna o geocodificador compartilhado (provedores_configurados + cache compartilhado), criado na primeira chamada.
+    """
+    global _geocodificador_padrao
+    with _lock_geocodificador_padrao:
+        if _geocodificador_padrao is None:
+            _geocodificador_padrao = GeocodificadorMultiplo(provedores_configurados())
+        return _geocodificador_padrao
+
+class ServidorStub:
+    """
+    Servidor HTTP local que responde como a API /search do Nominatim, a partir de {consulta: (latitude, longitude)}.
+    Usado em testes e benchmarks, sem acessar a rede; `latencia` (segundos) simula o tempo de resposta.
+    Ex.: with ServidorStub(lugares) as stub: ProvedorNominatim(stub.url, rpm=6000)
+    """
+    def __init__(self, lugares, porta=0, latencia=0.0):
+        self.lugares = {normaliza_consulta(consulta): coordenadas for consulta, coordenadas in lugares.items()}
+        self.latencia = latencia
+        self.requisicoes = 0
+        servidor = self
+
+        class Tratador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parametros = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+                consulta = parametros.get('q', [''])[0]
+                servidor.requisicoes += 1
+                if servidor.latencia:
+                    time.sleep(servidor.latencia)
+                coordenadas = servidor.lugares.get(normaliza_consulta(consulta))
+                resposta = [] if coordenadas is None else [
+                    {'lat': str(coordenadas[0]), 'lon': str(coordenadas[1]), 'display_name': consulta}
+                ]
+                corpo = json.dumps(resposta).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def log_message(self, *args):
+                pass
+
+        self._http = ThreadingHTTPServer(('127.0.0.1', porta), Tratador)
+        self._http.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._http.server_address[1]}"
+        self._thread = None
+
+    def inicia(self):
+        self._thread = threading.Thread(target=self._http.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def para(self):
+        self._http.shutdown()
+        self._http.server_close()
+
+    def __enter__(self):
+        return self.inicia()
+
+    def __exit__(self, *args):
+        self.para()
+
+def lugares_da_tabela():
+    """
+    {consulta: (latitude, longitude)} de todos os municípios da tabela local (dados do ServidorStub).
+    """
+    import pandas as pd
+    from gazetteer import CAMINHO_MUNICIPIOS
+    tabela = pd.read_csv(CAMINHO_MUNICIPIOS, dtype={'uf': str, 'municipio': str})
+    return {consulta_municipio(municipio, uf): (latitude, longitude)
+            for uf, municipio, latitude, longitude in tabela[['uf', 'municipio', 'latitude', 'longitude']].itertuples(index=False)}
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['stub']:
+        porta = int(sys.argv[2]) if len(sys.argv) > 2 else 8080
+        stub = ServidorStub(lugares_da_tabela(), porta=porta)
+        print(f"Servidor stub do Nominatim em {stub.url} (NOMINATIM_URLS={stub.url})")
+        try:
+            stub._http.serve_forever()
+        except KeyboardInterrupt:
+            stub.para()
+    else:
+        print(__doc__)
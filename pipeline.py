@@ -0,0 +1,453 @@
+"""
+Pipeline completo de coleta e tratamento dos dados, executado como um DAG de etapas com checkpoints.
+
+Cada etapa salva sua saída em PASTA_CHECKPOINTS e registra no manifesto o hash das suas entradas
+(arquivos de entrada, saídas das etapas anteriores e versão da etapa). Em uma nova execução,
+as etapas cujas entradas não mudaram são puladas. As etapas que chamam o Gemini (triagem e extração)
+gravam o resultado de cada processo no banco à medida que avançam, então uma execução interrompida
+retoma do ponto em que parou.
+
+Uso:
+    python pipeline.py                         # executa todas as etapas necessárias
+    python pipeline.py --ate generalizacao     # executa até a etapa indicada (e suas dependências)
+    python pipeline.py --forcar triagem        # reexecuta a etapa mesmo que as entradas não tenham mudado
+    python pipeline.py --lista                 # mostra as etapas e seu estado
+"""
+import os
+import json
+import time
+import hashlib
+import argparse
+import pandas as pd
+from dados import CAMINHO_EXTRACAO, CAMINHO_BASE_UNIFICADA, CAMINHO_GEOCODIFICADA, salva_parquet
+
+# Pasta dos checkpoints e do manifesto
+PASTA_CHECKPOINTS = 'cache/pipeline'
+CAMINHO_MANIFESTO = os.path.join(PASTA_CHECKPOINTS, 'manifesto.json')
+
+# Arquivos de entrada
+CAMINHO_JUSBRASIL = 'docs/jusbrasil/jusbrasil.xlsx'
+CAMINHO_IOPC = 'docs/iopc/iopc_tables_final.xlsx'
+CAMINHO_JUSCRAPER = 'docs/juscraper/respostas_danos_ambientais_juscraper.xlsx'
+
+# Ordem final das colunas da base unificada
+COLUNAS_BASE_UNIFICADA = [
+    'fonte_dados', 'numero_processo', 'processoID', 'processoAnexoID', 'georreferencia',
+    'pais', 'uf', 'municipio', 'regiao', 'responsavel', 'categoria_responsavel',
+    'tipo_impacto_geral', 'tipo_impacto', 'descricao_impacto', 'data_impacto',
+    'area_afetada', 'unidade_area', 'houve_compensacao', 'categoria_compensacao',
+    'tipo_multa', 'valor_multa', 'valor_multa_diaria', 'moeda', 'link_referencia', 'referencia'
+]
+
+# --- Definição das etapas ---
+
+class Etapa:
+    def __init__(self, nome, funcao, dependencias=(), arquivos=(), versao=1, exporta=None):
+        self.nome = nome
+        self.funcao = funcao
+        self.dependencias = tuple(dependencias)
+        self.arquivos = tuple(arquivos)   # Arquivos de entrada lidos pela etapa
+        self.versao = versao              # Incrementar quando a lógica da etapa mudar
+        self.exporta = exporta            # Arquivo Parquet publicado com a saída da etapa (opcional)
+
+ETAPAS = {}
+
+def etapa(nome, dependencias=(), arquivos=(), versao=1, exporta=None):
+    """
+    Decorador que registra uma função como etapa do pipeline.
+    A função recebe um dicionário {dependência: DataFrame} e as opções da execução, e retorna um DataFrame.
+    """
+    def decorador(funcao):
+        ETAPAS[nome] = Etapa(nome, funcao, dependencias, arquivos, versao, exporta)
+        return funcao
+    return decorador
+
+@etapa('sentencas', arquivos=[CAMINHO_JUSBRASIL])
+def etapa_sentencas(entradas, opcoes):
+    # Seleciona os anexos do tipo sentença da planilha do JusBrasil
+    anexos = pd.read_excel(CAMINHO_JUSBRASIL, sheet_name="Anexos")
+    return anexos.loc[anexos["Tipo de anexo"].isin(["SENTENCA"]),
+                      ["processoID", "processoAnexoID", "Download copia", "Publicado em"]].reset_index(drop=True)
+
+@etapa('acesso_negado', dependencias=['sentencas'])
+def etapa_acesso_negado(entradas, opcoes):
+    # Remove as sentenças cujo link retorna a página de "Acesso negado"
+    from downloads import identifica_acesso_negado
+    sentencas = entradas['sentencas']
+    df_html_only = sentencas[sentencas['Download copia'].str.contains(r'\.html?$', case=False, na=False)]
+    acessos_negados = identifica_acesso_negado(df_html_only)
+    return sentencas[~sentencas["processoAnexoID"].isin(acessos_negados["processoAnexoID"])].reset_index(drop=True)
+
+@etapa('deduplicacao', dependencias=['acesso_negado'])
+def etapa_deduplicacao(entradas, opcoes):
+    # Mantém uma sentença por processo: a publicada primeiro (em caso de empate, a de menor processoAnexoID)
+    sentencas = entradas['acesso_negado']
+    return (sentencas.sort_values(["Publicado em", "processoAnexoID"], kind='stable')
+                     .drop_duplicates(subset="processoID", keep="first")
+                     .sort_index()
+                     .reset_index(drop=True))
+
+def _lotes(df, tamanho):
+    for inicio in range(0, len(df), tamanho):
+        yield df.iloc[inicio:inicio + tamanho]
+
+def _baixa_e_extrai(links):
+    from downloads import downloader_padrao
+    from extracao_texto import extrai_textos
+    documentos = downloader_padrao().baixa_varios(links, mostrar_progresso=False)
+    return list(extrai_textos(documentos))
+
+def tria_lote(lote, opcoes):
+    """
+    Classifica um lote de sentenças (linhas da etapa de deduplicação) e grava o resultado no banco.
+    Retorna os processoID classificados; erros de requisição e documentos sem texto não são gravados
+    e ficam pendentes para a próxima tentativa.
+    """
+    from functions import ERRO_CLASSIFICACAO, verifica_dano_ambiental_em_lote
+    from prefiltro import triagem_dano_ambiental
+    from banco_gemini import ProgressoEtapa
+
+    textos = _baixa_e_extrai(lote['Download copia'].tolist())
+    if opcoes['prefiltro']:
+        respostas = triagem_dano_ambiental(textos, mostrar_progresso=False)
+    else:
+        respostas = verifica_dano_ambiental_em_lote(textos, mostrar_progresso=False)
+    resultados = {}
+    for (_, linha), texto, resposta in zip(lote.iterrows(), textos, respostas):
+        dados = json.loads(resposta.text)
+        if dados["justificativa"] == ERRO_CLASSIFICACAO or not texto.strip():
+            continue
+        dados["processoAnexoID"] = linha['processoAnexoID']
+        dados["link_referencia"] = linha['Download copia']
+        resultados[str(linha['processoID'])] = dados
+    ProgressoEtapa('triagem').salva(resultados)
+    print(f"  Lote salvo: {len(resultados)}/{len(lote)} sentenças classificadas")
+    return list(resultados)
+
+def extrai_lote(lote, opcoes):
+    """
+    Extrai as informações de um lote de sentenças com dano ambiental e grava cada processo no banco,
+    junto com a contagem de tokens da redução de cada texto (ver reducao_texto.estatisticas_reducao).
+    Retorna os processoID gravados.
+    """
+    from functions import ERRO_CLASSIFICACAO, classifica_em_lote
+    from reducao_texto import ETAPA_REDUCAO, reduz_texto, registro_reducao
+    from banco_gemini import ProgressoEtapa, inserir_varios_processos_sqlite, limpar_resposta_json_gemini
+
+    textos = _baixa_e_extrai(lote['link_referencia'].tolist())
+    reducoes = [reduz_texto(texto, opcoes['orcamento_tokens']) for texto in textos]
+    textos_reduzidos = [reducao['texto'] for reducao in reducoes]
+    respostas = classifica_em_lote(textos_reduzidos, tarefa='analisa_sentenca', concorrencia=opcoes['concorrencia'], mostrar_progresso=False)
+    salvos, reducoes_salvas = [], {}
+    for (_, linha), texto, reducao, resposta in zip(lote.iterrows(), textos, reducoes, respostas):
+        dados_da_api = json.loads(limpar_resposta_json_gemini(resposta.text))
+        if not texto.strip() or dados_da_api.get("numero_processo") == ERRO_CLASSIFICACAO:
+            continue
+        dados_completos_processo = {"processoID": str(linha['processoID'])}
+        dados_completos_processo.update(dados_da_api)
+        dados_completos_processo["processoAnexoID"] = linha['processoAnexoID']
+        dados_completos_processo["link_referencia"] = linha['link_referencia']
+        salvos.append(dados_completos_processo)
+        reducoes_salvas[str(linha['processoID'])] = registro_reducao(reducao)
+    inserir_varios_processos_sqlite(salvos)
+    ProgressoEtapa(ETAPA_REDUCAO).salva(reducoes_salvas)
+    print(f"  Lote salvo: {len(salvos)}/{len(lote)} processos analisados")
+    return [dados["processoID"] for dados in salvos]
+
+FUNCOES_LOTE = {'triagem': tria_lote, 'extracao': extrai_lote}
+
+def _processa_itens_fila(itens, nome_etapa, opcoes):
+    # Executado pelos workers da fila: remonta o lote a partir dos dados de cada item
+    lote = pd.DataFrame([dados for _, dados in itens])
+    return FUNCOES_LOTE[nome_etapa](lote, opcoes)
+
+def processa_pendentes(nome_etapa, pendentes, opcoes):
+    """
+    Processa as linhas pendentes de uma etapa em lotes. Com mais de um worker, as linhas vão para uma
+    fila de trabalho (fila_trabalho.FilaTrabalho) consumida em paralelo por vários processos.
+    """
+    if opcoes['workers'] <= 1:
+        for lote in _lotes(pendentes, opcoes['tamanho_lote']):
+            FUNCOES_LOTE[nome_etapa](lote, opcoes)
+        return
+
+    from fila_trabalho import FilaTrabalho, executa_workers
+    nome_fila = f"pipeline_{nome_etapa}"
+    fila = FilaTrabalho(nome_fila)
+    # O banco é quem diz o que falta processar: os pendentes entram na fila (ou voltam para ela, se já
+    # concluídos ou falhos em outra execução) sem apagar os itens que outros workers podem estar consumindo
+    registros = pendentes.astype(object).where(pendentes.notna(), None).to_dict('records')
+    fila.adiciona({str(registro['processoID']): registro for registro in registros})
+    fila.reabre([str(registro['processoID']) for registro in registros])
+    estado = executa_workers(nome_fila, _processa_itens_fila, opcoes['workers'], opcoes['tamanho_lote'], (nome_etapa, opcoes))
+    print(f"  Fila {nome_fila}: {estado}")
+
+@etapa('triagem', dependencias=['deduplicacao'])
+def etapa_triagem(entradas, opcoes):
+    # Verifica quais sentenças tratam de dano ambiental, gravando o resultado de cada lote no banco
+    from banco_gemini import ProgressoEtapa
+
+    sentencas = entradas['deduplicacao']
+    progresso = ProgressoEtapa('triagem')
+    pendentes = sentencas[~sentencas['processoID'].astype(str).isin(progresso.ids())]
+    print(f"  {len(sentencas) - len(pendentes)} sentenças já classificadas, {len(pendentes)} pendentes")
+    processa_pendentes('triagem', pendentes, opcoes)
+
+    classificados = progresso.carrega()
+    ids_sentencas = set(sentencas['processoID'].astype(str))
+    respostas_df = pd.DataFrame([
+        {"processoID": processo_id, **dados} for processo_id, dados in classificados.items()
+        if processo_id in ids_sentencas
+    ], columns=["processoID", "processoAnexoID", "isDanoAmbiental", "justificativa", "link_referencia"])
+    respostas_df.attrs['pendentes'] = len(ids_sentencas) - len(respostas_df)
+    return respostas_df
+
+@etapa('extracao', dependencias=['triagem'], exporta=CAMINHO_EXTRACAO)
+def etapa_extracao(entradas, opcoes):
+    # Extrai as informações das sentenças com dano ambiental e grava cada processo no banco
+    from banco_gemini import COLUNAS_DATAFRAME_FINAL, get_ids_processados_sqlite, carregar_processos_sqlite
+
+    triagem = entradas['triagem']
+    sentencas_danos_ambientais = triagem.loc[triagem["isDanoAmbiental"] == True]
+    ids_ja_processados_no_db = get_ids_processados_sqlite()
+    pendentes = sentencas_danos_ambientais[~sentencas_danos_ambientais['processoID'].astype(str).isin(ids_ja_processados_no_db)]
+    print(f"  {len(sentencas_danos_ambientais) - len(pendentes)} processos já analisados, {len(pendentes)} pendentes")
+    processa_pendentes('extracao', pendentes, opcoes)
+
+    processos = carregar_processos_sqlite()
+    ids_danos = set(sentencas_danos_ambientais['processoID'].astype(str))
+    processos = processos[processos['processoID'].astype(str).isin(ids_danos)]
+    processos = processos[COLUNAS_DATAFRAME_FINAL].reset_index(drop=True)
+    processos.attrs['pendentes'] = len(ids_danos - set(processos['processoID'].astype(str)))
+    return processos
+
+@etapa('iopc', arquivos=[CAMINHO_IOPC])
+def etapa_iopc(entradas, opcoes):
+    df_iopc = pd.read_excel(CAMINHO_IOPC)
+    df_iopc["fonte_dados"] = "IOPC"
+    df_iopc = df_iopc.rename(columns={"Date of Incident": "data_impacto",
+                                      "Currency": "moeda",
+                                      "Compensation": "valor_multa",
+                                      "Estimated quantity of oil spilled (tonnes)": "qtde_petroleo_derramada"})
+    # Split da coluna Place of Incident em região e país (o país vem depois da última vírgula)
+    partes = df_iopc['Place of Incident'].str.rsplit(',', n=1, expand=True)
+    if partes.shape[1] == 2:
+        df_iopc['regiao'] = partes[0].where(partes[1].notna()).str.strip()
+        df_iopc['pais'] = partes[1].fillna(partes[0]).str.strip()
+    else:
+        df_iopc['regiao'] = None
+        df_iopc['pais'] = df_iopc['Place of Incident']
+    df_iopc['tipo_impacto'] = "Derramamento de petróleo"
+    df_iopc['descricao_impacto'] = "Derramamento de petróleo"
+    return df_iopc[["fonte_dados", "pais", "regiao", "tipo_impacto", "descricao_impacto", "data_impacto", "qtde_petroleo_derramada", "valor_multa", "moeda"]]
+
+@etapa('juscraper', arquivos=[CAMINHO_JUSCRAPER])
+def etapa_juscraper(entradas, opcoes):
+    # Respostas da extração dos processos do juscraper (geradas pelo juscraper.ipynb)
+    df_juscraper = pd.read_excel(CAMINHO_JUSCRAPER)
+    df_juscraper["fonte_dados"] = "Juscraper"
+    df_juscraper['moeda'] = 'R$'
+    df_juscraper['pais'] = 'Brasil'
+    return df_juscraper
+
+@etapa('consolidacao', dependencias=['extracao', 'iopc', 'juscraper'])
+def etapa_consolidacao(entradas, opcoes):
+    # Junta JusBrasil, IOPC e juscraper em uma única base
+    jusbrasil = entradas['extracao'].copy()
+    jusbrasil['moeda'] = 'R$'
+    jusbrasil['fonte_dados'] = 'JusBrasil'
+    jusbrasil['pais'] = 'Brasil'
+    base = pd.concat([jusbrasil, entradas['iopc'], entradas['juscraper']], ignore_index=True)
+    colunas = [coluna for coluna in COLUNAS_BASE_UNIFICADA if coluna != 'tipo_impacto_geral']
+    base = base.reindex(columns=colunas)
+    return base.fillna('NULL')
+
+@etapa('generalizacao', dependencias=['consolidacao'], exporta=CAMINHO_BASE_UNIFICADA)
+def etapa_generalizacao(entradas, opcoes):
+    from functions import generaliza_tipos
+    base = entradas['consolidacao'].copy()
+    base["tipo_impacto_geral"] = generaliza_tipos(base["tipo_impacto"])
+    return base[COLUNAS_BASE_UNIFICADA]
+
+@etapa('geocodificacao', dependencias=['generalizacao'], exporta=CAMINHO_GEOCODIFICADA)
+def etapa_geocodificacao(entradas, opcoes):
+    from geocode_data import geocode_dataframe, geocode_incremental, salva_relatorio_delta
+    from banco_resultados import banco_padrao
+    from dados import ESQUEMA_BASE_UNIFICADA, aplica_esquema, carrega_parquet
+    # Com os tipos do esquema, os marcadores 'NULL' viram nulos de verdade antes da geocodificação
+    base = aplica_esquema(entradas['generalizacao'], ESQUEMA_BASE_UNIFICADA)
+    # Só os casos novos ou com localização alterada desde a última publicação são geocodificados
+    if not opcoes['geocodificacao_completa'] and os.path.exists(CAMINHO_GEOCODIFICADA):
+        df_geocoded, delta = geocode_incremental(base, carrega_parquet(CAMINHO_GEOCODIFICADA))
+        salva_relatorio_delta(delta)
+    else:
+        df_geocoded = geocode_dataframe(base)
+    # A base tipada é a fonte lida pelo dashboard; é regravada por inteiro a cada geocodificação
+    banco_padrao().substitui(df_geocoded)
+    return df_geocoded
+
+# --- Execução ---
+
+def ordem_execucao(alvos=None):
+    """
+    Ordem topológica das etapas necessárias para produzir os alvos (todas, se não informados).
+    """
+    ordem, visitadas = [], set()
+    def visita(nome, caminho=()):
+        if nome in caminho:
+            raise ValueError(f"Ciclo entre as etapas: {' -> '.join(caminho + (nome,))}")
+        if nome in visitadas:
+            return
+        for dependencia in ETAPAS[nome].dependencias:
+            visita(dependencia, caminho + (nome,))
+        visitadas.add(nome)
+        ordem.append(nome)
+    for nome in (alvos or ETAPAS):
+        visita(nome)
+    return ordem
+
+def hash_arquivo(caminho):
+    sha256 = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(1 << 20), b''):
+            sha256.update(bloco)
+    return sha256.hexdigest()
+
+def hash_dataframe(df):
+    valores = pd.util.hash_pandas_object(df.astype(str), index=False).values
+    return hashlib.sha256(valores.tobytes() + json.dumps(list(map(str, df.columns))).encode()).hexdigest()
+
+def caminho_checkpoint(nome):
+    return os.path.join(PASTA_CHECKPOINTS, f"{nome}.pkl")
+
+def salva_checkpoint(nome, df):
+    os.makedirs(PASTA_CHECKPOINTS, exist_ok=True)
+    temporario = caminho_checkpoint(nome) + '.tmp'
+    df.to_pickle(temporario)
+    os.replace(temporario, caminho_checkpoint(nome))
+
+def carrega_checkpoint(nome):
+    return pd.read_pickle(caminho_checkpoint(nome))
+
+def carrega_manifesto():
+    if os.path.exists(CAMINHO_MANIFESTO):
+        with open(CAMINHO_MANIFESTO, encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    return {}
+
+def salva_manifesto(manifesto):
+    os.makedirs(PASTA_CHECKPOINTS, exist_ok=True)
+    with open(CAMINHO_MANIFESTO, 'w', encoding='utf-8') as arquivo:
+        json.dump(manifesto, arquivo, indent=2, ensure_ascii=False)
+
+def hash_entradas(etapa_atual, hashes_saida):
+    conteudo = {
+        'etapa': etapa_atual.nome,
+        'versao': etapa_atual.versao,
+        'arquivos': {caminho: hash_arquivo(caminho) for caminho in etapa_atual.arquivos},
+        'dependencias': {dependencia: hashes_saida[dependencia] for dependencia in etapa_atual.dependencias},
+    }
+    return hashlib.sha256(json.dumps(conteudo, sort_keys=True).encode()).hexdigest()
+
+def executa_pipeline(alvos=None, forcar=(), opcoes=None):
+    """
+    Executa as etapas necessárias para produzir os alvos, pulando as que estão atualizadas.
+    Retorna o DataFrame de saída da última etapa executada.
+    """
+    opcoes = {**OPCOES_PADRAO, **(opcoes or {})}
+    manifesto = carrega_manifesto()
+    hashes_saida = {}
+    saidas = {}
+
+    def saida(nome):
+        # Carrega o checkpoint de uma etapa apenas quando alguma etapa seguinte precisa dele
+        if nome not in saidas:
+            saidas[nome] = carrega_checkpoint(nome)
+        return saidas[nome]
+
+    ultima = None
+    for nome in ordem_execucao(alvos):
+        etapa_atual = ETAPAS[nome]
+        entrada = hash_entradas(etapa_atual, hashes_saida)
+        registro = manifesto.get(nome, {})
+        if nome not in forcar and registro.get('hash_entradas') == entrada and os.path.exists(caminho_checkpoint(nome)):
+            print(f"[{nome}] entradas inalteradas, usando checkpoint")
+            hashes_saida[nome] = registro['hash_saida']
+            ultima = nome
+            continue
+
+        print(f"[{nome}] executando...")
+        inicio = time.time()
+        df = etapa_atual.funcao({dependencia: saida(dependencia) for dependencia in etapa_atual.dependencias}, opcoes)
+        # Itens que a etapa não conseguiu processar (erro na requisição, documento sem texto etc.)
+        pendentes = df.attrs.pop('pendentes', 0)
+        salva_checkpoint(nome, df)
+        if etapa_atual.exporta:
+            salva_parquet(df, etapa_atual.exporta, excel=opcoes['excel'])
+        saidas[nome] = df
+        hashes_saida[nome] = hash_dataframe(df)
+        manifesto[nome] = {
+            # Com itens pendentes, as entradas não são registradas: a próxima execução retoma a etapa
+            # (só os pendentes são processados de novo) mesmo que nada tenha mudado
+            'hash_entradas': entrada if not pendentes else None,
+            'hash_saida': hashes_saida[nome],
+            'pendentes': pendentes,
+            'linhas': len(df),
+            'executado_em': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'duracao_s': round(time.time() - inicio, 2),
+        }
+        salva_manifesto(manifesto)
+        print(f"[{nome}] concluída: {len(df)} linhas em {manifesto[nome]['duracao_s']}s"
+              + (f" ({pendentes} itens pendentes, retomados na próxima execução)" if pendentes else ""))
+        ultima = nome
+
+    return saida(ultima) if ultima else None
+
+def lista_etapas():
+    manifesto = carrega_manifesto()
+    for nome in ordem_execucao():
+        etapa_atual = ETAPAS[nome]
+        registro = manifesto.get(nome)
+        estado = f"{registro['linhas']} linhas, executada em {registro['executado_em']}" if registro else "nunca executada"
+        if registro and registro.get('pendentes'):
+            estado += f", {registro['pendentes']} pendentes"
+        dependencias = ', '.join(etapa_atual.dependencias) or '-'
+        print(f"{nome:15} depende de: {dependencias:35} {estado}")
+
+# Opções padrão das etapas
+OPCOES_PADRAO = {
+    'tamanho_lote': 50,         # Processos gravados no banco por vez
+    'concorrencia': 8,          # Requisições simultâneas ao Gemini
+    'orcamento_tokens': 6000,   # Tamanho máximo do trecho da sentença enviado ao analisa_sentenca
+    'prefiltro': True,          # Usa o pré-filtro local antes do Gemini na triagem
+    'workers': 1,               # Processos consumindo a fila de trabalho na triagem e na extração
+    'excel': False,             # Exporta também uma planilha .xlsx ao lado de cada arquivo Parquet publicado
+    'geocodificacao_completa': False,  # Regeocodifica todos os casos em vez de só os novos/alterados
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Executa o pipeline de dados de danos ambientais.")
+    parser.add_argument('--ate', nargs='*', choices=list(ETAPAS), help="Etapas alvo (padrão: todas)")
+    parser.add_argument('--forcar', nargs='*', default=[], choices=list(ETAPAS), help="Etapas a reexecutar mesmo sem mudanças")
+    parser.add_argument('--lista', action='store_true', help="Lista as etapas e seu estado")
+    parser.add_argument('--tamanho-lote', type=int, default=OPCOES_PADRAO['tamanho_lote'])
+    parser.add_argument('--concorrencia', type=int, default=OPCOES_PADRAO['concorrencia'])
+    parser.add_argument('--orcamento-tokens', type=int, default=OPCOES_PADRAO['orcamento_tokens'])
+    parser.add_argument('--workers', type=int, default=OPCOES_PADRAO['workers'], help="Processos paralelos na triagem e na extração")
+    parser.add_argument('--excel', action='store_true', help="Exporta também as saídas em Excel")
+    parser.add_argument('--sem-prefiltro', action='store_true', help="Envia todas as sentenças ao Gemini na triagem")
+    parser.add_argument('--geocodificacao-completa', action='store_true', help="Regeocodifica todos os casos, ignorando o resultado anterior")
+    args = parser.parse_args()
+
+    if args.lista:
+        lista_etapas()
+    else:
+        executa_pipeline(args.ate, set(args.forcar), {
+            'tamanho_lote': args.tamanho_lote,
+            'concorrencia': args.concorrencia,
+            'orcamento_tokens': args.orcamento_tokens,
+            'prefiltro': not args.sem_prefiltro,
+            'workers': args.workers,
+            'excel': args.excel,
+            'geocodificacao_completa': args.geocodificacao_completa,
+        })
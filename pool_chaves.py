@@ -0,0 +1,258 @@
+import os
+import time
+import random
+import sqlite3
+import asyncio
+import threading
+from contextlib import contextmanager
+
+# --- Configuração única das chaves do Gemini ---
+# Nomes das variáveis de ambiente (arquivo .env) que contêm as chaves de API
+CHAVES_GEMINI = ['GEMINI_API_KEY', 'GEMINI_API_KEY_2', 'GEMINI_API_KEY_3', 'GEMINI_API_KEY_4', 'GEMINI_API_KEY_5']
+
+# Limites de uso por chave (plano gratuito do gemini-2.0-flash). Podem ser ajustados pelo .env
+LIMITE_RPM = int(os.getenv('GEMINI_LIMITE_RPM', 15))         # Requisições por minuto
+LIMITE_TPM = int(os.getenv('GEMINI_LIMITE_TPM', 1_000_000))  # Tokens por minuto
+
+# Espera máxima (em segundos) aplicada a uma chave após erros 429 consecutivos
+ESPERA_MAXIMA = 120.0
+
+# Banco (SQLite) onde o pool padrão guarda os baldes de cada chave, para que todos os processos da máquina
+# (ex.: os workers da fila de trabalho) dividam os mesmos limites. Vazio: cada processo tem seus próprios limites.
+CAMINHO_COTAS = os.getenv('GEMINI_COTAS', 'cache/cotas_gemini.db') or None
+
+def chaves_configuradas(chaves=CHAVES_GEMINI):
+    """
+    Retorna apenas as chaves que estão definidas no ambiente.
+    Se nenhuma estiver definida, retorna a lista completa (as requisições falharão e cairão no fallback).
+    """
+    definidas = [chave for chave in chaves if os.getenv(chave)]
+    return definidas if definidas else list(chaves)
+
+class BaldeTokens:
+    """
+    Token bucket simples: enche continuamente a uma taxa fixa por segundo até a capacidade.
+    """
+    def __init__(self, capacidade, por_minuto, agora=None):
+        self.capacidade = float(capacidade)
+        self.taxa = por_minuto / 60.0
+        self.tokens = float(capacidade)
+        self.ultimo = time.monotonic() if agora is None else agora
+
+    def _reabastece(self, agora):
+        self.tokens = min(self.capacidade, self.tokens + (agora - self.ultimo) * self.taxa)
+        self.ultimo = agora
+
+    def espera(self, quantidade, agora):
+        # Tempo (em segundos) até haver tokens suficientes para consumir `quantidade`
+        self._reabastece(agora)
+        quantidade = min(quantidade, self.capacidade)
+        if self.tokens >= quantidade:
+            return 0.0
+        return (quantidade - self.tokens) / self.taxa
+
+    def consome(self, quantidade):
+        # Pode ficar negativo quando o consumo real supera a estimativa (a dívida é paga pelo reabastecimento)
+        self.tokens -= quantidade
+
+    def usados(self, agora):
+        self._reabastece(agora)
+        return self.capacidade - self.tokens
+
+class EstadoChave:
+    def __init__(self, nome, rpm, tpm, agora=None):
+        self.nome = nome
+        self.balde_rpm = BaldeTokens(rpm, rpm, agora)
+        self.balde_tpm = BaldeTokens(tpm, tpm, agora)
+        self.bloqueada_ate = 0.0
+        self.falhas_consecutivas = 0
+        self.em_andamento = 0
+        self.total_requisicoes = 0
+        self.total_tokens = 0
+        self.total_429 = 0
+
+class PoolChaves:
+    """
+    Distribui as requisições entre as chaves respeitando os limites de requisições e tokens por minuto de cada uma.
+    A chave escolhida é a que pode ser usada mais cedo; em caso de empate, a com menos requisições em andamento.
+    Em caso de erro 429, apenas a chave que recebeu o erro fica bloqueada (backoff exponencial por chave).
+    Pode ser compartilhado entre threads e tarefas asyncio. Com `caminho_cotas`, os baldes e bloqueios de cada
+    chave ficam nesse banco SQLite e são divididos por todos os processos que usam o mesmo arquivo.
+    """
+    def __init__(self, chaves=None, rpm=LIMITE_RPM, tpm=LIMITE_TPM, caminho_cotas=None):
+        chaves = chaves_configuradas() if chaves is None else chaves
+        self.chaves = list(chaves)
+        self.caminho_cotas = caminho_cotas
+        # Entre processos, o relógio precisa ser o mesmo para todos: usa o horário do sistema
+        self._relogio = time.time if caminho_cotas else time.monotonic
+        agora = self._relogio()
+        self._estados = {chave: EstadoChave(chave, rpm, tpm, agora) for chave in self.chaves}
+        self._lock = threading.Lock()
+        self._proxima = 0 # Posição do rodízio, usada para desempate
+        if caminho_cotas:
+            if os.path.dirname(caminho_cotas):
+                os.makedirs(os.path.dirname(caminho_cotas), exist_ok=True)
+            with self._estado_compartilhado():
+                pass
+
+    @contextmanager
+    def _estado_compartilhado(self):
+        """
+        Com `caminho_cotas`, carrega o estado compartilhado das chaves, executa o bloco e grava o estado de volta,
+        tudo em uma única transação (BEGIN IMMEDIATE: um processo por vez). Sem ele, apenas executa o bloco.
+        Chamar com self._lock adquirido.
+        """
+        if not self.caminho_cotas:
+            yield
+            return
+        conn = sqlite3.connect(self.caminho_cotas, timeout=60, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cotas (
+                    chave TEXT PRIMARY KEY,
+                    tokens_rpm REAL NOT NULL,
+                    ultimo_rpm REAL NOT NULL,
+                    tokens_tpm REAL NOT NULL,
+                    ultimo_tpm REAL NOT NULL,
+                    bloqueada_ate REAL NOT NULL,
+                    falhas_consecutivas INTEGER NOT NULL
+                )
+            """)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                linhas = conn.execute("SELECT * FROM cotas").fetchall()
+                for chave, tokens_rpm, ultimo_rpm, tokens_tpm, ultimo_tpm, bloqueada_ate, falhas in linhas:
+                    estado = self._estados.get(chave)
+                    if estado is not None:
+                        estado.balde_rpm.tokens, estado.balde_rpm.ultimo = tokens_rpm, ultimo_rpm
+                        estado.balde_tpm.tokens, estado.balde_tpm.ultimo = tokens_tpm, ultimo_tpm
+                        estado.bloqueada_ate, estado.falhas_consecutivas = bloqueada_ate, falhas
+                yield
+                conn.executemany(
+                    "INSERT OR REPLACE INTO cotas VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(estado.nome, estado.balde_rpm.tokens, estado.balde_rpm.ultimo, estado.balde_tpm.tokens,
+                      estado.balde_tpm.ultimo, estado.bloqueada_ate, estado.falhas_consecutivas)
+                     for estado in self._estados.values()]
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    def _tenta_reservar(self, tokens):
+        """
+        Reserva uma chave se houver alguma disponível agora.
+        Retorna (chave, 0) em caso de sucesso ou (None, espera) com o menor tempo de espera entre as chaves.
+        """
+        with self._lock, self._estado_compartilhado():
+            agora = self._relogio()
+            n = len(self.chaves)
+            melhor, melhor_ordem = None, None
+            for deslocamento in range(n):
+                estado = self._estados[self.chaves[(self._proxima + deslocamento) % n]]
+                espera = max(
+                    estado.bloqueada_ate - agora,
+                    estado.balde_rpm.espera(1, agora),
+                    estado.balde_tpm.espera(tokens, agora),
+                    0.0
+                )
+                ordem = (espera, estado.em_andamento)
+                if melhor_ordem is None or ordem < melhor_ordem:
+                    melhor, melhor_ordem = estado, ordem
+            espera = melhor_ordem[0]
+            if espera > 0:
+                return None, espera
+            melhor.balde_rpm.consome(1)
+            melhor.balde_tpm.consome(tokens)
+            melhor.em_andamento += 1
+            melhor.total_requisicoes += 1
+            self._proxima = (self.chaves.index(melhor.nome) + 1) % n
+            return melhor.nome, 0.0
+
+    def adquire(self, tokens_estimados=0):
+        """
+        Retorna uma chave disponível, bloqueando a thread até que alguma possa ser usada.
+        Sempre chamar `libera` após a requisição.
+        """
+        while True:
+            chave, espera = self._tenta_reservar(tokens_estimados)
+            if chave is not None:
+                return chave
+            time.sleep(espera)
+
+    async def adquire_async(self, tokens_estimados=0):
+        """
+        Versão assíncrona de `adquire`: espera sem bloquear o event loop.
+        """
+        while True:
+            chave, espera = self._tenta_reservar(tokens_estimados)
+            if chave is not None:
+                return chave
+            await asyncio.sleep(espera)
+
+    def libera(self, chave, tokens_estimados=0, tokens_usados=None, sucesso=True):
+        """
+        Finaliza uma requisição feita com a chave.
+        Se o número real de tokens for conhecido, corrige a estimativa feita em `adquire`.
+        """
+        with self._lock, self._estado_compartilhado():
+            estado = self._estados[chave]
+            estado.em_andamento = max(0, estado.em_andamento - 1)
+            if tokens_usados is not None:
+                estado.balde_tpm.consome(tokens_usados - tokens_estimados)
+                estado.total_tokens += tokens_usados
+            else:
+                estado.total_tokens += tokens_estimados
+            if sucesso:
+                estado.falhas_consecutivas = 0
+
+    def reporta_limite(self, chave, espera=None):
+        """
+        Registra um erro 429 recebido com a chave e a bloqueia pelo tempo indicado pela API
+        ou, se não houver indicação, por um backoff exponencial com jitter.
+        """
+        with self._lock, self._estado_compartilhado():
+            estado = self._estados[chave]
+            estado.total_429 += 1
+            estado.falhas_consecutivas += 1
+            if espera is None:
+                espera = min(ESPERA_MAXIMA, 2.0 ** estado.falhas_consecutivas) * random.uniform(0.5, 1.0)
+            estado.bloqueada_ate = max(estado.bloqueada_ate, self._relogio() + espera)
+
+    def utilizacao(self):
+        """
+        Retorna a utilização atual de cada chave (percentuais dos limites por minuto, requisições em andamento,
+        tempo restante de bloqueio e totais acumulados). Os totais e as requisições em andamento são deste processo.
+        """
+        with self._lock, self._estado_compartilhado():
+            agora = self._relogio()
+            return {
+                chave: {
+                    'rpm_utilizado': round(100 * estado.balde_rpm.usados(agora) / estado.balde_rpm.capacidade, 1),
+                    'tpm_utilizado': round(100 * estado.balde_tpm.usados(agora) / estado.balde_tpm.capacidade, 1),
+                    'em_andamento': estado.em_andamento,
+                    'bloqueada_por_s': round(max(0.0, estado.bloqueada_ate - agora), 1),
+                    'total_requisicoes': estado.total_requisicoes,
+                    'total_tokens': estado.total_tokens,
+                    'total_429': estado.total_429,
+                }
+                for chave, estado in self._estados.items()
+            }
+
+# Pool compartilhado por padrão entre todas as funções de functions.py
+_pool_padrao = None
+_lock_pool_padrao = threading.Lock()
+
+def pool_padrao():
+    """
+    Retorna o pool compartilhado, criado na primeira chamada (depois que o .env já foi carregado).
+    Os limites de cada chave ficam em CAMINHO_COTAS e são divididos entre todos os processos da máquina.
+    """
+    global _pool_padrao
+    with _lock_pool_padrao:
+        if _pool_padrao is None:
+            _pool_padrao = PoolChaves(caminho_cotas=CAMINHO_COTAS)
+        return _pool_padrao
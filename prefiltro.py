@@ -0,0 +1,266 @@
+import os
+import re
+import pickle
+import argparse
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from functions import RespostaLocal, normaliza_texto, verifica_dano_ambiental, verifica_dano_ambiental_em_lote
+
+# Arquivo com os rótulos já produzidos pelo Gemini (texto da decisão + isDanoAmbiental)
+CAMINHO_ROTULOS = 'docs/juscraper/respostas_classificacao_juscraper.xlsx'
+# Onde o modelo treinado é salvo (gerado com `python prefiltro.py treina`)
+CAMINHO_MODELO = 'cache/prefiltro_modelo.pkl'
+# Versão do formato salvo; arquivos de outra versão são ignorados e o modelo deve ser treinado de novo
+VERSAO_MODELO = 1
+
+# Termos indicativos de dano ambiental e seus pesos (aplicados ao texto normalizado, sem acentos e minúsculo)
+TERMOS_POSITIVOS = {
+    r'desmat\w*': 2.0,
+    r'supressao (de )?(da )?vegetacao': 2.0,
+    r'\bapp\b|preservacao permanente': 2.0,
+    r'degradacao ambiental|dano ambiental|danos ambientais': 1.5,
+    r'\bprad\b|recuperacao (da |de )?area degradada': 2.0,
+    r'reflorest\w*|recomposicao florestal|replantio': 1.5,
+    r'poluicao|poluente\w*|contaminacao|contaminad\w*': 1.5,
+    r'queimada\w*|incendio florestal': 1.5,
+    r'derramamento|vazamento de oleo|oleo diesel': 1.5,
+    r'esgoto|efluente\w*|lancamento de residuos': 1.0,
+    r'residuos solidos|descarte irregular|lixao|aterro': 1.0,
+    r'nascente\w*|curso d.agua|manancia\w*|corrego|leito do rio': 1.0,
+    r'fauna|flora|especie\w* nativa\w*|mata atlantica|cerrado': 1.0,
+    r'cetesb|ibama|policia (militar )?ambiental|auto de infracao ambiental': 1.0,
+    r'9\.?605|crimes ambientais|6\.?938|politica nacional do meio ambiente': 1.5,
+    r'codigo florestal|12\.?651|4\.?771': 1.5,
+    r'licenca ambiental|licenciamento ambiental': 0.5,
+}
+
+# Termos que indicam que o processo trata de outro assunto, ou que foi encerrado sem análise do mérito
+TERMOS_NEGATIVOS = {
+    r'perturbacao do sossego|ruido\w*|barulho': 1.0,
+    r'direito do consumidor|codigo de defesa do consumidor|relacao de consumo': 1.5,
+    r'execucao fiscal|cumprimento de sentenca': 1.0,
+    r'homologo (a |o )?(desistencia|acordo)|extingo o processo|sem resolucao do merito': 1.0,
+    r'ilegitimidade passiva|ilegitimidade ativa|inepcia da inicial': 1.0,
+}
+
+_PADROES_POSITIVOS = [(re.compile(padrao), peso) for padrao, peso in TERMOS_POSITIVOS.items()]
+_PADROES_NEGATIVOS = [(re.compile(padrao), peso) for padrao, peso in TERMOS_NEGATIVOS.items()]
+
+def pontuacao_palavras(texto):
+    """
+    Pontuação de palavras-chave do texto: soma dos pesos dos termos positivos menos os negativos.
+    Cada termo conta no máximo 3 ocorrências, para que textos longos e repetitivos não dominem a escala.
+    """
+    texto = normaliza_texto(texto)
+    pontos = sum(peso * min(len(padrao.findall(texto)), 3) for padrao, peso in _PADROES_POSITIVOS)
+    pontos -= sum(peso * min(len(padrao.findall(texto)), 3) for padrao, peso in _PADROES_NEGATIVOS)
+    return pontos
+
+class PreFiltro:
+    """
+    Classificador local de primeira etapa, aplicado antes do Gemini.
+    Sem modelo treinado, usa apenas a pontuação de palavras-chave convertida em probabilidade (função logística);
+    com o modelo do scikit-learn (ver `treina`), usa a probabilidade prevista por ele.
+    Textos com probabilidade <= limiar_negativo ou >= limiar_positivo são decididos localmente;
+    os demais são considerados incertos e devem ser enviados ao Gemini.
+    """
+    def __init__(self, limiar_negativo=0.02, limiar_positivo=0.98, modelo=None):
+        self.limiar_negativo = limiar_negativo
+        self.limiar_positivo = limiar_positivo
+        self.modelo = modelo
+
+    def treina(self, textos, rotulos):
+        """
+        Treina um modelo TF-IDF + regressão logística (scikit-learn) sobre os textos rotulados.
+        """
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import make_pipeline
+
+        self.modelo = make_pipeline(
+            TfidfVectorizer(preprocessor=normaliza_texto, ngram_range=(1, 2), min_df=2, max_features=50_000, sublinear_tf=True),
+            LogisticRegression(max_iter=2000, C=20.0)
+        )
+        self.modelo.fit(list(textos), np.asarray(rotulos, dtype=bool))
+        return self
+
+    def probabilidades(self, textos):
+        """
+        Probabilidade estimada de cada texto descrever um dano ambiental.
+        """
+        textos = [str(texto) for texto in textos]
+        if self.modelo is not None:
+            return self.modelo.predict_proba(textos)[:, 1]
+        pontos = np.array([pontuacao_palavras(texto) for texto in textos])
+        return 1 / (1 + np.exp(-(pontos - 3.0) / 1.5))
+
+    def decisoes(self, textos, probabilidades=None):
+        """
+        Retorna, para cada texto, True (dano ambiental), False (sem dano) ou None (incerto: enviar ao Gemini).
+        """
+        if probabilidades is None:
+            probabilidades = self.probabilidades(textos)
+        return [
+            True if p >= self.limiar_positivo else False if p <= self.limiar_negativo else None
+            for p in probabilidades
+        ]
+
+    def salva(self, caminho=CAMINHO_MODELO):
+        """
+        Salva apenas o estimador treinado do scikit-learn, com a versão do formato e os limiares.
+        """
+        if self.modelo is None:
+            raise ValueError("O pré-filtro não tem modelo treinado para salvar; use `treina` antes.")
+        if os.path.dirname(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with open(caminho, 'wb') as arquivo:
+            pickle.dump({
+                'versao': VERSAO_MODELO,
+                'limiar_negativo': self.limiar_negativo,
+                'limiar_positivo': self.limiar_positivo,
+                'modelo': self.modelo,
+            }, arquivo)
+
+    @staticmethod
+    def carrega(caminho=CAMINHO_MODELO):
+        """
+        Carrega um pré-filtro salvo com `salva`. Gera ValueError se o arquivo for de outra versão do formato.
+        """
+        with open(caminho, 'rb') as arquivo:
+            dados = pickle.load(arquivo)
+        if not isinstance(dados, dict) or dados.get('versao') != VERSAO_MODELO:
+            raise ValueError(f"Modelo do pré-filtro em {caminho} é de outra versão; treine novamente com `python prefiltro.py treina`.")
+        return PreFiltro(dados['limiar_negativo'], dados['limiar_positivo'], dados['modelo'])
+
+def carrega_rotulos(caminho=CAMINHO_ROTULOS):
+    """
+    Lê os textos e rótulos já classificados pelo Gemini, descartando os erros de classificação.
+    Retorna (textos, rotulos).
+    """
+    df = pd.read_excel(caminho)
+    df = df.loc[df['decisao'].notna() & (df['justificativa'] != 'Erro na classificação automática')]
+    return df['decisao'].astype(str).tolist(), df['isDanoAmbiental'].astype(bool).tolist()
+
+@lru_cache(maxsize=None)
+def prefiltro_padrao(caminho=CAMINHO_MODELO):
+    """
+    Carrega o pré-filtro treinado salvo em disco (ver `python prefiltro.py treina`).
+    Sem modelo salvo, ou com um modelo inválido, avisa e retorna None: a triagem segue sem pré-filtro.
+    """
+    if not os.path.exists(caminho):
+        print(f"Pré-filtro: nenhum modelo em {caminho}; todas as sentenças serão enviadas ao Gemini. "
+              f"Treine com `python prefiltro.py treina`.")
+        return None
+    try:
+        return PreFiltro.carrega(caminho)
+    except (ValueError, ImportError, pickle.UnpicklingError) as erro:
+        print(f"Pré-filtro: {erro} Todas as sentenças serão enviadas ao Gemini.")
+        return None
+
+def triagem_dano_ambiental(textos, prefiltro=None, em_lote=True, cliente=None, usar_cache=True, mostrar_progresso=True):
+    """
+    Triagem em duas etapas: o pré-filtro local decide os casos claros e apenas os incertos são enviados ao Gemini.
+    Sem pré-filtro (nenhum informado e nenhum modelo salvo), todos os textos são enviados ao Gemini.
+    Retorna uma lista, na ordem dos textos, de objetos com o atributo `.text` (como verifica_dano_ambiental).
+    """
+    prefiltro = prefiltro or prefiltro_padrao()
+    textos = [str(texto) for texto in textos]
+    if prefiltro is None:
+        if em_lote:
+            return verifica_dano_ambiental_em_lote(textos, cliente=cliente, usar_cache=usar_cache, mostrar_progresso=mostrar_progresso)
+        return [verifica_dano_ambiental(texto, cliente, usar_cache) for texto in textos]
+    probabilidades = prefiltro.probabilidades(textos)
+    decisoes = prefiltro.decisoes(textos, probabilidades)
+
+    respostas = [None] * len(textos)
+    incertos = []
+    for i, (decisao, p) in enumerate(zip(decisoes, probabilidades)):
+        if decisao is None:
+            incertos.append(i)
+        elif decisao:
+            respostas[i] = RespostaLocal({"isDanoAmbiental": True, "justificativa": f"Classificado pelo pré-filtro local (p={p:.2f})"})
+        else:
+            respostas[i] = RespostaLocal({"isDanoAmbiental": False, "justificativa": "Não há dano ambiental"})
+
+    textos_incertos = [textos[i] for i in incertos]
+    if em_lote:
+        respostas_incertos = verifica_dano_ambiental_em_lote(textos_incertos, cliente=cliente, usar_cache=usar_cache, mostrar_progresso=mostrar_progresso)
+    else:
+        respostas_incertos = [verifica_dano_ambiental(texto, cliente, usar_cache) for texto in textos_incertos]
+    for i, resposta in zip(incertos, respostas_incertos):
+        respostas[i] = resposta
+    return respostas
+
+def relatorio_prefiltro(probabilidades, rotulos, limiares=((0.01, 0.99), (0.02, 0.98), (0.05, 0.97), (0.1, 0.95), (0.2, 0.9), (0.3, 0.8))):
+    """
+    Compara precisão/recall contra chamadas à API economizadas para vários pares de limiares.
+    Considera que os textos incertos recebem o rótulo do Gemini (os rótulos de referência).
+    Para uma estimativa honesta, use probabilidades fora da amostra de treino (ex.: validação cruzada).
+    """
+    probabilidades = np.asarray(probabilidades)
+    rotulos = np.asarray(rotulos, dtype=bool)
+    linhas = []
+    for limiar_negativo, limiar_positivo in limiares:
+        negativos = probabilidades <= limiar_negativo
+        positivos = probabilidades >= limiar_positivo
+        incertos = ~(negativos | positivos)
+        # Rótulo final da triagem: decisão local nos casos claros, Gemini nos incertos
+        previsto = np.where(incertos, rotulos, positivos)
+        verdadeiros_positivos = (previsto & rotulos).sum()
+        linhas.append({
+            'limiar_negativo': limiar_negativo,
+            'limiar_positivo': limiar_positivo,
+            'chamadas_economizadas_%': round(100 * (1 - incertos.mean()), 1),
+            'descartados_local': int(negativos.sum()),
+            'aceitos_local': int(positivos.sum()),
+            'falsos_negativos': int((negativos & rotulos).sum()),
+            'falsos_positivos': int((positivos & ~rotulos).sum()),
+            'precisao': round(verdadeiros_positivos / max(previsto.sum(), 1), 3),
+            'recall': round(verdadeiros_positivos / max(rotulos.sum(), 1), 3),
+        })
+    return pd.DataFrame(linhas)
+
+def treina_e_salva(caminho=CAMINHO_MODELO, caminho_rotulos=CAMINHO_ROTULOS, limiar_negativo=0.02, limiar_positivo=0.98):
+    """
+    Treina o pré-filtro com os rótulos já produzidos pelo Gemini e salva o modelo em `caminho`.
+    """
+    prefiltro = PreFiltro(limiar_negativo, limiar_positivo).treina(*carrega_rotulos(caminho_rotulos))
+    prefiltro.salva(caminho)
+    prefiltro_padrao.cache_clear()
+    return prefiltro
+
+def avalia(caminho_rotulos=CAMINHO_ROTULOS):
+    """
+    Imprime o relatório de limiares para as palavras-chave e para o modelo (validação cruzada, 5 partes).
+    """
+    from sklearn.model_selection import cross_val_predict
+
+    textos, rotulos = carrega_rotulos(caminho_rotulos)
+    print(f"Textos rotulados: {len(textos)} ({sum(rotulos)} com dano ambiental)")
+
+    print("\n--- Apenas palavras-chave ---")
+    print(relatorio_prefiltro(PreFiltro().probabilidades(textos), rotulos).to_string(index=False))
+
+    print("\n--- TF-IDF + regressão logística (validação cruzada, 5 partes) ---")
+    prefiltro = PreFiltro().treina(textos, rotulos)
+    probabilidades = cross_val_predict(prefiltro.modelo, textos, np.asarray(rotulos), cv=5, method='predict_proba')[:, 1]
+    print(relatorio_prefiltro(probabilidades, rotulos).to_string(index=False))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Treino e avaliação do pré-filtro local da triagem.")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+    parser_treina = subparsers.add_parser('treina', help="Treina o modelo com os rótulos do Gemini e o salva")
+    parser_treina.add_argument('--rotulos', default=CAMINHO_ROTULOS)
+    parser_treina.add_argument('--modelo', default=CAMINHO_MODELO)
+    parser_treina.add_argument('--limiar-negativo', type=float, default=0.02)
+    parser_treina.add_argument('--limiar-positivo', type=float, default=0.98)
+    parser_avalia = subparsers.add_parser('avalia', help="Compara limiares para palavras-chave e modelo")
+    parser_avalia.add_argument('--rotulos', default=CAMINHO_ROTULOS)
+    args = parser.parse_args()
+
+    if args.comando == 'treina':
+        treina_e_salva(args.modelo, args.rotulos, args.limiar_negativo, args.limiar_positivo)
+        print(f"Modelo salvo em: {args.modelo}")
+    else:
+        avalia(args.rotulos)
@@ -0,0 +1,193 @@
+import re
+import hashlib
+from collections import Counter
+import pandas as pd
+from functions import analisa_sentenca, estima_tokens
+from banco_gemini import ProgressoEtapa
+
+# Orçamento padrão de tokens do trecho enviado ao analisa_sentenca
+ORCAMENTO_TOKENS = 6000
+
+# Linhas de boilerplate removidas do texto (cabeçalhos, rodapés, numeração de páginas e assinaturas)
+PADROES_BOILERPLATE = [re.compile(padrao, re.IGNORECASE) for padrao in [
+    r"^documento assinado digitalmente",
+    r"^este documento (é|e) c(ó|o)pia do original",
+    r"^para conferir o original",
+    r"^assinado (digital|eletronicament)\w*",
+    r"^(poder judici(á|a)rio|tribunal de justi(ç|c)a d[oae]s? .*)$",
+    r"^(fls?\.?|folhas?|p(á|a)gina|p(á|a)g\.)\s*\d+(\s*(de|/)\s*\d+)?\.?$",
+    r"^-?\s*\d{1,4}\s*-?$",
+    r"^\d{1,4}\s*/\s*\d{1,4}$",
+    r"^c\s*o\s*n\s*c\s*l\s*u\s*s\s*(ã|a)\s*o$",
+    r"^justi(ç|c)a gratuita$",
+    r"^(p\.\s*)?(r\.\s*)?(i\.\s*)?(c\.\s*)?$",
+    r"^ju(í|i)za? de direito:?$",
+    r"^(dr|dra)\(?a?\)?\.? .{0,60}$",
+    r"^\(\.\.\.\)$",
+]]
+
+# Início de cada seção da sentença
+INICIO_FUNDAMENTACAO = re.compile(
+    r"^(é o relat(ó|o)rio|(é o )?breve relat(ó|o)rio|fundamento e decido|decido|passo a decidir|fundamenta(ç|c)(ã|a)o)\b",
+    re.IGNORECASE | re.MULTILINE
+)
+INICIO_DISPOSITIVO = re.compile(
+    r"^(ante o exposto|diante do exposto|pelo exposto|isto posto|posto isso|em face do exposto|do exposto|dispositivo|"
+    r"julgo (totalmente |parcialmente )?(procedente|improcedente|extint))",
+    re.IGNORECASE | re.MULTILINE
+)
+
+# Trechos que carregam os dados extraídos por analisa_sentenca (valores, áreas e coordenadas)
+PADRAO_VALOR = re.compile(r"R\$\s*[\d\.]+(,\d{2})?|\bmulta\b|indeniza(ç|c)(ã|a)o|\bdi(á|a)ria\b", re.IGNORECASE)
+PADRAO_AREA = re.compile(r"\d[\d\.,]*\s*(ha\b|hectares?|m2|m²|metros quadrados|alqueires?|km2|km²)", re.IGNORECASE)
+PADRAO_COORDENADA = re.compile(r"\d+\s*[°º]\s*\d+|\butm\b|latitude|longitude|coordenadas?", re.IGNORECASE)
+
+# Etapa do ProgressoEtapa onde o pipeline grava a contagem de tokens de cada documento reduzido
+ETAPA_REDUCAO = 'reducao'
+
+def remove_boilerplate(texto, repeticoes_minimas=3):
+    """
+    Remove linhas de boilerplate e linhas repetidas ao longo do documento (cabeçalhos/rodapés de cada página),
+    mantendo a primeira ocorrência de cada linha repetida.
+    """
+    linhas = [' '.join(linha.split()) for linha in str(texto).splitlines()]
+    contagem = Counter(linha for linha in linhas if linha)
+    vistas = set()
+    resultado = []
+    for linha in linhas:
+        if not linha:
+            # Mantém no máximo uma linha em branco seguida (separador de parágrafos)
+            if resultado and resultado[-1] != '':
+                resultado.append('')
+            continue
+        if any(padrao.search(linha) for padrao in PADROES_BOILERPLATE):
+            continue
+        if contagem[linha] >= repeticoes_minimas and linha in vistas:
+            continue
+        vistas.add(linha)
+        resultado.append(linha)
+    return '\n'.join(resultado).strip()
+
+def divide_secoes(texto):
+    """
+    Divide a sentença em cabeçalho + relatório, fundamentação e dispositivo.
+    Seções não encontradas ficam vazias.
+    """
+    inicio_dispositivo = None
+    # O dispositivo é a última parte da sentença: usa a última ocorrência do marcador
+    for match in INICIO_DISPOSITIVO.finditer(texto):
+        inicio_dispositivo = match.start()
+    inicio_fundamentacao = None
+    match = INICIO_FUNDAMENTACAO.search(texto, 0, inicio_dispositivo if inicio_dispositivo is not None else len(texto))
+    if match:
+        inicio_fundamentacao = match.start()
+
+    fim_relatorio = inicio_fundamentacao if inicio_fundamentacao is not None else inicio_dispositivo
+    fim_fundamentacao = inicio_dispositivo if inicio_dispositivo is not None else len(texto)
+    return {
+        'relatorio': texto[:fim_relatorio].strip() if fim_relatorio is not None else texto.strip(),
+        'fundamentacao': texto[inicio_fundamentacao:fim_fundamentacao].strip() if inicio_fundamentacao is not None else '',
+        'dispositivo': texto[inicio_dispositivo:].strip() if inicio_dispositivo is not None else '',
+    }
+
+def _paragrafos(texto):
+    return [paragrafo for paragrafo in texto.split('\n') if paragrafo.strip()]
+
+def _relevante(paragrafo):
+    return bool(PADRAO_VALOR.search(paragrafo) or PADRAO_AREA.search(paragrafo) or PADRAO_COORDENADA.search(paragrafo))
+
+def reduz_texto(texto, orcamento_tokens=ORCAMENTO_TOKENS, tokens_cabecalho=400):
+    """
+    Prepara o texto de uma sentença para o analisa_sentenca, limitado a `orcamento_tokens`.
+    Remove o boilerplate e, se ainda passar do orçamento, monta um extrato com (em ordem de prioridade):
+    o cabeçalho (número do processo e partes), o dispositivo, os parágrafos com valores, áreas e coordenadas,
+    o início do relatório e o restante da fundamentação. Os trechos escolhidos mantêm a ordem original.
+    Retorna um dicionário com o texto reduzido e a contagem estimada de tokens antes e depois.
+    """
+    texto = str(texto)
+    limpo = remove_boilerplate(texto)
+    resultado = {
+        'texto': limpo,
+        'tokens_originais': estima_tokens(texto),
+        'tokens_limpos': estima_tokens(limpo),
+    }
+    if estima_tokens(limpo) <= orcamento_tokens:
+        resultado['tokens_reduzidos'] = estima_tokens(limpo)
+        return resultado
+
+    secoes = divide_secoes(limpo)
+    # Lista de (posição, parágrafo), com a posição global para reconstruir a ordem original
+    paragrafos = []
+    for nome in ('relatorio', 'fundamentacao', 'dispositivo'):
+        for paragrafo in _paragrafos(secoes[nome]):
+            paragrafos.append((len(paragrafos), nome, paragrafo))
+
+    cabecalho, tokens_usados = [], 0
+    for posicao, nome, paragrafo in paragrafos:
+        if nome != 'relatorio' or tokens_usados >= tokens_cabecalho:
+            break
+        cabecalho.append(posicao)
+        tokens_usados += estima_tokens(paragrafo)
+
+    prioridades = [
+        cabecalho,
+        [posicao for posicao, nome, _ in paragrafos if nome == 'dispositivo'],
+        [posicao for posicao, _, paragrafo in paragrafos if _relevante(paragrafo)],
+        [posicao for posicao, nome, _ in paragrafos if nome == 'relatorio'],
+        [posicao for posicao, nome, _ in paragrafos if nome == 'fundamentacao'],
+    ]
+    escolhidos, tokens_usados = set(), 0
+    for grupo in prioridades:
+        for posicao in grupo:
+            if posicao in escolhidos:
+                continue
+            tokens_paragrafo = estima_tokens(paragrafos[posicao][2])
+            if tokens_usados + tokens_paragrafo > orcamento_tokens:
+                continue
+            escolhidos.add(posicao)
+            tokens_usados += tokens_paragrafo
+
+    trechos, anterior = [], None
+    for posicao in sorted(escolhidos):
+        if anterior is not None and posicao != anterior + 1:
+            trechos.append('[...]') # Indica ao modelo que houve trechos omitidos
+        trechos.append(paragrafos[posicao][2])
+        anterior = posicao
+    resultado['texto'] = '\n'.join(trechos)
+    resultado['tokens_reduzidos'] = estima_tokens(resultado['texto'])
+    return resultado
+
+def registro_reducao(reducao):
+    """
+    Contagem de tokens (estimada) de uma redução feita por reduz_texto, sem o texto reduzido.
+    """
+    return {chave: reducao[chave] for chave in ('tokens_originais', 'tokens_limpos', 'tokens_reduzidos')}
+
+def id_documento_texto(texto):
+    # Identificador de um documento sem ID próprio: prefixo do hash do texto
+    return hashlib.sha256(str(texto).encode('utf-8')).hexdigest()[:16]
+
+def analisa_sentenca_reduzida(texto_extraido, id_documento=None, orcamento_tokens=ORCAMENTO_TOKENS, cliente=None, usar_cache=True, registros=None):
+    """
+    Reduz o texto com reduz_texto e envia o extrato ao analisa_sentenca.
+    Se `registros` (dicionário id_documento -> contagem de tokens) for informado, registra nele os tokens economizados.
+    """
+    reducao = reduz_texto(texto_extraido, orcamento_tokens)
+    if registros is not None:
+        registros[id_documento if id_documento is not None else id_documento_texto(texto_extraido)] = registro_reducao(reducao)
+    return analisa_sentenca(reducao['texto'], cliente, usar_cache)
+
+def estatisticas_reducao(registros=None):
+    """
+    Retorna um DataFrame com os tokens (estimados) originais e reduzidos de cada documento.
+    `registros` é um dicionário id_documento -> registro_reducao; sem ele, usa as reduções gravadas pelo pipeline.
+    """
+    if registros is None:
+        registros = ProgressoEtapa(ETAPA_REDUCAO).carrega()
+    df = pd.DataFrame(
+        [{'id_documento': id_documento, **registro} for id_documento, registro in registros.items()],
+        columns=['id_documento', 'tokens_originais', 'tokens_limpos', 'tokens_reduzidos']
+    )
+    if not df.empty:
+        df['reducao_%'] = (100 * (1 - df['tokens_reduzidos'] / df['tokens_originais'])).round(1)
+    return df
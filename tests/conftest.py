@@ -0,0 +1,67 @@
+import os
+import re
+import sys
+import asyncio
+import pytest
+
+# Os módulos do projeto ficam na raiz do repositório
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pool_chaves import PoolChaves
+
+class RespostaFalsa:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+
+class ErroLimite(Exception):
+    # Erro 429 como o da API, com retryDelay zero para os testes não esperarem o backoff
+    code = 429
+
+    def __init__(self):
+        super().__init__("429 RESOURCE_EXHAUSTED {'retryDelay': '0s'}")
+
+class ClienteFalso:
+    """
+    Cliente do Gemini para testes: `responde(prompt)` devolve o texto da resposta ou levanta uma exceção.
+    Expõe a mesma interface usada por functions.py (models.generate_content e aio.models.generate_content)
+    e guarda os prompts recebidos.
+    """
+    def __init__(self, responde, atraso=None):
+        self.responde = responde
+        self.atraso = atraso # Função prompt -> segundos de espera na versão assíncrona
+        self.prompts = []
+        cliente = self
+
+        class Modelos:
+            def generate_content(self, model, contents, config):
+                cliente.prompts.append(contents)
+                return RespostaFalsa(cliente.responde(contents))
+
+        class ModelosAsync:
+            async def generate_content(self, model, contents, config):
+                cliente.prompts.append(contents)
+                if cliente.atraso is not None:
+                    await asyncio.sleep(cliente.atraso(contents))
+                return RespostaFalsa(cliente.responde(contents))
+
+        class Aio:
+            models = ModelosAsync()
+
+        self.models = Modelos()
+        self.aio = Aio()
+
+def documentos_do_prompt(prompt):
+    # (id, texto) de cada documento de um prompt em lote (prompt_dano_ambiental_lote)
+    return [(int(i), texto) for i, texto in re.findall(r'<documento id="(\d+)">\n(.*?)\n</documento>', prompt, re.S)]
+
+@pytest.fixture
+def pool():
+    return PoolChaves(['CHAVE_A', 'CHAVE_B'], rpm=1_000_000, tpm=1_000_000_000)
+
+@pytest.fixture
+def pool_padrao_local(monkeypatch, pool):
+    # Funções que não recebem o pool usam pool_padrao(): troca pelo pool local, sem o banco de cotas
+    import functions
+    monkeypatch.setattr(functions, 'pool_padrao', lambda: pool)
+    return pool
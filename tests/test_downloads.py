@@ -0,0 +1,107 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from downloads import CacheDownloads, Documento, Downloader
+
+PDF = b'%PDF-1.4\n% teste\n'
+
+class Servidor(BaseHTTPRequestHandler):
+    # Respostas por caminho; `acessos` conta as requisições recebidas em cada um
+    acessos = {}
+    falhas_restantes = 0
+
+    def do_GET(self):
+        Servidor.acessos[self.path] = Servidor.acessos.get(self.path, 0) + 1
+        if self.path == '/sentenca.pdf':
+            self._responde(200, 'application/pdf', PDF)
+        elif self.path == '/negado':
+            self._responde(403, 'text/html; charset=utf-8', '<html><body>Acesso negado</body></html>'.encode('utf-8'))
+        elif self.path == '/nao-existe':
+            self._responde(404, 'text/html', b'<html><body>Not found</body></html>')
+        elif self.path == '/instavel':
+            if Servidor.falhas_restantes:
+                Servidor.falhas_restantes -= 1
+                self._responde(503, 'text/plain', b'indisponivel')
+            else:
+                self._responde(200, 'application/pdf', PDF)
+        elif self.path == '/sempre-503':
+            self._responde(503, 'text/plain', b'indisponivel')
+
+    def _responde(self, status, content_type, corpo):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def url_base():
+    Servidor.acessos = {}
+    Servidor.falhas_restantes = 0
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), Servidor)
+    thread = threading.Thread(target=servidor.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{servidor.server_address[1]}"
+    servidor.shutdown()
+    servidor.server_close()
+
+@pytest.fixture
+def downloader(tmp_path):
+    downloader = Downloader(pasta_cache=str(tmp_path / 'downloads'), tentativas=2, fator_backoff=0)
+    yield downloader
+    downloader.close()
+
+def test_baixa_pdf(downloader, url_base):
+    documento = downloader.baixa(f"{url_base}/sentenca.pdf")
+    assert documento.ok and documento.is_pdf and not documento.do_cache
+    assert documento.status == 200 and documento.conteudo == PDF
+
+def test_segundo_download_vem_do_cache(downloader, url_base, tmp_path):
+    downloader.baixa(f"{url_base}/sentenca.pdf")
+    documento = downloader.baixa(f"{url_base}/sentenca.pdf")
+    assert documento.do_cache and documento.conteudo == PDF
+    # O cache também vale para outro Downloader (outra execução) com a mesma pasta
+    outro = Downloader(pasta_cache=str(tmp_path / 'downloads'))
+    assert outro.baixa(f"{url_base}/sentenca.pdf").do_cache
+    assert Servidor.acessos['/sentenca.pdf'] == 1
+
+def test_pagina_de_erro_em_html_e_retornada_com_erro(downloader, url_base):
+    documento = downloader.baixa(f"{url_base}/nao-existe")
+    assert documento.status == 404 and documento.erro == 'HTTP 404'
+    assert documento.is_html and b'Not found' in documento.conteudo
+    negado = downloader.baixa(f"{url_base}/negado")
+    assert negado.erro == 'HTTP 403' and 'Acesso negado' in negado.conteudo.decode('utf-8')
+
+def test_pagina_de_erro_expira_no_cache(tmp_path, url_base):
+    pasta = str(tmp_path / 'downloads')
+    Downloader(pasta_cache=pasta).baixa(f"{url_base}/negado")
+    assert Downloader(pasta_cache=pasta).baixa(f"{url_base}/negado").do_cache
+    assert not Downloader(pasta_cache=pasta, ttl_erros_dias=0).baixa(f"{url_base}/negado").do_cache
+    assert Servidor.acessos['/negado'] == 2
+
+def test_erro_5xx_e_tentado_novamente(downloader, url_base):
+    Servidor.falhas_restantes = 2
+    documento = downloader.baixa(f"{url_base}/instavel")
+    assert documento.ok and documento.conteudo == PDF
+    assert Servidor.acessos['/instavel'] == 3
+
+def test_erro_5xx_persistente_levanta_excecao_e_nao_e_guardado(downloader, url_base):
+    with pytest.raises(requests.exceptions.RequestException):
+        downloader.baixa(f"{url_base}/sempre-503")
+    assert downloader.cache.obtem(f"{url_base}/sempre-503") is None
+
+def test_limite_de_taxa_nao_e_guardado_no_cache(tmp_path):
+    cache = CacheDownloads(str(tmp_path / 'downloads'))
+    cache.salva(Documento('http://exemplo/limite', b'<html>Too many requests</html>', 'text/html', 429))
+    assert cache.obtem('http://exemplo/limite') is None
+
+def test_baixa_varios_mantem_a_ordem_e_registra_erros(downloader, url_base):
+    urls = [f"{url_base}/sempre-503", f"{url_base}/sentenca.pdf", f"{url_base}/nao-existe", f"{url_base}/sentenca.pdf"]
+    documentos = downloader.baixa_varios(urls, max_workers=4, mostrar_progresso=False)
+    assert [documento.url for documento in documentos] == urls
+    assert not documentos[0].ok and documentos[1].ok and documentos[2].erro == 'HTTP 404'
+    assert Servidor.acessos['/sentenca.pdf'] == 1
@@ -0,0 +1,59 @@
+import time
+import pytest
+from fila_trabalho import CONCLUIDO, EM_ANDAMENTO, FALHOU, PENDENTE, FilaTrabalho, trabalhador
+
+@pytest.fixture
+def caminho(tmp_path):
+    return str(tmp_path / 'fila.db')
+
+def test_item_com_lease_expirado_volta_para_a_fila(caminho):
+    fila = FilaTrabalho('teste', caminho, duracao_lease=0.2)
+    fila.adiciona({'a': {'n': 1}, 'b': {'n': 2}})
+    assert [item for item, _ in fila.reivindica(2, worker='w1')] == ['a', 'b']
+    assert fila.reivindica(2, worker='w2') == []
+    time.sleep(0.3)
+    # O worker w1 "travou": os itens voltam para a fila e são entregues ao w2
+    assert sorted(item for item, _ in fila.reivindica(2, worker='w2')) == ['a', 'b']
+    # A conclusão tardia do w1 é ignorada; a do w2 vale
+    fila.conclui(['a', 'b'], worker='w1')
+    assert fila.estado()[EM_ANDAMENTO] == 2
+    fila.conclui(['a', 'b'], worker='w2')
+    assert fila.estado()[CONCLUIDO] == 2
+
+def test_renovacao_mantem_o_lease(caminho):
+    fila = FilaTrabalho('teste', caminho, duracao_lease=0.3)
+    fila.adiciona(['a'])
+    fila.reivindica(1, worker='w1')
+    for _ in range(3):
+        time.sleep(0.15)
+        fila.renova(['a'], worker='w1')
+    assert fila.reivindica(1, worker='w2') == []
+    assert fila.estado()[EM_ANDAMENTO] == 1
+
+def test_lease_expirado_esgota_as_tentativas(caminho):
+    fila = FilaTrabalho('teste', caminho, duracao_lease=0.05, max_tentativas=2)
+    fila.adiciona(['a'])
+    for worker in ('w1', 'w2'):
+        assert fila.reivindica(1, worker=worker)
+        time.sleep(0.1)
+    assert fila.estado() == {PENDENTE: 0, EM_ANDAMENTO: 0, CONCLUIDO: 0, FALHOU: 1}
+    assert fila.falhos()[0][2] == 'lease expirado'
+
+def _lote_lento(lote, espera):
+    time.sleep(espera)
+
+def test_trabalhador_renova_o_lease_de_lotes_demorados(caminho):
+    fila = FilaTrabalho('teste', caminho, duracao_lease=0.3)
+    fila.adiciona(['a', 'b'])
+    # O lote demora mais que o lease: sem renovação ele voltaria para a fila e seria executado de novo
+    assert trabalhador('teste', _lote_lento, tamanho_lote=2, argumentos=(1.0,), caminho=caminho, duracao_lease=0.3) == 2
+    assert fila.estado()[CONCLUIDO] == 2
+
+def _conclui_metade(lote):
+    return [item for item, dados in lote if dados['ok']]
+
+def test_trabalhador_devolve_itens_nao_concluidos(caminho):
+    fila = FilaTrabalho('teste', caminho, max_tentativas=1)
+    fila.adiciona({'a': {'ok': True}, 'b': {'ok': False}})
+    assert trabalhador('teste', _conclui_metade, tamanho_lote=2, caminho=caminho, max_tentativas=1) == 1
+    assert fila.estado()[CONCLUIDO] == 1 and fila.estado()[FALHOU] == 1
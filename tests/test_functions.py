@@ -0,0 +1,95 @@
+import json
+import random
+from conftest import ClienteFalso, ErroLimite, documentos_do_prompt
+from functions import (FALLBACK_DANO, FormatoRespostaDanoLote, _verifica_lote, classifica_em_lote,
+                       requisicao_com_pool)
+
+def resposta_dano(prompt):
+    return json.dumps({"isDanoAmbiental": 'desmatamento' in prompt, "justificativa": prompt.strip()[-20:]})
+
+def test_classifica_em_lote_mantem_a_ordem(pool):
+    textos = [f"texto {i} desmatamento" if i % 2 else f"texto {i}" for i in range(20)]
+    # Respostas chegam fora de ordem: cada requisição espera um tempo aleatório
+    cliente = ClienteFalso(lambda prompt: json.dumps({"isDanoAmbiental": False, "justificativa": prompt.split('texto ')[-1].split()[0]}),
+                           atraso=lambda prompt: random.uniform(0, 0.05))
+    respostas = classifica_em_lote(textos, concorrencia=8, pool=pool, cliente=cliente, mostrar_progresso=False, usar_cache=False)
+    assert [json.loads(resposta.text)["justificativa"] for resposta in respostas] == [str(i) for i in range(20)]
+
+def test_classifica_em_lote_usa_fallback_quando_a_api_falha(pool):
+    def falha(prompt):
+        raise RuntimeError("500 INTERNAL")
+    cliente = ClienteFalso(falha)
+    respostas = classifica_em_lote(["a", "b"], pool=pool, cliente=cliente, mostrar_progresso=False, usar_cache=False)
+    assert [json.loads(resposta.text) for resposta in respostas] == [FALLBACK_DANO, FALLBACK_DANO]
+    # Erros que não são de limite: uma tentativa por chave e depois desiste
+    assert len(cliente.prompts) == 2 * len(pool.chaves)
+
+def test_classifica_em_lote_refaz_apos_429(pool):
+    erros = {'restantes': 2}
+    def responde(prompt):
+        if erros['restantes']:
+            erros['restantes'] -= 1
+            raise ErroLimite()
+        return resposta_dano(prompt)
+    cliente = ClienteFalso(responde)
+    respostas = classifica_em_lote(["desmatamento da APP"], pool=pool, cliente=cliente, mostrar_progresso=False, usar_cache=False)
+    assert json.loads(respostas[0].text)["isDanoAmbiental"] is True
+    assert len(cliente.prompts) == 3
+    assert sum(estado['total_429'] for estado in pool.utilizacao().values()) == 2
+
+def test_requisicao_com_pool_sincrona_refaz_apos_429(pool):
+    erros = {'restantes': 1}
+    def responde(prompt):
+        if erros['restantes']:
+            erros['restantes'] -= 1
+            raise ErroLimite()
+        return '{"resultados": []}'
+    resposta = requisicao_com_pool("prompt", FormatoRespostaDanoLote, {}, pool=pool, cliente=ClienteFalso(responde))
+    assert json.loads(resposta.text) == {"resultados": []}
+
+def test_verifica_lote_completo_em_uma_requisicao(pool_padrao_local):
+    textos = ["desmatamento", "barulho", "desmatamento de nascente"]
+    def responde(prompt):
+        return json.dumps({"resultados": [
+            {"id": i, "isDanoAmbiental": 'desmatamento' in texto, "justificativa": texto} for i, texto in documentos_do_prompt(prompt)
+        ]})
+    cliente = ClienteFalso(responde)
+    resultados = _verifica_lote(textos, [0, 1, 2], cliente, usar_cache=False)
+    assert len(cliente.prompts) == 1
+    assert {i: dados["isDanoAmbiental"] for i, dados in resultados.items()} == {0: True, 1: False, 2: True}
+
+def test_verifica_lote_divide_os_faltantes(pool_padrao_local):
+    textos = [f"documento {i}" for i in range(4)]
+    def responde(prompt):
+        documentos = documentos_do_prompt(prompt)
+        if not documentos:
+            # Documento isolado: prompt individual
+            return json.dumps({"isDanoAmbiental": False, "justificativa": "individual"})
+        # O modelo "esquece" o último documento de cada lote
+        return json.dumps({"resultados": [
+            {"id": i, "isDanoAmbiental": False, "justificativa": "lote"} for i, _ in documentos[:-1]
+        ]})
+    cliente = ClienteFalso(responde)
+    resultados = _verifica_lote(textos, [0, 1, 2, 3], cliente, usar_cache=False)
+    assert sorted(resultados) == [0, 1, 2, 3]
+    assert resultados[3]["justificativa"] == "individual"
+    assert all(resultados[i]["justificativa"] == "lote" for i in (0, 1, 2))
+
+def test_verifica_lote_resposta_malformada_divide_ate_documentos_isolados(pool_padrao_local):
+    def responde(prompt):
+        if documentos_do_prompt(prompt):
+            return "isto não é JSON"
+        return json.dumps({"isDanoAmbiental": True, "justificativa": "individual"})
+    cliente = ClienteFalso(responde)
+    resultados = _verifica_lote(["a", "b", "c"], [0, 1, 2], cliente, usar_cache=False)
+    assert all(dados["justificativa"] == "individual" for dados in resultados.values())
+    assert len(resultados) == 3
+
+def test_verifica_lote_nao_divide_quando_a_requisicao_falha(pool_padrao_local):
+    def falha(prompt):
+        raise RuntimeError("503 UNAVAILABLE")
+    cliente = ClienteFalso(falha)
+    resultados = _verifica_lote([f"doc {i}" for i in range(8)], list(range(8)), cliente, usar_cache=False)
+    assert resultados == {i: FALLBACK_DANO for i in range(8)}
+    # Apenas a requisição do lote (uma tentativa por chave), sem dividir em requisições menores
+    assert len(cliente.prompts) == len(pool_padrao_local.chaves)